@@ -13,3 +13,174 @@ DEFAULT_USER = os.getenv('DEFAULT_USER', 'sa')
 
 # Интервал проверки планировщика (в миллисекундах)
 SCHEDULER_CHECK_INTERVAL = int(os.getenv('SCHEDULER_CHECK_INTERVAL', '30000'))
+
+# Порог доли измененных экстентов (в процентах) для авто-режима:
+# при превышении делается полный бэкап вместо дифференциального
+AUTO_DIFF_THRESHOLD = float(os.getenv('AUTO_DIFF_THRESHOLD', '50'))
+
+# Локальный кэш истории бэкапов из msdb (backupset/backupmediafamily)
+BACKUP_HISTORY_FILE = os.getenv('BACKUP_HISTORY_FILE', 'backup_history.json')
+
+# Максимальное число записей истории, хранимых для одной базы сервера
+HISTORY_MAX_ROWS = int(os.getenv('HISTORY_MAX_ROWS', '1000'))
+
+# Первая загрузка истории сервера: бэкапы за последние дни (не вся история msdb)
+HISTORY_SEED_DAYS = int(os.getenv('HISTORY_SEED_DAYS', '90'))
+
+# Экспорт метрик операций: файл JSON-lines (пусто - отключено) и его предельный размер в MB
+# (при превышении файл переименовывается в <файл>.1, прежний .1 удаляется; 0 - без ротации)
+METRICS_JSONL_FILE = os.getenv('METRICS_JSONL_FILE', '')
+METRICS_JSONL_MAX_MB = float(os.getenv('METRICS_JSONL_MAX_MB', '50'))
+
+# Локальный endpoint метрик в формате Prometheus (0 - отключено)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Ограничение скорости клиентского копирования (MB/s, 0 - без ограничения):
+# на одно задание и общий лимит на все копирования одновременно
+THROTTLE_JOB_MBPS = float(os.getenv('THROTTLE_JOB_MBPS', '0'))
+THROTTLE_GLOBAL_MBPS = float(os.getenv('THROTTLE_GLOBAL_MBPS', '0'))
+
+# Окна ограничения нагрузки: "08:00-19:00=50:200;..." - в указанное время
+# действуют лимиты MB/s на задание и общий (вне окон - лимиты выше)
+THROTTLE_WINDOWS = os.getenv('THROTTLE_WINDOWS', '')
+
+# Серверные подсказки для бэкапа в окнах ограничения (0/пусто - не задавать):
+# BUFFERCOUNT, MAXTRANSFERSIZE (байт) и имя приложения для классификатора Resource Governor
+THROTTLE_BUFFERCOUNT = int(os.getenv('THROTTLE_BUFFERCOUNT', '0'))
+THROTTLE_MAXTRANSFERSIZE = int(os.getenv('THROTTLE_MAXTRANSFERSIZE', '0'))
+THROTTLE_APP_NAME = os.getenv('THROTTLE_APP_NAME', '')
+
+# Бюджет времени холодного старта до первой отрисовки окна (мс)
+STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', '1500'))
+
+# Интервал опроса папки бэкапов в режиме слежения (мс): для сетевых папок
+# проверяется время изменения каталога, для растущих файлов - их размер
+WATCH_POLL_INTERVAL = int(os.getenv('WATCH_POLL_INTERVAL', '5000'))
+
+# Сканирование папок бэкапов: глубина вложенных папок по умолчанию,
+# маски включения/исключения (через запятую) и число параллельных потоков обхода
+SCAN_MAX_DEPTH = int(os.getenv('SCAN_MAX_DEPTH', '3'))
+SCAN_INCLUDE = os.getenv('SCAN_INCLUDE', '*.bak')
+SCAN_EXCLUDE = os.getenv('SCAN_EXCLUDE', '')
+SCAN_MAX_WORKERS = int(os.getenv('SCAN_MAX_WORKERS', '8'))
+
+# Шаблон имени файла бэкапа относительно папки бэкапов. Токены: {server}, {instance},
+# {db}, {type} (FULL/DIFF/LOG/SCHEDULED), {timestamp} (ГГГГММДД_ЧЧММСС), {stripe}.
+# Папки в шаблоне (например, {server}/{db}/...) создаются на сервере перед бэкапом
+BACKUP_NAME_TEMPLATE = os.getenv('BACKUP_NAME_TEMPLATE', '{server}_{db}_{type}_{timestamp}.bak')
+
+# Число файлов (частей), на которые пишется один бэкап
+BACKUP_STRIPES = int(os.getenv('BACKUP_STRIPES', '1'))
+
+# Папки для файлов данных и журнала при восстановлении в новую базу
+# (пусто - папки сервера по умолчанию InstanceDefaultDataPath/InstanceDefaultLogPath)
+RESTORE_DATA_PATH = os.getenv('RESTORE_DATA_PATH', '')
+RESTORE_LOG_PATH = os.getenv('RESTORE_LOG_PATH', '')
+
+# Скорость отката транзакций (MB журнала в секунду) для оценки времени
+# отключения пользователей перед восстановлением
+ROLLBACK_MBPS = float(os.getenv('ROLLBACK_MBPS', '20'))
+
+# Менеджер заданий: число одновременно выполняемых операций, общий предел вместе с заданиями
+# адаптивного параллелизма и проверочных восстановлений, интервал обновления прогресса (мс)
+JOB_MAX_CONCURRENT = int(os.getenv('JOB_MAX_CONCURRENT', '2'))
+JOB_MAX_TOTAL = int(os.getenv('JOB_MAX_TOTAL', '8'))
+JOB_REFRESH_INTERVAL = int(os.getenv('JOB_REFRESH_INTERVAL', '2000'))
+
+# Снимки размеров баз (выделенное и занятое место данных и журнала):
+# файл временного ряда, интервал снимков (минуты) и число снимков на базу
+SIZE_HISTORY_FILE = os.getenv('SIZE_HISTORY_FILE', 'size_history.json')
+SIZE_SAMPLE_INTERVAL = int(os.getenv('SIZE_SAMPLE_INTERVAL', '15'))
+SIZE_HISTORY_MAX = int(os.getenv('SIZE_HISTORY_MAX', '2000'))
+
+# Запас свободного места (в процентах от оценки размера бэкапа)
+SPACE_RESERVE_PCT = float(os.getenv('SPACE_RESERVE_PCT', '10'))
+
+# Планирование места для пакета бэкапов: вторичный путь для баз, которые не помещаются
+# на основной (пусто - не использовать), и срок хранения старых бэкапов в днях
+# (0 - не предлагать удаление)
+BACKUP_SECONDARY_PATH = os.getenv('BACKUP_SECONDARY_PATH', '')
+BACKUP_RETENTION_DAYS = int(os.getenv('BACKUP_RETENTION_DAYS', '0'))
+
+# Дополнительные копии бэкапа (пути через ';'): зеркало MIRROR TO, которое пишет сам сервер
+# (Enterprise Edition), или фоновая репликация готовых файлов на вторичные пути
+BACKUP_MIRROR_PATHS = os.getenv('BACKUP_MIRROR_PATHS', '')
+REPLICA_PATHS = os.getenv('REPLICA_PATHS', '')
+
+# Репликация: лимит MB/s на одну копию (0 - по окнам нагрузки), число параллельных копий
+# и файл состояния копий
+REPLICA_MBPS = float(os.getenv('REPLICA_MBPS', '0'))
+REPLICA_MAX_WORKERS = int(os.getenv('REPLICA_MAX_WORKERS', '4'))
+REPLICA_STATUS_FILE = os.getenv('REPLICA_STATUS_FILE', 'replica_status.json')
+
+# Хранилище S3 (MinIO и другие S3-совместимые): адрес, регион, бакет, префикс ключей и ключи доступа
+# (пустые S3_ENDPOINT или S3_BUCKET - хранилище не используется)
+S3_ENDPOINT = os.getenv('S3_ENDPOINT', '')
+S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+S3_BUCKET = os.getenv('S3_BUCKET', '')
+S3_PREFIX = os.getenv('S3_PREFIX', '')
+S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY', '')
+S3_SECRET_KEY = os.getenv('S3_SECRET_KEY', '')
+
+# Передача в S3: размер части составной загрузки и диапазона скачивания (MB), число параллельных
+# частей, повторы при ошибках и лимит MB/s (0 - по окнам нагрузки)
+S3_PART_SIZE_MB = int(os.getenv('S3_PART_SIZE_MB', '16'))
+S3_MAX_WORKERS = int(os.getenv('S3_MAX_WORKERS', '4'))
+S3_RETRIES = int(os.getenv('S3_RETRIES', '4'))
+S3_MBPS = float(os.getenv('S3_MBPS', '0'))
+
+# Кеш списка объектов (файл и срок жизни в секундах), состояние незавершенных загрузок
+# и папка для скачивания бэкапа перед восстановлением (обязательна для восстановления из S3:
+# должна быть доступна и приложению, и серверу)
+S3_LIST_CACHE_FILE = os.getenv('S3_LIST_CACHE_FILE', 's3_listing.json')
+S3_LIST_CACHE_TTL = int(os.getenv('S3_LIST_CACHE_TTL', '300'))
+S3_UPLOAD_STATE_FILE = os.getenv('S3_UPLOAD_STATE_FILE', 's3_uploads.json')
+S3_DOWNLOAD_PATH = os.getenv('S3_DOWNLOAD_PATH', '')
+
+# Сохраненные наборы баз для бэкапа (по серверам)
+DB_SELECTIONS_FILE = os.getenv('DB_SELECTIONS_FILE', 'db_selections.json')
+
+# Группы доступности: бэкап на предпочтительной реплике (1/0), адреса реплик для подключения,
+# если имя реплики не разрешается ("NODE2=node2.corp,1433;NODE3=10.0.0.3"), и таймаут подключения (с)
+AG_BACKUP_ROUTING = os.getenv('AG_BACKUP_ROUTING', '0') == '1'
+AG_REPLICA_ADDRESSES = os.getenv('AG_REPLICA_ADDRESSES', '')
+AG_CONNECT_TIMEOUT = int(os.getenv('AG_CONNECT_TIMEOUT', '5'))
+# Сколько секунд используется результат опроса реплик (предпочтительность бэкапа) без повторного опроса
+AG_PROBE_CACHE_SECONDS = int(os.getenv('AG_PROBE_CACHE_SECONDS', '60'))
+
+# Папка sparse-файлов снимков баз на сервере (пусто - рядом с файлами данных базы)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', '')
+
+# Каталог частичных бэкапов и однократных бэкапов файлгрупп только для чтения (по серверам)
+FILEGROUP_CATALOG_FILE = os.getenv('FILEGROUP_CATALOG_FILE', 'filegroup_catalog.json')
+
+# Адаптивный параллелизм бэкапов (1/0): предел числа одновременных бэкапов, прирост скорости для
+# повышения уровня (доля), рост задержки задания для снижения (раз) и файл выбранных уровней
+ADAPTIVE_CONCURRENCY = os.getenv('ADAPTIVE_CONCURRENCY', '0') == '1'
+ADAPTIVE_MAX_CONCURRENT = int(os.getenv('ADAPTIVE_MAX_CONCURRENT', '8'))
+ADAPTIVE_GAIN = float(os.getenv('ADAPTIVE_GAIN', '0.1'))
+ADAPTIVE_LATENCY_FACTOR = float(os.getenv('ADAPTIVE_LATENCY_FACTOR', '2'))
+CONCURRENCY_FILE = os.getenv('CONCURRENCY_FILE', 'concurrency.json')
+
+# Задания SQL Server Agent, создаваемые из планировщика: префикс имени и число строк истории запусков
+AGENT_JOB_PREFIX = os.getenv('AGENT_JOB_PREFIX', 'SQLBackupManager_')
+AGENT_HISTORY_ROWS = int(os.getenv('AGENT_HISTORY_ROWS', '50'))
+
+# Локальный HTTP/JSON API только для чтения (каталог бэкапов и задания, 0 - отключен)
+# и размер страницы результатов по умолчанию
+API_HOST = os.getenv('API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('API_PORT', '0'))
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '100'))
+
+# Проверочные восстановления (RTO): префикс временной базы, маски баз через запятую (пусто - все),
+# интервал автоматических проверок в часах (0 - только вручную), число баз за раз, одновременных
+# восстановлений, DBCC CHECKDB по умолчанию (1/0), файл истории и число хранимых проверок на базу
+DRILL_DB_PREFIX = os.getenv('DRILL_DB_PREFIX', 'drill_')
+DRILL_DATABASES = os.getenv('DRILL_DATABASES', '')
+DRILL_INTERVAL_HOURS = float(os.getenv('DRILL_INTERVAL_HOURS', '0'))
+DRILL_BATCH = int(os.getenv('DRILL_BATCH', '5'))
+DRILL_MAX_CONCURRENT = int(os.getenv('DRILL_MAX_CONCURRENT', '1'))
+DRILL_CHECKDB = os.getenv('DRILL_CHECKDB', '1') == '1'
+DRILL_HISTORY_FILE = os.getenv('DRILL_HISTORY_FILE', 'restore_drills.json')
+DRILL_HISTORY_MAX = int(os.getenv('DRILL_HISTORY_MAX', '50'))
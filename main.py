@@ -1,52 +1,2487 @@
+import time
+# Момент старта для замера времени запуска до первой отрисовки
+STARTUP_T0 = time.perf_counter()
 import sys
 import os
 import json
-import pyodbc
-import shutil
+import re
+import uuid
+import fnmatch
+import ntpath
+import threading
+import urllib.parse
+from functools import lru_cache
 from datetime import datetime, timedelta
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                                QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                                QTableWidget, QTableWidgetItem, QComboBox, QMessageBox, 
                                QGroupBox, QTabWidget, QFileDialog, QCheckBox, QTimeEdit,
                                QProgressBar, QFormLayout, QRadioButton, 
-                               QButtonGroup, QAbstractItemView, QHeaderView, QMenu)
-from PySide6.QtCore import Qt, QThread, Signal, QTime, QTimer, QSize
-from PySide6.QtGui import QIcon, QAction, QPalette, QColor, QFont, QGuiApplication
-import subprocess
+                               QButtonGroup, QAbstractItemView, QHeaderView, QMenu, QSpinBox,
+                               QTableView, QInputDialog)
+from PySide6.QtCore import (Qt, QObject, QThread, Signal, QTime, QTimer, QSize, QFileSystemWatcher,
+                            QAbstractTableModel, QModelIndex, QSortFilterProxyModel)
+from PySide6.QtGui import QIcon, QAction, QPalette, QColor, QFont, QGuiApplication, QPainter
 import platform
 from config import (DEFAULT_BACKUP_PATH, SETTINGS_FILE, ODBC_DRIVER, 
-                   DEFAULT_USER, SCHEDULER_CHECK_INTERVAL)
+                   DEFAULT_USER, SCHEDULER_CHECK_INTERVAL, AUTO_DIFF_THRESHOLD,
+                   BACKUP_HISTORY_FILE, HISTORY_MAX_ROWS, HISTORY_SEED_DAYS, METRICS_JSONL_FILE, METRICS_JSONL_MAX_MB,
+                   METRICS_HOST, METRICS_PORT, THROTTLE_JOB_MBPS, THROTTLE_GLOBAL_MBPS,
+                   THROTTLE_WINDOWS, THROTTLE_BUFFERCOUNT, THROTTLE_MAXTRANSFERSIZE,
+                   THROTTLE_APP_NAME, STARTUP_BUDGET_MS,
+                   WATCH_POLL_INTERVAL, SCAN_MAX_DEPTH, SCAN_INCLUDE, SCAN_EXCLUDE,
+                   SCAN_MAX_WORKERS, BACKUP_NAME_TEMPLATE, BACKUP_STRIPES,
+                   RESTORE_DATA_PATH, RESTORE_LOG_PATH, ROLLBACK_MBPS,
+                   JOB_MAX_CONCURRENT, JOB_MAX_TOTAL, JOB_REFRESH_INTERVAL,
+                   SIZE_HISTORY_FILE, SIZE_SAMPLE_INTERVAL, SIZE_HISTORY_MAX, SPACE_RESERVE_PCT,
+                   BACKUP_SECONDARY_PATH, BACKUP_RETENTION_DAYS,
+                   BACKUP_MIRROR_PATHS, REPLICA_PATHS, REPLICA_MBPS, REPLICA_MAX_WORKERS,
+                   REPLICA_STATUS_FILE, S3_ENDPOINT, S3_REGION, S3_BUCKET, S3_PREFIX,
+                   S3_ACCESS_KEY, S3_SECRET_KEY, S3_PART_SIZE_MB, S3_MAX_WORKERS, S3_RETRIES,
+                   S3_MBPS, S3_LIST_CACHE_FILE, S3_LIST_CACHE_TTL, S3_UPLOAD_STATE_FILE,
+                   S3_DOWNLOAD_PATH, DB_SELECTIONS_FILE, AG_BACKUP_ROUTING, AG_REPLICA_ADDRESSES,
+                   AG_CONNECT_TIMEOUT, AG_PROBE_CACHE_SECONDS, SNAPSHOT_PATH, FILEGROUP_CATALOG_FILE, ADAPTIVE_CONCURRENCY,
+                   ADAPTIVE_MAX_CONCURRENT, ADAPTIVE_GAIN, ADAPTIVE_LATENCY_FACTOR, CONCURRENCY_FILE,
+                   AGENT_JOB_PREFIX, AGENT_HISTORY_ROWS, API_HOST, API_PORT, API_PAGE_SIZE,
+                   DRILL_DB_PREFIX, DRILL_DATABASES, DRILL_INTERVAL_HOURS, DRILL_BATCH,
+                   DRILL_MAX_CONCURRENT, DRILL_CHECKDB, DRILL_HISTORY_FILE, DRILL_HISTORY_MAX)
+
+# Индексы вкладок
+TAB_CONNECTION, TAB_BACKUP, TAB_RESTORE, TAB_SCHEDULER, TAB_FILES, TAB_HISTORY = range(6)
+
+# Коды типов бэкапа в msdb.dbo.backupset
+BACKUP_TYPE_CODES = {'FULL': 'D', 'DIFF': 'I', 'LOG': 'L'}
+
+# Отключение пользователей перед восстановлением: (название, (режим, завершение сессий, возврат режима))
+CLOSE_CONNECTION_MODES = [
+    ("SINGLE_USER (откат транзакций сразу)", ("SINGLE_USER", "ROLLBACK IMMEDIATE", "MULTI_USER")),
+    ("RESTRICTED_USER (откат транзакций сразу)", ("RESTRICTED_USER", "ROLLBACK IMMEDIATE", "MULTI_USER")),
+    ("OFFLINE (откат транзакций сразу)", ("OFFLINE", "ROLLBACK IMMEDIATE", "ONLINE")),
+    ("RESTRICTED_USER без ожидания (ошибка при открытых транзакциях)", ("RESTRICTED_USER", "NO_WAIT", "MULTI_USER")),
+    ("Не отключать", None),
+]
+
+# Состояния заданий
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELLED = range(5)
+JOB_STATE_TITLES = {JOB_QUEUED: "В очереди", JOB_RUNNING: "Выполняется", JOB_DONE: "Успешно",
+                    JOB_FAILED: "Ошибка", JOB_CANCELLED: "Отменено"}
+JOB_STATE_COLORS = {JOB_QUEUED: "#9e9e9e", JOB_RUNNING: "#2196f3", JOB_DONE: "#4caf50",
+                    JOB_FAILED: "#f44336", JOB_CANCELLED: "#ff9800"}
+# Очередь проверочных восстановлений (свой предел одновременных заданий - DRILL_MAX_CONCURRENT)
+DRILL_POOL = "drill"
+
+# Дополнительные копии бэкапа и состояния репликации
+DEST_NONE, DEST_MIRROR, DEST_REPLICA, DEST_S3 = range(4)
+REPLICA_PENDING, REPLICA_COPYING, REPLICA_DONE, REPLICA_FAILED = "queued", "copying", "ok", "error"
+REPLICA_STATE_TITLES = {REPLICA_PENDING: "в очереди", REPLICA_COPYING: "копируется",
+                        REPLICA_DONE: "готово", REPLICA_FAILED: "ошибка"}
+
+# Адреса реплик групп доступности для подключения: {ИМЯ РЕПЛИКИ: адрес}
+AG_REPLICA_ADDRESS_MAP = {name.strip().upper(): address.strip() for name, _, address in
+                          (item.partition('=') for item in AG_REPLICA_ADDRESSES.split(';')) if address.strip()}
+
+# Ограничение S3 на число частей составной загрузки
+S3_MAX_PARTS = 10000
+
+# Разбор SQL команд для метрик: операция, база и файл бэкапа
+COMMAND_PATTERN = re.compile(r"^\s*(BACKUP|RESTORE)\s+(?:DATABASE|LOG)\s+\[(.+?)\]", re.IGNORECASE)
+DISK_PATTERN = re.compile(r"(?:TO|FROM)\s+DISK\s*=\s*N?'((?:[^']|'')+)'", re.IGNORECASE)
+DISK_LIST_PATTERN = re.compile(r"\bDISK\s*=\s*N?'((?:[^']|'')+)'", re.IGNORECASE)
+
+# Шаблон имени файла бэкапа: токены и их форма в имени
+TEMPLATE_TOKEN_PATTERN = re.compile(r"\{(\w+)\}")
+NAME_TOKEN_PATTERNS = {
+    'server': r"[^_\\/]+",
+    'instance': r"[^_\\/]+",
+    'db': r"[^\\/]+?",
+    'type': r"FULL|DIFF|LOG|SCHEDULED|PARTIAL|FG-[^\\/]+?",  # FG-<файлгруппа> - бэкап файлгруппы
+    'timestamp': r"\d{8}_\d{6}",
+    'stripe': r"\d+",
+}
+NAME_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+BACKUP_TYPE_TITLES = {'FULL': "Полный", 'DIFF': "Диф", 'LOG': "Лог", 'SCHEDULED': "План",
+                      'PARTIAL': "Частичный", 'FG': "Файлгруппа"}
+# Типы, с которых начинается цепочка восстановления (бэкап по расписанию - тоже полный)
+FULL_BACKUP_TITLES = (BACKUP_TYPE_TITLES['FULL'], BACKUP_TYPE_TITLES['SCHEDULED'], BACKUP_TYPE_TITLES['PARTIAL'])
+# Прежние форматы имен (авто-бэкап раньше обычного, иначе SCHEDULED попадет в имя базы)
+LEGACY_NAME_TEMPLATES = ("{server}_{db}_SCHEDULED_{timestamp}.bak", "{server}_{db}_{timestamp}.bak")
+
+def load_json_file(path, default):
+    """Чтение JSON файла (при ошибке возвращается значение по умолчанию)"""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            return default
+    return default
+
+def format_size(size):
+    """Размер в байтах в читаемом виде"""
+    if size >= 1024**3:  # GB
+        return f"{size/(1024**3):.2f} GB"
+    elif size >= 1024**2:  # MB
+        return f"{size/(1024**2):.2f} MB"
+    elif size >= 1024:  # KB
+        return f"{size/1024:.2f} KB"
+    return f"{size} B"
+
+def sql_quote(value):
+    """Экранирование строки для литерала N'...'"""
+    return value.replace("'", "''")
+
+def format_duration(seconds):
+    """Длительность в читаемом виде"""
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f} ч"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f} мин"
+    return f"{seconds:.0f} с"
+
+def split_server_address(address):
+    """Имя сервера и экземпляра из адреса вида host.domain\\INSTANCE,port"""
+    host, _, instance = address.split(',')[0].partition('\\')
+    return host.split('.')[0], instance or "MSSQLSERVER"
+
+def stripe_template(template, stripes=BACKUP_STRIPES):
+    """Шаблон с номером части: при нескольких частях без {stripe} номер добавляется перед расширением"""
+    if stripes > 1 and '{stripe}' not in template:
+        root, ext = os.path.splitext(template)
+        template = f"{root}_{{stripe}}{ext}"
+    return template
+
+@lru_cache(maxsize=None)
+def compile_name_template(template):
+    """Регулярное выражение для разбора конца пути файла по шаблону (разделитель папок - /)"""
+    file_part = template.replace('\\', '/')
+    regex = ""
+    seen = set()
+    pos = 0
+    for match in TEMPLATE_TOKEN_PATTERN.finditer(file_part):
+        token = match.group(1)
+        if token not in NAME_TOKEN_PATTERNS:
+            raise ValueError(f"Неизвестный токен шаблона имени: {{{token}}}")
+        regex += re.escape(file_part[pos:match.start()])
+        # Повторный токен должен совпадать с первым вхождением
+        if token in seen:
+            regex += f"(?P={token})"
+        else:
+            regex += f"(?P<{token}>{NAME_TOKEN_PATTERNS[token]})"
+            seen.add(token)
+        pos = match.end()
+    regex += re.escape(file_part[pos:])
+    return re.compile(regex + r"\Z", re.IGNORECASE)
+
+def format_backup_name(template, server_address, db, backup_type, timestamp, stripe=1):
+    """Относительный путь файла бэкапа по шаблону (разделитель папок - обратный слэш)"""
+    compile_name_template(template)     # проверка токенов
+    server, instance = split_server_address(server_address)
+    values = {
+        'server': server,
+        'instance': instance,
+        'db': db,
+        'type': backup_type,
+        'timestamp': timestamp.strftime(NAME_TIMESTAMP_FORMAT),
+        'stripe': stripe,
+    }
+    name = TEMPLATE_TOKEN_PATTERN.sub(lambda m: str(values[m.group(1)]), template)
+    return name.replace('/', '\\')
+
+# Разборщики имен: (число папок в шаблоне, выражение) - текущий шаблон с номером части и без него
+# (файлы, записанные при другом BACKUP_STRIPES), затем прежние форматы
+NAME_PARSERS = [(t.replace('\\', '/').count('/'), compile_name_template(t)) for t in
+                dict.fromkeys((stripe_template(BACKUP_NAME_TEMPLATE, 2), BACKUP_NAME_TEMPLATE)
+                              + LEGACY_NAME_TEMPLATES)]
+
+def backup_disk_clause(target_path, server_address, db, backup_type, timestamp=None, mirror_paths=()):
+    """Часть "TO DISK = ... [MIRROR TO DISK = ...]" команды бэкапа по шаблону имени
+    и команды создания папок на сервере (для основного пути и каждого зеркала)"""
+    timestamp = timestamp or datetime.now()
+    template = stripe_template(BACKUP_NAME_TEMPLATE, BACKUP_STRIPES)
+    relative_names = [format_backup_name(template, server_address, db, backup_type, timestamp, stripe)
+                      for stripe in range(1, max(BACKUP_STRIPES, 1) + 1)]
+    create_commands = []
+    clauses = []
+    for index, path in enumerate((target_path,) + tuple(mirror_paths)):
+        folders = [name.rsplit('\\', 1)[0] for name in relative_names if '\\' in name]
+        create_commands += [f"EXEC master.sys.xp_create_subdir N'{sql_quote(path + folder)}'"
+                            for folder in dict.fromkeys(folders)]
+        disks = ", ".join(f"DISK = N'{sql_quote(path + name)}'" for name in relative_names)
+        clauses.append(f"{'MIRROR TO' if index else 'TO'} {disks}")
+    return create_commands, " ".join(clauses)
+
+def backup_clause_files(clause):
+    """Файлы (пути или URL) основного набора носителей из части "TO ..." команды бэкапа"""
+    main_part = re.split(r"\sMIRROR\s+TO\s", clause, flags=re.IGNORECASE)[0]
+    return [p.replace("''", "'") for p in
+            re.findall(r"\b(?:DISK|URL)\s*=\s*N?'((?:[^']|'')+)'", main_part, flags=re.IGNORECASE)]
+
+def normalize_guid(value):
+    """GUID из msdb/RESTORE HEADERONLY в едином виде (None - нет значения)"""
+    return str(value).strip('{}').lower() if value else None
+
+def server_file_exists(cursor, path):
+    """Есть ли файл бэкапа на сервере: пути DISK = ... - пути сервера, приложению они могут быть
+    недоступны или вести к другому файлу (объекты S3 не проверяются)"""
+    if path.startswith('s3://'):
+        return True
+    cursor.execute("EXECUTE master.dbo.xp_fileexist ?", path)
+    return bool(cursor.fetchone()[0])
+
+def backup_media_clause(files):
+    """Часть "DISK = ..., URL = ..." команды восстановления для файлов на диске и в S3"""
+    return ", ".join(f"{'URL' if path.startswith('s3://') else 'DISK'} = N'{sql_quote(path)}'"
+                     for path in files)
+
+# Задания SQL Server Agent: метка времени-заготовка в именах файлов (заменяется при каждом запуске)
+# и состояния запусков из sysjobhistory
+AGENT_TIMESTAMP = datetime(2000, 1, 1)
+AGENT_RUN_STATUS = {0: ("Ошибка", '#f44336'), 1: ("Успешно", '#4CAF50'), 2: ("Повтор", '#ff9800'),
+                    3: ("Отменено", '#ff9800'), 4: ("Выполняется", '#2196F3')}
+
+def agent_backup_step(commands, guard_db=None):
+    """Текст шага задания SQL Agent: команды собираются на сервере при каждом запуске, метка
+    AGENT_TIMESTAMP в именах файлов заменяется текущим временем. guard_db - база группы доступности:
+    бэкап только на предпочтительной реплике, на вторичной - с COPY_ONLY (последняя команда - BACKUP)."""
+    stamp = AGENT_TIMESTAMP.strftime(NAME_TIMESTAMP_FORMAT)
+    literal = "N'" + sql_quote(";\n".join(commands)).replace(stamp, "' + @ts + N'") + "'"
+    lines = []
+    if guard_db:
+        lines.append(f"IF sys.fn_hadr_backup_is_preferred_replica(N'{sql_quote(guard_db)}') = 0 RETURN;")
+    lines.append("DECLARE @ts nvarchar(15) = FORMAT(GETDATE(), 'yyyyMMdd_HHmmss');")
+    lines.append(f"DECLARE @sql nvarchar(max) = {literal};")
+    if guard_db:
+        lines.append(f"IF sys.fn_hadr_is_primary_replica(N'{sql_quote(guard_db)}') = 0 SET @sql += N', COPY_ONLY';")
+    lines.append("EXEC (@sql);")
+    return "\n".join(lines)
+
+def agent_job_script(job_name, description, step, days_mask, start_time):
+    """Идемпотентная синхронизация задания SQL Agent: задание, шаг и еженедельное расписание
+    создаются при отсутствии и иначе обновляются на месте (история запусков сохраняется)"""
+    name = sql_quote(job_name)
+    schedule = (f"@freq_type = 8, @freq_interval = {days_mask}, @freq_recurrence_factor = 1, "
+                f"@active_start_time = {start_time}")
+    return f"""
+        SET NOCOUNT ON;
+        DECLARE @job_id uniqueidentifier, @schedule_id int;
+        SELECT @job_id = job_id FROM msdb.dbo.sysjobs WHERE name = N'{name}';
+        IF @job_id IS NULL
+        BEGIN
+            EXEC msdb.dbo.sp_add_job @job_name = N'{name}', @job_id = @job_id OUTPUT;
+            EXEC msdb.dbo.sp_add_jobserver @job_id = @job_id, @server_name = N'(local)';
+            EXEC msdb.dbo.sp_add_jobstep @job_id = @job_id, @step_name = N'Бэкап', @subsystem = N'TSQL',
+                 @database_name = N'master', @command = N'{sql_quote(step)}';
+        END
+        ELSE
+            EXEC msdb.dbo.sp_update_jobstep @job_id = @job_id, @step_id = 1, @command = N'{sql_quote(step)}';
+        EXEC msdb.dbo.sp_update_job @job_id = @job_id, @enabled = 1, @description = N'{sql_quote(description)}';
+        SELECT @schedule_id = js.schedule_id
+        FROM msdb.dbo.sysjobschedules js
+        JOIN msdb.dbo.sysschedules s ON s.schedule_id = js.schedule_id
+        WHERE js.job_id = @job_id AND s.name = N'{name}';
+        IF @schedule_id IS NULL
+            EXEC msdb.dbo.sp_add_jobschedule @job_id = @job_id, @name = N'{name}', {schedule};
+        ELSE
+            EXEC msdb.dbo.sp_update_schedule @schedule_id = @schedule_id, @enabled = 1, {schedule};
+    """
+
+def agent_job_pattern():
+    """Шаблон LIKE для заданий SQL Agent, созданных приложением"""
+    return re.sub(r"([\[%_])", r"[\1]", AGENT_JOB_PREFIX) + "%"
+
+def split_paths(text):
+    """Список путей из строки через ';' (с завершающим разделителем)"""
+    paths = []
+    for path in text.split(';'):
+        path = path.strip()
+        if path:
+            paths.append(path if path.endswith(("\\", "/")) else path + "\\")
+    return paths
+
+def parse_backup_name(filepath):
+    """Токены из пути файла: пробуются текущий шаблон и прежние форматы имен"""
+    parts = filepath.replace('\\', '/').split('/')
+    for depth, parser in NAME_PARSERS:
+        match = parser.match('/'.join(parts[-depth - 1:]))
+        if match:
+            return match.groupdict()
+    return None
+
+def parse_backup_file(filepath, size, mtime):
+    """Описание файла бэкапа по имени и атрибутам файла"""
+    filename = os.path.basename(filepath)
+    tokens = parse_backup_name(filepath)
+    
+    if tokens:
+        server_name = tokens.get('server') or "Неизвестно"
+        db_name = tokens.get('db') or "Неизвестно"
+    else:
+        # Имя не по шаблону: Сервер_База_...
+        name_parts = os.path.splitext(filename)[0].split('_')
+        server_name = name_parts[0] if len(name_parts) > 0 else "Неизвестно"
+        db_name = name_parts[1] if len(name_parts) > 1 else "Неизвестно"
+    
+    # Тип бэкапа: из токена шаблона, иначе по ключевым словам в имени
+    if tokens and tokens.get('type'):
+        backup_type = BACKUP_TYPE_TITLES[tokens['type'].upper().split('-')[0]]
+    else:
+        upper_name = filename.upper()
+        backup_type = "Полный"
+        if 'DIFF' in upper_name:
+            backup_type = "Диф"
+        elif 'LOG' in upper_name:
+            backup_type = "Лог"
+        elif 'SCHEDULED' in upper_name:
+            backup_type = "План"
+    
+    # Дата из имени файла, иначе дата модификации
+    if tokens and tokens.get('timestamp'):
+        ts = tokens['timestamp']
+        file_date = f"{ts[6:8]}.{ts[4:6]}.{ts[0:4]} {ts[9:11]}:{ts[11:13]}"
+    else:
+        file_date = datetime.fromtimestamp(mtime).strftime("%d.%m.%Y %H:%M")
+    
+    return {
+        'name': filename,
+        'server': server_name,
+        'database': db_name,
+        'size': size,
+        'date': file_date,
+        'path': filepath,
+        'type': backup_type,
+        'mtime': mtime,
+        # Номер части бэкапа в несколько файлов (токен {stripe}), None - бэкап одним файлом
+        'stripe': int(tokens['stripe']) if tokens and tokens.get('stripe') else None
+    }
+
+def stripe_set_key(file_info):
+    """Ключ набора частей бэкапа: папка и токены имени без номера части (None - бэкап одним файлом)"""
+    if file_info.get('stripe') is None:
+        return None
+    tokens = parse_backup_name(file_info['path'])
+    folder = re.sub(r"[^\\/]*\Z", "", file_info['path'])
+    return folder.lower(), tuple(sorted((k, (v or "").lower()) for k, v in tokens.items() if k != 'stripe'))
+
+def group_backup_stripes(files):
+    """Части одного бэкапа (BACKUP_STRIPES > 1) - одна запись списка: поля первой части, общий размер,
+    время последней части и 'parts' - записи частей по номеру. Остальные записи не меняются"""
+    grouped = []
+    sets = {}
+    for file_info in files:
+        key = stripe_set_key(file_info)
+        if key is None:
+            grouped.append(file_info)
+        else:
+            sets.setdefault(key, []).append(file_info)
+    for parts in sets.values():
+        parts.sort(key=lambda f: f['stripe'])
+        grouped.append(dict(parts[0], parts=parts, size=sum(f['size'] for f in parts),
+                            mtime=max(f['mtime'] for f in parts)))
+    return grouped
+
+def backup_parts(files):
+    """Физические файлы записей списка: для набора частей - каждая часть"""
+    return [part for file_info in files for part in file_info.get('parts', (file_info,))]
+
+def restore_media_files(text):
+    """Файлы бэкапа из поля восстановления: части бэкапа перечисляются через ';'"""
+    return [path.strip() for path in text.split(';') if path.strip()]
+
+def describe_media(files):
+    """Имя файла бэкапа для сообщений (для нескольких частей - с их числом)"""
+    name = re.split(r"[\\/]", files[0])[-1]
+    return f"{name} (частей: {len(files)})" if len(files) > 1 else name
+
+def matches_any(value, patterns):
+    return any(fnmatch.fnmatchcase(value, pattern) for pattern in patterns)
+
+def list_backup_directory(path, include=('*.bak',), exclude=()):
+    """Содержимое одной папки: ({путь файла: (размер, время изменения)}, [подпапки], время изменения папки)"""
+    include = [p.lower() for p in include]
+    exclude = [p.lower() for p in exclude]
+    dir_mtime = os.stat(path).st_mtime
+    files = {}
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            name = entry.name.lower()
+            # Исключения проверяются и по имени, и по полному пути
+            if exclude and (matches_any(name, exclude) or matches_any(entry.path.lower(), exclude)):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif matches_any(name, include) and entry.is_file():
+                stat = entry.stat()
+                files[entry.path] = (stat.st_size, stat.st_mtime)
+    return files, subdirs, dir_mtime
+
+def scan_backup_roots(roots, max_depth=0, include=('*.bak',), exclude=(), max_workers=SCAN_MAX_WORKERS):
+    """Параллельный обход нескольких корней: каждая папка читается отдельной задачей пула"""
+    files = {}
+    dirs = {}       # {папка: (глубина, время изменения)}
+    timings = {root: {'seconds': 0.0, 'files': 0, 'dirs': 0} for root in roots}
+    errors = []
+    t0 = time.perf_counter()
+    
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(list_backup_directory, root, include, exclude): (root, root, 0)
+                   for root in roots}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root, path, depth = pending.pop(future)
+                try:
+                    dir_files, subdirs, dir_mtime = future.result()
+                except OSError as e:
+                    errors.append(f"{path}: {e}")
+                    continue
+                    
+                dirs[path] = (depth, dir_mtime)
+                files.update(dir_files)
+                stats = timings[root]
+                stats['files'] += len(dir_files)
+                stats['dirs'] += 1
+                stats['seconds'] = time.perf_counter() - t0
+                
+                if depth < max_depth:
+                    for subdir in subdirs:
+                        pending[pool.submit(list_backup_directory, subdir, include, exclude)] = \
+                            (root, subdir, depth + 1)
+    
+    return files, dirs, timings, errors
+
+def find_retention_candidates(found, retention_days, now=None):
+    """Файлы бэкапов старше срока хранения из результата scan_backup_roots ({путь: (размер, время)}).
+    Цепочки восстановления не разрываются: для каждой базы каждого сервера сохраняются последний полный
+    бэкап со всеми DIFF/LOG после него, а также полный бэкап, на который опираются еще не устаревшие
+    DIFF/LOG. Файлы, не относящиеся по имени к базе, не трогаются."""
+    if not retention_days:
+        return []
+    
+    # Наборы бэкапов по серверу и базе (в общую папку могут писать несколько серверов);
+    # полосы одного бэкапа - один набор
+    sets_by_db = {}
+    for path, (size, mtime) in found.items():
+        tokens = parse_backup_name(path)
+        if not tokens or not tokens.get('db'):
+            continue
+        f = parse_backup_file(path, size, mtime)
+        key = (f['type'], tokens.get('timestamp') or mtime)
+        backup_set = sets_by_db.setdefault((f['server'].lower(), f['database'].lower()), {}).setdefault(
+            key, {'type': f['type'], 'mtime': mtime, 'files': []})
+        backup_set['mtime'] = min(backup_set['mtime'], mtime)
+        backup_set['files'].append(f)
+    
+    cutoff = (now if now is not None else time.time()) - retention_days * 86400
+    candidates = []
+    for sets in sets_by_db.values():
+        sets = sorted(sets.values(), key=lambda s: s['mtime'])
+        bases = [i for i, s in enumerate(sets) if s['type'] in FULL_BACKUP_TITLES]
+        if not bases:
+            continue        # цепочку не определить - ничего не удаляем
+        keep_from = bases[-1]
+        for i, s in enumerate(sets):
+            if s['mtime'] >= cutoff and s['type'] not in FULL_BACKUP_TITLES:
+                keep_from = min(keep_from, max((b for b in bases if b < i), default=0))
+        for s in sets[:keep_from]:
+            if s['mtime'] < cutoff:
+                candidates.extend(s['files'])
+    return candidates
+
+def replica_key(path):
+    """Ключ состояния копий файла: полный путь без учета регистра и вида разделителей
+    (файлы с одинаковым именем в разных папках не смешиваются)"""
+    return path.replace('\\', '/').lower()
+
+NETWORK_FILESYSTEMS = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'fuse.sshfs')
+
+def is_network_path(path):
+    """Сетевой путь (UNC или сетевая файловая система), где inotify не работает"""
+    if path.startswith('\\\\') or path.startswith('//'):
+        return True
+    if platform.system() != "Linux":
+        return False
+        
+    # Ищем точку монтирования с самым длинным совпадающим префиксом
+    try:
+        with open('/proc/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    path = os.path.abspath(path)
+    best_mount, best_type = "", ""
+    for mount_point, fs_type in mounts:
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                and len(mount_point) > len(best_mount):
+            best_mount, best_type = mount_point, fs_type
+    return best_type in NETWORK_FILESYSTEMS
+
+def odbc_connect(conn_str, **kwargs):
+    """Подключение к серверу (pyodbc и ODBC драйвер загружаются при первом подключении)"""
+    import pyodbc
+    return pyodbc.connect(conn_str, **kwargs)
+
+def replica_connection_string(conn_str, server):
+    """Строка подключения к другому серверу (реплике) с теми же учетными данными"""
+    address = AG_REPLICA_ADDRESS_MAP.get(server.upper(), server)
+    return re.sub(r"SERVER=[^;]*;", lambda m: f"SERVER={address};", conn_str, count=1, flags=re.IGNORECASE)
+
+def sample_database_sizes(conn):
+    """Снимок размеров баз: {база: [данные выделено, данные занято, журнал выделено, журнал занято]} в MB.
+    База, которую не удалось прочитать (нет доступа, сменила состояние во время снимка), пропускается."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sys.databases WHERE database_id > 4 AND state_desc = 'ONLINE' "
+                   "AND HAS_DBACCESS(name) = 1")
+    databases = [row[0] for row in cursor.fetchall()]
+    if not databases:
+        return {}
+    
+    def space_query(db):
+        return f"""
+            SELECT N'{sql_quote(db)}', SUM(total_page_count), SUM(allocated_extent_page_count)
+            FROM [{db.replace(']', ']]')}].sys.dm_db_file_space_usage"""
+    
+    # Обычно место в файлах данных всех баз читается одним запросом; если он не выполнился
+    # из-за одной из баз, базы опрашиваются по отдельности
+    try:
+        cursor.execute(" UNION ALL ".join(space_query(db) for db in databases))
+        rows = cursor.fetchall()
+    except Exception:
+        rows = []
+        for db in databases:
+            try:
+                cursor.execute(space_query(db))
+                rows += cursor.fetchall()
+            except Exception:
+                continue
+    # Страница - 8 KB, 128 страниц в MB
+    sizes = {name: [round((total or 0) / 128), round((used or 0) / 128), 0, 0]
+             for name, total, used in rows}
+    cursor.execute("""
+        SELECT RTRIM(instance_name), RTRIM(counter_name), cntr_value
+        FROM sys.dm_os_performance_counters
+        WHERE object_name LIKE '%:Databases%'
+          AND counter_name IN ('Log File(s) Size (KB)', 'Log File(s) Used Size (KB)')
+    """)
+    for name, counter, value in cursor.fetchall():
+        if name in sizes:
+            sizes[name][2 if counter == 'Log File(s) Size (KB)' else 3] = round(value / 1024)
+    return sizes
+
+def fetch_backup_history(conn, last_id, batch_size=1000):
+    """Новые записи backupset после last_id (в порядке backup_set_id) и новый last_id. Первая загрузка
+    (last_id = 0) начинается с бэкапов за последние HISTORY_SEED_DAYS дней, а не со всей истории msdb"""
+    cursor = conn.cursor()
+    if not last_id:
+        cursor.execute("""
+            SELECT ISNULL((SELECT MIN(backup_set_id) FROM msdb.dbo.backupset
+                           WHERE backup_finish_date >= DATEADD(day, -?, GETDATE())) - 1,
+                          (SELECT ISNULL(MAX(backup_set_id), 0) FROM msdb.dbo.backupset))
+        """, HISTORY_SEED_DAYS)
+        last_id = cursor.fetchone()[0]
+    rows = []
+    while True:
+        cursor.execute("""
+            SELECT TOP (?) bs.backup_set_id, bs.database_name, bs.type,
+                   bs.backup_start_date, bs.backup_finish_date,
+                   bs.backup_size, bs.compressed_backup_size,
+                   bmf.physical_device_name
+            FROM msdb.dbo.backupset bs
+            LEFT JOIN msdb.dbo.backupmediafamily bmf
+                   ON bmf.media_set_id = bs.media_set_id AND bmf.family_sequence_number = 1
+            WHERE bs.backup_set_id > ?
+            ORDER BY bs.backup_set_id
+        """, batch_size, last_id)
+        batch = cursor.fetchall()
+        for backup_set_id, db, backup_type, start, finish, size, compressed, device in batch:
+            rows.append({
+                'id': backup_set_id,
+                'db': db,
+                'type': backup_type,
+                'start': start.isoformat(timespec='seconds'),
+                'duration': max((finish - start).total_seconds(), 1),
+                'size': int(size or 0),
+                'compressed': int(compressed or size or 0),
+                'device': device or ""
+            })
+            last_id = backup_set_id
+        if len(batch) < batch_size:
+            return rows, last_id
+
+def trim_backup_history(rows, max_rows=None):
+    """Последние max_rows записей каждой базы (порядок записей сохраняется)"""
+    max_rows = HISTORY_MAX_ROWS if max_rows is None else max_rows
+    counts = {}
+    kept = []
+    for row in reversed(rows):
+        counts[row['db']] = counts.get(row['db'], 0) + 1
+        if counts[row['db']] <= max_rows:
+            kept.append(row)
+    kept.reverse()
+    return kept
+
+def growth_per_day(samples, index, window_days=30):
+    """Прирост значения (MB в сутки) по линейному тренду снимков за последние дни"""
+    if len(samples) < 2:
+        return 0.0
+    since = samples[-1][0] - window_days * 86400
+    points = [(s[0] / 86400, s[index]) for s in samples if s[0] >= since]
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(p[0] for p in points) / n
+    mean_y = sum(p[1] for p in points) / n
+    var = sum((p[0] - mean_x) ** 2 for p in points)
+    if not var:
+        return 0.0
+    return sum((p[0] - mean_x) * (p[1] - mean_y) for p in points) / var
+
+def save_json_file(path, data, indent=4):
+    """Запись данных в JSON файл"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+
+def predict_next_duration(durations, window=10):
+    """Прогноз длительности следующего запуска по линейному тренду последних запусков"""
+    samples = durations[-window:]
+    if not samples:
+        return None
+    if len(samples) < 3:
+        return sum(samples) / len(samples)
+        
+    # Метод наименьших квадратов: y = a + b * x
+    n = len(samples)
+    mean_x = (n - 1) / 2
+    mean_y = sum(samples) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(samples))
+    var = sum((x - mean_x) ** 2 for x in range(n))
+    slope = cov / var
+    predicted = mean_y + slope * (n - mean_x)
+    
+    # Тренд не должен давать отрицательную или заниженную оценку
+    return max(predicted, min(samples))
+
+def make_event(job_id, operation, started, duration, database=None, command="",
+               bytes_count=None, items=None, error=None):
+    """Структурированное событие метрик по одной операции"""
+    mb_per_sec = None
+    if bytes_count and duration > 0:
+        mb_per_sec = round(bytes_count / (1024**2) / duration, 2)
+    return {
+        'job_id': job_id,
+        'operation': operation,
+        'database': database,
+        'command': command[:500],
+        'start': started.isoformat(timespec='milliseconds'),
+        'end': (started + timedelta(seconds=duration)).isoformat(timespec='milliseconds'),
+        'duration': round(duration, 3),
+        'bytes': bytes_count,
+        'mb_per_sec': mb_per_sec,
+        'items': items,
+        'success': error is None,
+        'error': error
+    }
+
+def new_job_id():
+    """Короткий уникальный идентификатор задания"""
+    return uuid.uuid4().hex[:8]
+
+def parse_throttle_windows(spec, errors=None):
+    """Разбор окон ограничения нагрузки вида '08:00-19:00=50:200;...'.
+    Некорректные окна пропускаются и добавляются в errors"""
+    def to_minutes(value):
+        hours, minutes = value.strip().split(':')
+        return int(hours) * 60 + int(minutes)
+    
+    windows = []
+    for part in spec.split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            period, limits = part.split('=')
+            start, end = period.split('-')
+            job_mbps, _, global_mbps = limits.partition(':')
+            windows.append((to_minutes(start), to_minutes(end),
+                            float(job_mbps or 0), float(global_mbps or 0)))
+        except ValueError:
+            if errors is not None:
+                errors.append(part)
+    return windows
+
+# Окна из THROTTLE_WINDOWS; некорректные показываются в строке состояния после запуска
+THROTTLE_WINDOW_ERRORS = []
+THROTTLE_WINDOW_LIST = parse_throttle_windows(THROTTLE_WINDOWS, THROTTLE_WINDOW_ERRORS)
+
+def get_throttle_policy(now=None):
+    """Текущие лимиты нагрузки с учетом окон по времени"""
+    now = now or datetime.now()
+    minutes = now.hour * 60 + now.minute
+    for start, end, job_mbps, global_mbps in THROTTLE_WINDOW_LIST:
+        # Окно может переходить через полночь (22:00-06:00)
+        inside = start <= minutes < end if start <= end else (minutes >= start or minutes < end)
+        if inside:
+            return {'throttled': True, 'job_mbps': job_mbps, 'global_mbps': global_mbps}
+    return {'throttled': bool(THROTTLE_JOB_MBPS or THROTTLE_GLOBAL_MBPS),
+            'job_mbps': THROTTLE_JOB_MBPS, 'global_mbps': THROTTLE_GLOBAL_MBPS}
+
+class RateLimiter:
+    """Ограничение скорости (token bucket), безопасно для нескольких потоков"""
+
+    def __init__(self, mb_per_sec=0):
+        self.lock = threading.Lock()
+        self.mb_per_sec = None
+        self.set_rate(mb_per_sec)
+
+    def set_rate(self, mb_per_sec):
+        with self.lock:
+            if mb_per_sec == self.mb_per_sec:
+                return
+            self.mb_per_sec = mb_per_sec
+            self.rate = mb_per_sec * 1024**2
+            self.allowance = self.rate
+            self.last = time.monotonic()
+
+    def consume(self, nbytes):
+        """Ожидание, пока не будет доступно nbytes байт пропускной способности"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            self.allowance -= nbytes
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+# Общий лимит на все клиентские копирования
+GLOBAL_COPY_LIMITER = RateLimiter()
+
+COPY_CHUNK_SIZE = 8 * 1024**2
+
+def copy_file_throttled(src, dst, limiters=(), progress=None):
+    """Копирование файла блоками с учетом ограничителей скорости"""
+    import shutil
+    total = os.path.getsize(src)
+    copied = 0
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while True:
+            chunk = fsrc.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            for limiter in limiters:
+                limiter.consume(len(chunk))
+            fdst.write(chunk)
+            copied += len(chunk)
+            if progress:
+                progress(copied, total)
+    shutil.copystat(src, dst)
+    return copied
+
+class TransferCancelled(Exception):
+    """Передача файлов отменена из списка заданий"""
+
+class CancelToken:
+    """Отмена фоновой передачи: передается вместе с ограничителями скорости и прерывает
+    копирование перед очередным блоком (частью)"""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def consume(self, nbytes):
+        if self.cancelled:
+            raise TransferCancelled("Отменено пользователем")
+
+class ConcurrencyController:
+    """Адаптивное число одновременных бэкапов (AIMD) для пары "сервер → путь бэкапа".
+    Эпоха - столько завершенных бэкапов, сколько выполняется одновременно; по ней считаются общая
+    скорость (MB/s) и задержка задания (с на GB). Рост скорости больше ADAPTIVE_GAIN - уровень +1,
+    падение скорости или рост задержки в ADAPTIVE_LATENCY_FACTOR раз - уровень вдвое меньше, иначе
+    скорость вышла на плато и уровень сохраняется. Уровень запоминается для следующих запусков."""
+
+    def __init__(self, path=CONCURRENCY_FILE):
+        self.path = path
+        # {ключ: {'limit', 'level', 'mbps', 'latency', 'updated'}} - решение по последней эпохе
+        self.state = load_json_file(path, {})
+        self.epochs = {}
+
+    def limit(self, key):
+        return self.state.get(key, {}).get('limit', min(JOB_MAX_CONCURRENT, ADAPTIVE_MAX_CONCURRENT))
+
+    def record(self, key, started, nbytes, duration, saturated):
+        """Учет завершенного бэкапа; при смене уровня возвращает (прежний, новый, MB/s эпохи)"""
+        level = self.limit(key)
+        if not saturated:
+            # Хвост очереди: одновременно выполняется меньше заданий, чем уровень - скорость не показательна
+            self.epochs.pop(key, None)
+            return None
+        epoch = self.epochs.get(key)
+        if epoch is None or epoch['level'] != level:
+            epoch = self.epochs[key] = {'level': level, 'started': started, 'bytes': 0, 'busy': 0.0, 'jobs': 0}
+        epoch['started'] = min(epoch['started'], started)
+        epoch['bytes'] += nbytes
+        epoch['busy'] += duration
+        epoch['jobs'] += 1
+        if epoch['jobs'] < max(level, 2):
+            return None
+        del self.epochs[key]
+        
+        elapsed = (datetime.now() - epoch['started']).total_seconds()
+        mbps = epoch['bytes'] / 1024**2 / max(elapsed, 0.001)
+        latency = epoch['busy'] / max(epoch['bytes'] / 1024**3, 0.000001)
+        previous = self.state.get(key)
+        new_level = level
+        if previous is None or mbps > previous['mbps'] * (1 + ADAPTIVE_GAIN):
+            new_level = min(level + 1, ADAPTIVE_MAX_CONCURRENT)
+        elif mbps < previous['mbps'] * (1 - ADAPTIVE_GAIN) or latency > previous['latency'] * ADAPTIVE_LATENCY_FACTOR:
+            new_level = max(1, level // 2)
+        self.state[key] = {'limit': new_level, 'level': level, 'mbps': round(mbps, 2),
+                           'latency': round(latency, 2), 'updated': datetime.now().isoformat(timespec='seconds')}
+        try:
+            save_json_file(self.path, self.state)
+        except OSError:
+            pass
+        return (level, new_level, mbps) if new_level != level else None
+
+class PathStatus(QObject):
+    """Доступность и свободное место путей бэкапов, проверяемые в фоновых потоках: окно читает
+    последний известный результат и никогда не ждет недоступный UNC путь. После проверки
+    испускается updated(путь); результат старше TTL секунд обновляется при следующем обращении."""
+    updated = Signal(str)
+    TTL = 30
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.results = {}       # {путь: (time.monotonic(), существует, свободно байт или None)}
+        self.pending = set()
+
+    @staticmethod
+    def key(path):
+        return path.rstrip("\\/") or path
+
+    def probe(self, path):
+        import shutil
+        try:
+            exists, free = True, shutil.disk_usage(path).free
+        except OSError:
+            exists, free = os.path.exists(path), None
+        with self.lock:
+            self.results[self.key(path)] = (time.monotonic(), exists, free)
+            self.pending.discard(self.key(path))
+        self.updated.emit(path)
+
+    def refresh(self, path, force=False):
+        """Фоновая проверка пути (одна на путь, даже если предыдущая зависла на недоступной шаре)"""
+        if not path:
+            return
+        with self.lock:
+            cached = self.results.get(self.key(path))
+            if self.key(path) in self.pending or \
+                    (not force and cached and time.monotonic() - cached[0] < self.TTL):
+                return
+            self.pending.add(self.key(path))
+        threading.Thread(target=self.probe, args=(path,), daemon=True).start()
+
+    def get(self, path):
+        """(существует, свободно байт или None) по последней проверке, None - путь еще не проверялся"""
+        if not path:
+            return None
+        self.refresh(path)
+        with self.lock:
+            cached = self.results.get(self.key(path))
+        return cached[1:] if cached else None
+
+    def exists(self, path):
+        status = self.get(path)
+        return bool(status and status[0])
+
+    def free_space(self, path):
+        status = self.get(path)
+        return status[1] if status else None
+
+class S3Error(Exception):
+    """Ошибка ответа S3-совместимого хранилища"""
+
+    def __init__(self, status, code, message=""):
+        super().__init__(f"S3 {status} {code}: {message}" if message else f"S3 {status} {code}")
+        self.status = status
+        self.code = code
+
+class S3Client:
+    """Минимальный клиент S3-совместимого хранилища (подпись AWS Signature V4, адреса path-style)"""
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, region="us-east-1", timeout=60):
+        parsed = urllib.parse.urlsplit(endpoint if "://" in endpoint else "https://" + endpoint)
+        self.scheme = parsed.scheme
+        self.host = parsed.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.timeout = timeout
+
+    @property
+    def base_url(self):
+        """Адрес бакета в форме URL для BACKUP TO URL и имени CREDENTIAL"""
+        return f"s3://{self.host}/{self.bucket}"
+
+    def object_url(self, key):
+        return f"{self.base_url}/{key}"
+
+    def key_from_url(self, url):
+        prefix = self.base_url + "/"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+    @staticmethod
+    def encode_query(query):
+        """Строка параметров в каноническом виде (сортировка, кодирование по RFC 3986)"""
+        return "&".join(f"{urllib.parse.quote(str(k), safe='-_.~')}={urllib.parse.quote(str(v), safe='-_.~')}"
+                        for k, v in sorted(query.items()))
+
+    def sign(self, method, path, query, headers, payload_hash, amz_date):
+        """Заголовок Authorization (SigV4) для запроса"""
+        import hashlib
+        import hmac
+        values = {k.lower(): " ".join(str(v).split()) for k, v in headers.items()}
+        signed_headers = ";".join(sorted(values))
+        canonical_request = "\n".join([method, path, self.encode_query(query),
+                                       "".join(f"{k}:{values[k]}\n" for k in sorted(values)),
+                                       signed_headers, payload_hash])
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode()).hexdigest()])
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (amz_date[:8], self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                f"SignedHeaders={signed_headers}, Signature={signature}")
+
+    def request(self, method, key="", query=None, body=b"", headers=None):
+        """Подписанный запрос к бакету; возвращает (заголовки ответа, тело)"""
+        # Модули клиента S3 загружаются при первом запросе, а не при запуске приложения
+        import hashlib
+        import http.client
+        from xml.etree import ElementTree
+        query = query or {}
+        path = "/" + urllib.parse.quote(self.bucket) + ("/" + urllib.parse.quote(key, safe="/-_.~") if key else "")
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        payload_hash = hashlib.sha256(body).hexdigest()
+        headers = dict(headers or {})
+        headers.update({"Host": self.host, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash})
+        headers["Authorization"] = self.sign(method, path, query, headers, payload_hash, amz_date)
+        
+        target = path + ("?" + self.encode_query(query) if query else "")
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = connection_class(self.host, timeout=self.timeout)
+        try:
+            conn.request(method, target, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        if response.status >= 300:
+            code, message = str(response.status), response.reason
+            if data:
+                try:
+                    root = ElementTree.fromstring(data)
+                    code = root.findtext("Code") or code
+                    message = root.findtext("Message") or message
+                except ElementTree.ParseError:
+                    pass
+            raise S3Error(response.status, code, message)
+        return response.headers, data
+
+    @staticmethod
+    def parse_xml(data):
+        """Разбор XML ответа без пространства имен в тегах"""
+        from xml.etree import ElementTree
+        root = ElementTree.fromstring(data)
+        for element in root.iter():
+            element.tag = element.tag.rsplit("}", 1)[-1]
+        return root
+
+    def list_objects(self, prefix=""):
+        """Все объекты с префиксом (ListObjectsV2 по страницам): [(ключ, размер, время изменения)]"""
+        import calendar
+        objects = []
+        query = {"list-type": "2", "prefix": prefix}
+        while True:
+            _, data = self.request("GET", query=query)
+            root = self.parse_xml(data)
+            for item in root.iter("Contents"):
+                modified = item.findtext("LastModified", "")[:19]
+                mtime = calendar.timegm(time.strptime(modified, "%Y-%m-%dT%H:%M:%S")) if modified else 0
+                objects.append((item.findtext("Key"), int(item.findtext("Size", "0")), mtime))
+            token = root.findtext("NextContinuationToken")
+            if root.findtext("IsTruncated") != "true" or not token:
+                return objects
+            query["continuation-token"] = token
+
+    def head_object(self, key):
+        headers, _ = self.request("HEAD", key)
+        return int(headers.get("Content-Length", 0))
+
+    def get_range(self, key, start, end):
+        _, data = self.request("GET", key, headers={"Range": f"bytes={start}-{end}"})
+        return data
+
+    def put_object(self, key, data):
+        self.request("PUT", key, body=data)
+
+    def delete_object(self, key):
+        self.request("DELETE", key)
+
+    def create_multipart_upload(self, key):
+        _, data = self.request("POST", key, query={"uploads": ""})
+        return self.parse_xml(data).findtext("UploadId")
+
+    def upload_part(self, key, upload_id, number, data):
+        headers, _ = self.request("PUT", key, query={"partNumber": number, "uploadId": upload_id}, body=data)
+        return headers.get("ETag", "")
+
+    def list_parts(self, key, upload_id):
+        """Уже загруженные части незавершенной загрузки: {номер: ETag}"""
+        parts = {}
+        query = {"uploadId": upload_id}
+        while True:
+            _, data = self.request("GET", key, query=query)
+            root = self.parse_xml(data)
+            for part in root.iter("Part"):
+                parts[int(part.findtext("PartNumber"))] = part.findtext("ETag")
+            marker = root.findtext("NextPartNumberMarker")
+            if root.findtext("IsTruncated") != "true" or not marker:
+                return parts
+            query["part-number-marker"] = marker
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        body = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in sorted(parts.items())) + "</CompleteMultipartUpload>"
+        self.request("POST", key, query={"uploadId": upload_id}, body=body.encode())
+
+def get_s3_client():
+    """Клиент хранилища по настройкам (None - хранилище не настроено)"""
+    if not (S3_ENDPOINT and S3_BUCKET):
+        return None
+    return S3Client(S3_ENDPOINT, S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION)
+
+def s3_retry(action, retries=S3_RETRIES):
+    """Повтор операции с хранилищем при сетевых ошибках и ответах 5xx/429 (экспоненциальная пауза)"""
+    for attempt in range(retries + 1):
+        try:
+            return action()
+        except S3Error as e:
+            if attempt == retries or (e.status < 500 and e.status != 429):
+                raise
+        except OSError:
+            if attempt == retries:
+                raise
+        time.sleep(min(0.5 * 2 ** attempt, 30))
+
+def s3_key(relative_name):
+    """Ключ объекта: префикс из настроек и относительный путь файла"""
+    prefix = S3_PREFIX.strip("/")
+    name = relative_name.replace("\\", "/").lstrip("/")
+    return f"{prefix}/{name}" if prefix else name
+
+def backup_url_clause(client, server_address, db, backup_type, timestamp=None):
+    """Часть "TO URL = ..." команды бэкапа по шаблону имени (бэкап пишет в хранилище сам сервер)"""
+    timestamp = timestamp or datetime.now()
+    template = stripe_template(BACKUP_NAME_TEMPLATE, BACKUP_STRIPES)
+    urls = [client.object_url(s3_key(format_backup_name(template, server_address, db, backup_type,
+                                                        timestamp, stripe)))
+            for stripe in range(1, max(BACKUP_STRIPES, 1) + 1)]
+    return "TO " + ", ".join(f"URL = N'{sql_quote(url)}'" for url in urls)
+
+def s3_upload_file(client, path, key, state, on_part=None, limiters=(), save_state=None):
+    """Загрузка файла в хранилище: небольшие файлы - одним PUT, остальные - составной загрузкой
+    частями параллельно с повторами. state - запись незавершенной загрузки (upload_id и ETag
+    частей); при совпадении файла загрузка продолжается с недостающих частей, save_state вызывается
+    после начала новой составной загрузки."""
+    size = os.path.getsize(path)
+    mtime = os.path.getmtime(path)
+    part_size = max(S3_PART_SIZE_MB * 1024**2, -(-size // S3_MAX_PARTS))
+    
+    if size <= part_size:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for limiter in limiters:
+            limiter.consume(len(data))
+        s3_retry(lambda: client.put_object(key, data))
+        if on_part:
+            on_part(len(data))
+        return size
+    
+    parts = {}
+    if state.get('upload_id') and (state.get('key'), state.get('size'), state.get('mtime')) == (key, size, mtime):
+        try:
+            parts = s3_retry(lambda: client.list_parts(key, state['upload_id']))
+        except S3Error as e:
+            if e.status != 404:
+                raise
+            state.clear()
+    else:
+        # Файл или ключ изменились: прежняя составная загрузка не продолжается
+        state.clear()
+    if not state.get('upload_id'):
+        state.update(key=key, size=size, mtime=mtime,
+                     upload_id=s3_retry(lambda: client.create_multipart_upload(key)))
+        if save_state:
+            save_state()
+    upload_id = state['upload_id']
+    
+    def upload(number):
+        offset = (number - 1) * part_size
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(part_size)
+        for limiter in limiters:
+            limiter.consume(len(data))
+        etag = s3_retry(lambda: client.upload_part(key, upload_id, number, data))
+        parts[number] = etag
+        if on_part:
+            on_part(len(data))
+    
+    total_parts = -(-size // part_size)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=S3_MAX_WORKERS) as pool:
+        for future in [pool.submit(upload, n) for n in range(1, total_parts + 1) if n not in parts]:
+            future.result()
+    s3_retry(lambda: client.complete_multipart_upload(key, upload_id, parts))
+    state.clear()
+    return size
+
+def s3_download_file(client, key, dst, on_part=None, limiters=()):
+    """Скачивание объекта параллельными ranged GET во временный файл .part"""
+    size = s3_retry(lambda: client.head_object(key))
+    part_size = S3_PART_SIZE_MB * 1024**2
+    tmp = dst + ".part"
+    with open(tmp, 'wb') as f:
+        f.truncate(size)
+    
+    def fetch(start):
+        end = min(start + part_size, size) - 1
+        data = s3_retry(lambda: client.get_range(key, start, end))
+        if len(data) != end - start + 1:
+            raise OSError(f"Неполный ответ для диапазона {start}-{end}: {len(data)} байт")
+        for limiter in limiters:
+            limiter.consume(len(data))
+        with open(tmp, 'r+b') as f:
+            f.seek(start)
+            f.write(data)
+        if on_part:
+            on_part(len(data))
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=S3_MAX_WORKERS) as pool:
+            for future in [pool.submit(fetch, start) for start in range(0, size, part_size)]:
+                future.result()
+    except Exception:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, dst)
+    return size
 
 class Worker(QThread):
     progress = Signal(str)
     finished = Signal(bool, str)
+    event = Signal(dict)
 
-    def __init__(self, connection_str, sql_commands, operation_name):
+    def __init__(self, connection_str, sql_commands, operation_name, job_id=None, cleanup_commands=None):
         super().__init__()
         self.conn_str = connection_str
         self.sql_commands = sql_commands
         self.operation_name = operation_name
+        self.job_id = job_id or new_job_id()
+        # Команды, выполняемые после операции и при ошибке (например, возврат MULTI_USER)
+        self.cleanup_commands = cleanup_commands or []
+        # Сессия на сервере (для отмены через KILL)
+        self.spid = None
+        self.cancelled = False
+        # Выполненные бэкапы по первому файлу: {'guid': backup_set_guid, 'copy_only': bool}
+        self.backup_sets = {}
 
     def run(self):
+        # Подключение (время получения соединения записывается отдельным событием)
+        started = datetime.now()
+        t0 = time.perf_counter()
+        try:
+            conn = odbc_connect(self.conn_str, autocommit=True)
+        except Exception as e:
+            self.event.emit(make_event(self.job_id, 'connect', started, time.perf_counter() - t0,
+                                       command=self.operation_name, error=str(e)))
+            self.finished.emit(False, f"Ошибка SQL: {str(e)}")
+            return
+        self.event.emit(make_event(self.job_id, 'connect', started, time.perf_counter() - t0,
+                                   command=self.operation_name))
+        
+        success = False
+        sql, operation, database = "", 'sql', None
         try:
-            conn = pyodbc.connect(self.conn_str, autocommit=True)
             cursor = conn.cursor()
+            cursor.execute("SELECT @@SPID")
+            self.spid = cursor.fetchone()[0]
             
             # Выполнение команд (BACKUP/RESTORE)
             for sql in self.sql_commands:
+                if self.cancelled:
+                    raise RuntimeError("Операция отменена")
                 self.progress.emit(f"Выполнение: {sql[:60]}...")
-                cursor.execute(sql)
-                while cursor.nextset(): 
-                    pass
+                match = COMMAND_PATTERN.match(sql)
+                operation = match.group(1).lower() if match else 'sql'
+                database = match.group(2) if match else None
+                
+                started = datetime.now()
+                t0 = time.perf_counter()
+                try:
+                    cursor.execute(sql)
+                    while cursor.nextset(): 
+                        pass
+                except Exception as e:
+                    self.event.emit(make_event(self.job_id, operation, started, time.perf_counter() - t0,
+                                               database, sql, error=str(e)))
+                    raise
+                duration = time.perf_counter() - t0
+                
+                bytes_count = self.get_bytes_count(cursor, operation, database, sql)
+                self.event.emit(make_event(self.job_id, operation, started, duration,
+                                           database, sql, bytes_count))
             
+            success = True
+            message = f"Операция '{self.operation_name}' успешно завершена!"
+        except Exception as e:
+            message = f"Ошибка SQL: {str(e)}"
+        finally:
+            self.spid = None
+            if self.cancelled and not success:
+                message = self.describe_cancel(sql, operation, database)
+            cleanup_errors = self.run_cleanup(conn)
+            try:
+                conn.close()
+            except Exception:
+                pass
+        
+        # После успешной операции ошибки очистки ожидаемы (например, база в NORECOVERY)
+        if cleanup_errors and not success:
+            message += "\n\n⚠️ Не удалось вернуть базу в рабочий режим:\n" + "\n".join(cleanup_errors)
+        self.finished.emit(success, message)
+
+    def cancel(self):
+        """Отмена операции: KILL сессии с отдельного подключения (в фоне, без блокировки окна)"""
+        self.cancelled = True
+        if self.spid is not None:
+            threading.Thread(target=self.kill_session, args=(self.spid,), daemon=True).start()
+
+    def kill_session(self, spid):
+        started = datetime.now()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            conn = odbc_connect(self.conn_str, autocommit=True)
+            conn.cursor().execute(f"KILL {int(spid)}")
             conn.close()
-            self.finished.emit(True, f"Операция '{self.operation_name}' успешно завершена!")
+            self.progress.emit(f"Отмена: сессия {spid} завершается на сервере...")
         except Exception as e:
-            self.finished.emit(False, f"Ошибка SQL: {str(e)}")
+            error = str(e)
+            self.progress.emit(f"Не удалось отменить операцию (KILL {spid}): {error}")
+        self.event.emit(make_event(self.job_id, 'kill', started, time.perf_counter() - t0,
+                                   command=f"KILL {spid}", error=error))
+
+    def describe_cancel(self, sql, operation, database):
+        """Итог отмены: удаление неполных файлов бэкапа и состояние базы после прерванного восстановления.
+        Пути DISK = ... - серверные, поэтому файлы удаляются и проверяются на сервере."""
+        message = f"Операция '{self.operation_name}' отменена"
+        if operation == 'backup':
+            removed, left = [], []
+            paths = [path.replace("''", "'") for path in DISK_LIST_PATTERN.findall(sql)]
+            try:
+                conn = odbc_connect(self.conn_str, autocommit=True)
+                cursor = conn.cursor()
+                for path in paths:
+                    if not server_file_exists(cursor, path):
+                        continue
+                    try:
+                        cursor.execute("EXECUTE master.dbo.xp_delete_file 0, ?", path)
+                    except Exception:
+                        pass
+                    (left if server_file_exists(cursor, path) else removed).append(path)
+                conn.close()
+            except Exception as e:
+                message += f"\n\nНе удалось проверить файлы бэкапа на сервере: {str(e)}"
+                left = [p for p in paths if p not in removed]
+            if removed:
+                message += "\n\nУдалены неполные файлы бэкапа:\n" + "\n".join(removed)
+            if left:
+                message += "\n\n⚠️ Не удалось удалить неполные файлы (удалите вручную):\n" + "\n".join(left)
+        elif operation == 'restore' and database:
+            try:
+                conn = odbc_connect(self.conn_str, autocommit=True)
+                cursor = conn.cursor()
+                cursor.execute("SELECT state_desc FROM sys.databases WHERE name = ?", database)
+                row = cursor.fetchone()
+                conn.close()
+                state = row[0] if row else "не существует"
+                message += f"\n\nСостояние базы '{database}': {state}"
+                if state == 'RESTORING':
+                    message += "\n⚠️ Восстановление не завершено - база недоступна до повторного восстановления"
+            except Exception as e:
+                message += f"\n\nНе удалось проверить состояние базы '{database}': {str(e)}"
+        return message
+
+    def run_cleanup(self, conn):
+        """Выполнение команд очистки; при обрыве соединения - через новое подключение"""
+        errors = []
+        for sql in self.cleanup_commands:
+            started = datetime.now()
+            t0 = time.perf_counter()
+            error = None
+            for attempt in range(2):
+                try:
+                    if attempt:
+                        conn = odbc_connect(self.conn_str, autocommit=True)
+                    cursor = conn.cursor()
+                    cursor.execute(sql)
+                    while cursor.nextset():
+                        pass
+                    error = None
+                    break
+                except Exception as e:
+                    error = str(e)
+            self.event.emit(make_event(self.job_id, 'cleanup', started, time.perf_counter() - t0,
+                                       command=sql, error=error))
+            if error:
+                errors.append(f"{sql}: {error}")
+        return errors
+
+    def get_bytes_count(self, cursor, operation, database, sql):
+        """Объем записанных (бэкап) или прочитанных (восстановление) данных"""
+        try:
+            if operation == 'backup':
+                # Набор бэкапа ищется по его собственному файлу: последний набор базы в msdb
+                # может принадлежать параллельному заданию
+                files = backup_clause_files(sql)
+                if not files:
+                    return None
+                cursor.execute("""
+                    SELECT TOP 1 COALESCE(bs.compressed_backup_size, bs.backup_size),
+                           bs.backup_set_guid, bs.is_copy_only
+                    FROM msdb.dbo.backupset bs
+                    JOIN msdb.dbo.backupmediafamily mf ON mf.media_set_id = bs.media_set_id
+                    WHERE mf.physical_device_name = ?
+                    ORDER BY bs.backup_set_id DESC
+                """, files[0])
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                self.backup_sets[files[0]] = {'guid': normalize_guid(row[1]), 'copy_only': bool(row[2])}
+                return int(row[0]) if row[0] is not None else None
+            if operation == 'restore':
+                disk = DISK_PATTERN.search(sql)
+                path = disk.group(1).replace("''", "'") if disk else ""
+                if path and os.path.exists(path):
+                    return os.path.getsize(path)
+        except Exception:
+            pass
+        return None
+
+class TransferWorker(QThread):
+    """Фоновая передача файлов (копирование, репликация, S3) - задание в списке заданий
+    с отменой между блоками"""
+    progress = Signal(str)
+    finished = Signal(bool, str)
+    event = Signal(dict)
+
+    def __init__(self, job_id=None):
+        super().__init__()
+        self.job_id = job_id or new_job_id()
+        self.cancel_token = CancelToken()
+
+    @property
+    def cancelled(self):
+        return self.cancel_token.cancelled
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+class ReplicaWorker(TransferWorker):
+    """Фоновая репликация готовых файлов бэкапа на вторичные пути (параллельно, с лимитом скорости)"""
+    status = Signal(str, str, str)      # полный путь файла, путь назначения, состояние
+
+    def __init__(self, files, destinations, mbps=0, job_id=None):
+        super().__init__(job_id)
+        self.files = files
+        self.destinations = destinations
+        self.mbps = mbps
+        self.errors = []
+
+    def run(self):
+        tasks = [(src, dest) for src in self.files for dest in self.destinations]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=REPLICA_MAX_WORKERS) as pool:
+            for future in [pool.submit(self.replicate, src, dest) for src, dest in tasks]:
+                future.result()
+        done = len(tasks) - len(self.errors)
+        self.finished.emit(not self.errors, f"Скопировано файлов: {done} из {len(tasks)}"
+                           + "".join(f"\n{error}" for error in self.errors))
+
+    def replicate(self, src, dest):
+        name = os.path.basename(src.replace('\\', '/'))
+        dst = os.path.join(dest, name)
+        self.status.emit(src, dest, REPLICA_COPYING)
+        self.progress.emit(f"Репликация {name} → {dest}")
+        started = datetime.now()
+        t0 = time.perf_counter()
+        try:
+            # Во время копирования файл называется .part, чтобы неполная копия не выглядела готовой
+            copied = copy_file_throttled(src, dst + ".part",
+                                         (self.cancel_token, RateLimiter(self.mbps), GLOBAL_COPY_LIMITER))
+            os.replace(dst + ".part", dst)
+        except Exception as e:
+            if isinstance(e, TransferCancelled) and os.path.exists(dst + ".part"):
+                os.remove(dst + ".part")
+            self.errors.append(f"{src} -> {dest}: {e}")
+            self.event.emit(make_event(self.job_id, 'replicate', started, time.perf_counter() - t0,
+                                       command=f"{src} -> {dest}", error=str(e)))
+            self.status.emit(src, dest, f"{REPLICA_FAILED}: {e}")
+            return
+        self.event.emit(make_event(self.job_id, 'replicate', started, time.perf_counter() - t0,
+                                   command=f"{src} -> {dest}", bytes_count=copied))
+        self.status.emit(src, dest, REPLICA_DONE)
+
+class S3UploadWorker(TransferWorker):
+    """Фоновая загрузка готовых файлов бэкапа в S3 (состояние незавершенных загрузок сохраняется)"""
+    status = Signal(str, str, str)      # полный путь файла, адрес бакета, состояние
+
+    def __init__(self, client, files, mbps=0, job_id=None):
+        super().__init__(job_id)
+        self.client = client
+        self.files = files
+        self.mbps = mbps
+        self.lock = threading.Lock()
+        self.last_progress = 0
+
+    def run(self):
+        uploads = load_json_file(S3_UPLOAD_STATE_FILE, {})
+        limiter = RateLimiter(self.mbps)
+        dest = self.client.base_url
+        
+        def save_state():
+            with self.lock:
+                save_json_file(S3_UPLOAD_STATE_FILE, uploads, indent=None)
+        
+        errors = []
+        for i, src in enumerate(self.files, 1):
+            name = os.path.basename(src.replace('\\', '/'))
+            if self.cancelled:
+                errors.append(f"{src}: отменено пользователем")
+                self.status.emit(src, dest, f"{REPLICA_FAILED}: отменено пользователем")
+                continue
+            # Ключ повторяет папки шаблона имени относительно корня бэкапов
+            depth = NAME_PARSERS[0][0]
+            key = s3_key('/'.join(src.replace('\\', '/').split('/')[-depth - 1:]))
+            self.status.emit(src, dest, REPLICA_COPYING)
+            uploaded = [0]
+            started = datetime.now()
+            t0 = time.perf_counter()
+            
+            def on_part(nbytes):
+                with self.lock:
+                    uploaded[0] += nbytes
+                    now = time.perf_counter()
+                    if now - self.last_progress < 0.5:
+                        return
+                    self.last_progress = now
+                speed = uploaded[0] / (1024**2) / max(now - t0, 0.001)
+                self.progress.emit(f"Загрузка в S3 {name} ({i}/{len(self.files)}): "
+                                   f"{format_size(uploaded[0])}, {speed:.1f} MB/s")
+            
+            try:
+                size = s3_upload_file(self.client, src, key, uploads.setdefault(src, {}), on_part,
+                                      (self.cancel_token, limiter, GLOBAL_COPY_LIMITER), save_state)
+            except Exception as e:
+                # Начатая составная загрузка остается в файле состояния для продолжения
+                if not uploads.get(src):
+                    uploads.pop(src, None)
+                save_state()
+                errors.append(f"{src}: {e}")
+                self.event.emit(make_event(self.job_id, 's3_upload', started, time.perf_counter() - t0,
+                                           command=f"{src} -> {key}", error=str(e)))
+                self.status.emit(src, dest, f"{REPLICA_FAILED}: {e}")
+                continue
+            uploads.pop(src, None)
+            save_state()
+            self.event.emit(make_event(self.job_id, 's3_upload', started, time.perf_counter() - t0,
+                                       command=f"{src} -> {key}", bytes_count=size))
+            self.status.emit(src, dest, REPLICA_DONE)
+        
+        self.finished.emit(not errors, f"Загружено в S3 файлов: {len(self.files) - len(errors)} из {len(self.files)}"
+                           + "".join(f"\n{error}" for error in errors))
+
+class S3DownloadWorker(TransferWorker):
+    """Скачивание объектов из S3 параллельными ranged GET"""
+
+    def __init__(self, client, items, mbps=0, job_id=None):
+        super().__init__(job_id)
+        self.client = client
+        self.items = items          # [(ключ, локальный путь)]
+        self.mbps = mbps
+        self.lock = threading.Lock()
+        self.last_progress = 0
+
+    def run(self):
+        limiter = RateLimiter(self.mbps)
+        for i, (key, dst) in enumerate(self.items, 1):
+            name = key.rsplit('/', 1)[-1]
+            downloaded = [0]
+            started = datetime.now()
+            t0 = time.perf_counter()
+            
+            def on_part(nbytes):
+                with self.lock:
+                    downloaded[0] += nbytes
+                    now = time.perf_counter()
+                    if now - self.last_progress < 0.5:
+                        return
+                    self.last_progress = now
+                speed = downloaded[0] / (1024**2) / max(now - t0, 0.001)
+                self.progress.emit(f"Скачивание из S3 {name} ({i}/{len(self.items)}): "
+                                   f"{format_size(downloaded[0])}, {speed:.1f} MB/s")
+            
+            try:
+                size = s3_download_file(self.client, key, dst, on_part,
+                                        (self.cancel_token, limiter, GLOBAL_COPY_LIMITER))
+            except Exception as e:
+                self.event.emit(make_event(self.job_id, 's3_download', started, time.perf_counter() - t0,
+                                           command=key, error=str(e)))
+                self.finished.emit(False, f"Ошибка при скачивании из S3 ({name}):\n{str(e)}")
+                return
+            self.event.emit(make_event(self.job_id, 's3_download', started, time.perf_counter() - t0,
+                                       command=key, bytes_count=size))
+        
+        folders = sorted({os.path.dirname(dst) for _, dst in self.items})
+        self.finished.emit(True, f"Скачано из S3 {len(self.items)} файлов в папку:\n" + "\n".join(folders))
+
+class S3ListWorker(QThread):
+    """Список объектов бэкапов в S3 (постраничный ListObjectsV2, результат кешируется в файле)"""
+    finished = Signal(object, str)
+    event = Signal(dict)
+
+    def __init__(self, client, include, exclude, force=False):
+        super().__init__()
+        self.client = client
+        self.include = include
+        self.exclude = exclude
+        self.force = force
+
+    def run(self):
+        prefix = S3_PREFIX.strip('/') + '/' if S3_PREFIX.strip('/') else ''
+        cache_key = self.client.object_url(prefix)
+        cache = load_json_file(S3_LIST_CACHE_FILE, {})
+        entry = cache.get(cache_key)
+        if entry and not self.force and time.time() - entry['time'] < S3_LIST_CACHE_TTL:
+            objects = entry['objects']
+        else:
+            started = datetime.now()
+            t0 = time.perf_counter()
+            try:
+                objects = s3_retry(lambda: self.client.list_objects(prefix))
+            except Exception as e:
+                self.event.emit(make_event(new_job_id(), 's3_list', started, time.perf_counter() - t0,
+                                           command=cache_key, error=str(e)))
+                # При недоступном хранилище показываем последний известный список
+                self.finished.emit(entry['objects'] if entry else [], str(e))
+                return
+            self.event.emit(make_event(new_job_id(), 's3_list', started, time.perf_counter() - t0,
+                                       command=cache_key, items=len(objects)))
+            cache[cache_key] = {'time': time.time(), 'objects': objects}
+            try:
+                save_json_file(S3_LIST_CACHE_FILE, cache, indent=None)
+            except OSError:
+                pass
+        
+        # Маски - как при сканировании папок: без учета регистра, исключения по имени и по ключу
+        include = [p.lower() for p in self.include]
+        exclude = [p.lower() for p in self.exclude]
+        found = []
+        for key, size, mtime in objects:
+            name = key.rsplit('/', 1)[-1].lower()
+            if exclude and (matches_any(name, exclude) or matches_any(key.lower(), exclude)):
+                continue
+            if matches_any(name, include):
+                found.append((key, size, mtime))
+        self.finished.emit(found, "")
+
+def probe_preferred_replica(conn_str, server):
+    """Базы AG, для которых реплика server - предпочтительная для бэкапа"""
+    conn = odbc_connect(replica_connection_string(conn_str, server), autocommit=True, timeout=AG_CONNECT_TIMEOUT)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT name, sys.fn_hadr_backup_is_preferred_replica(name) "
+                    "FROM sys.databases WHERE replica_id IS NOT NULL")
+        return {name for name, preferred in cur.fetchall() if preferred}
+    finally:
+        conn.close()
+
+def fetch_ag_replicas(conn, databases):
+    """Состав групп доступности баз (запрос к подключенному серверу, без опроса реплик):
+    ({база: [(реплика, роль)]}, {база: группа}, {база: первичная реплика или None})"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT CAST(SERVERPROPERTY('IsHadrEnabled') AS int)")
+    if not cursor.fetchone()[0]:
+        return {}, {}, {}
+    # На вторичной реплике dm_hadr_availability_replica_states не содержит строки первичной -
+    # ее имя берется из состояния группы
+    cursor.execute("""
+        SELECT adc.database_name, ag.name, ar.replica_server_name, ISNULL(ars.role_desc, ''),
+               ags.primary_replica
+        FROM sys.availability_databases_cluster adc
+        JOIN sys.availability_groups ag ON ag.group_id = adc.group_id
+        JOIN sys.availability_replicas ar ON ar.group_id = ag.group_id
+        LEFT JOIN sys.dm_hadr_availability_replica_states ars ON ars.replica_id = ar.replica_id
+        LEFT JOIN sys.dm_hadr_availability_group_states ags ON ags.group_id = ag.group_id
+    """)
+    wanted = set(databases)
+    replicas, groups, primaries = {}, {}, {}
+    for db, group, replica, role, group_primary in cursor.fetchall():
+        if db in wanted:
+            replicas.setdefault(db, []).append((replica, role))
+            groups[db] = group
+            if role == 'PRIMARY':
+                primaries[db] = replica
+            elif group_primary:
+                primaries.setdefault(db, group_primary)
+    return replicas, groups, primaries
+
+class AgProbeWorker(QThread):
+    """Состав групп доступности баз и параллельный опрос реплик AG в фоне (отдельные подключения).
+    Результат: (реплики, группы, первичные реплики), {реплика: (базы с предпочтительной репликой, ошибка)}
+    и ошибка запроса состава групп. Реплики из fresh (свежий результат в кэше) не опрашиваются."""
+    finished = Signal(object, object, str)
+
+    def __init__(self, conn_str, databases, fresh=()):
+        super().__init__()
+        self.conn_str = conn_str
+        self.databases = list(databases)
+        self.fresh = set(fresh)
+
+    def run(self):
+        try:
+            conn = odbc_connect(self.conn_str, autocommit=True, timeout=AG_CONNECT_TIMEOUT)
+            try:
+                topology = fetch_ag_replicas(conn, self.databases)
+            finally:
+                conn.close()
+        except Exception as e:
+            self.finished.emit(None, {}, str(e).splitlines()[0])
+            return
+        replicas = topology[0]
+        servers = {replica for rows in replicas.values() for replica, _ in rows} - self.fresh
+        results = {}
+        if servers:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(len(servers), 8)) as pool:
+                futures = {server: pool.submit(probe_preferred_replica, self.conn_str, server)
+                           for server in servers}
+            for server, future in futures.items():
+                try:
+                    results[server] = (future.result(), None)
+                except Exception as e:
+                    results[server] = (None, str(e).splitlines()[0])
+        self.finished.emit(topology, results, "")
+
+class ProgressPoller(QThread):
+    """Процент выполнения запущенных заданий (sys.dm_exec_requests) - опрос серверов в фоне:
+    {(строка подключения, сессия): процент}"""
+    finished = Signal(object)
+
+    def __init__(self, sessions):
+        super().__init__()
+        self.sessions = sessions        # {строка подключения: [сессии]}
+
+    def run(self):
+        percents = {}
+        for conn_str, spids in self.sessions.items():
+            try:
+                conn = odbc_connect(conn_str, autocommit=True)
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT session_id, percent_complete FROM sys.dm_exec_requests "
+                                   f"WHERE session_id IN ({', '.join(str(int(s)) for s in spids)})")
+                    for session_id, percent in cursor.fetchall():
+                        percents[(conn_str, session_id)] = percent or None
+                finally:
+                    conn.close()
+            except Exception:
+                pass
+        self.finished.emit(percents)
+
+class SizeSampler(QThread):
+    """Фоновый снимок занятого и выделенного места по базам (отдельное подключение)"""
+    finished = Signal(object, str)
+    event = Signal(dict)
+
+    def __init__(self, connection_str):
+        super().__init__()
+        self.conn_str = connection_str
+
+    def run(self):
+        started = datetime.now()
+        t0 = time.perf_counter()
+        try:
+            conn = odbc_connect(self.conn_str, autocommit=True)
+            sizes = sample_database_sizes(conn)
+            conn.close()
+        except Exception as e:
+            self.event.emit(make_event(new_job_id(), 'size_sample', started, time.perf_counter() - t0,
+                                       error=str(e)))
+            self.finished.emit({}, str(e))
+            return
+        self.event.emit(make_event(new_job_id(), 'size_sample', started, time.perf_counter() - t0,
+                                   items=len(sizes)))
+        self.finished.emit(sizes, "")
+
+class HistorySyncWorker(QThread):
+    """Фоновая загрузка новых записей истории бэкапов из msdb (отдельное подключение)"""
+    finished = Signal(object, int, str)
+    event = Signal(dict)
+
+    def __init__(self, connection_str, server, last_id, silent):
+        super().__init__()
+        self.conn_str = connection_str
+        self.server = server
+        self.last_id = last_id
+        self.silent = silent
+
+    def run(self):
+        started = datetime.now()
+        t0 = time.perf_counter()
+        try:
+            conn = odbc_connect(self.conn_str, autocommit=True)
+            rows, last_id = fetch_backup_history(conn, self.last_id)
+            conn.close()
+        except Exception as e:
+            self.event.emit(make_event(new_job_id(), 'history_sync', started, time.perf_counter() - t0,
+                                       error=str(e)))
+            self.finished.emit([], self.last_id, str(e))
+            return
+        self.event.emit(make_event(new_job_id(), 'history_sync', started, time.perf_counter() - t0,
+                                   items=len(rows)))
+        self.finished.emit(rows, last_id, "")
+
+class CopyWorker(TransferWorker):
+    """Копирование файлов в фоне с ограничением скорости"""
+
+    def __init__(self, files, dest_folder, job_mbps=0, job_id=None):
+        super().__init__(job_id)
+        self.files = files
+        self.dest_folder = dest_folder
+        self.job_mbps = job_mbps
+        self.last_progress = 0
+
+    def run(self):
+        limiter = RateLimiter(self.job_mbps)
+        for i, file_info in enumerate(self.files, 1):
+            src = file_info['path']
+            dst = os.path.join(self.dest_folder, file_info['name'])
+            started = datetime.now()
+            t0 = time.perf_counter()
+            
+            def report(copied, total):
+                # Не чаще раза в полсекунды
+                now = time.perf_counter()
+                if now - self.last_progress < 0.5:
+                    return
+                self.last_progress = now
+                percent = copied * 100 // total if total else 100
+                speed = copied / (1024**2) / max(now - t0, 0.001)
+                self.progress.emit(f"Копирование {file_info['name']} ({i}/{len(self.files)}): "
+                                   f"{percent}%, {speed:.1f} MB/s")
+            
+            try:
+                copied = copy_file_throttled(src, dst, (self.cancel_token, limiter, GLOBAL_COPY_LIMITER), report)
+            except Exception as e:
+                # Неполная копия после отмены не остается в папке назначения
+                if isinstance(e, TransferCancelled) and os.path.exists(dst):
+                    os.remove(dst)
+                self.event.emit(make_event(self.job_id, 'copy', started, time.perf_counter() - t0,
+                                           file_info['database'], src, error=str(e)))
+                self.finished.emit(False, f"Ошибка при копировании файлов:\n{str(e)}")
+                return
+            self.event.emit(make_event(self.job_id, 'copy', started, time.perf_counter() - t0,
+                                       file_info['database'], src, copied))
+        
+        self.finished.emit(True, f"Скачано {len(self.files)} файлов в папку:\n{self.dest_folder}")
+
+class ScanWorker(QThread):
+    """Полное сканирование корневых папок бэкапов в фоне"""
+    finished = Signal(object, object, object, object)
+
+    def __init__(self, roots, max_depth, include, exclude):
+        super().__init__()
+        self.roots = roots
+        self.max_depth = max_depth
+        self.include = include
+        self.exclude = exclude
+
+    def run(self):
+        self.finished.emit(*scan_backup_roots(self.roots, self.max_depth, self.include, self.exclude))
+
+class FolderDeltaWorker(QThread):
+    """Фоновое чтение изменившихся папок и размеров растущих файлов"""
+    finished = Signal(object, object, object)
+
+    def __init__(self, scan_dirs, poll_dirs, recheck_files, include=('*.bak',), exclude=()):
+        super().__init__()
+        self.scan_dirs = set(scan_dirs)
+        self.poll_dirs = poll_dirs          # {папка: известное время изменения}
+        self.recheck_files = recheck_files
+        self.include = include
+        self.exclude = exclude
+
+    def run(self):
+        # Для сетевых папок сначала дешево сравниваем время изменения каталога
+        dir_mtimes = {}
+        for path, known_mtime in self.poll_dirs.items():
+            try:
+                dir_mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if dir_mtimes[path] != known_mtime:
+                self.scan_dirs.add(path)
+        
+        snapshots = {}
+        for path in self.scan_dirs:
+            try:
+                files, subdirs, _ = list_backup_directory(path, self.include, self.exclude)
+                snapshots[path] = (files, subdirs)
+            except OSError:
+                pass
+        
+        rechecked = {}
+        for path in self.recheck_files:
+            try:
+                stat = os.stat(path)
+                rechecked[path] = (stat.st_size, stat.st_mtime)
+            except OSError:
+                rechecked[path] = None
+        
+        self.finished.emit(snapshots, dir_mtimes, rechecked)
+
+class JsonLinesExporter:
+    """Экспорт событий в файл JSON-lines (одно событие на строку) с ротацией по размеру"""
+
+    def __init__(self, path, max_bytes=0):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def export(self, event):
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        if self.max_bytes:
+            try:
+                if os.path.getsize(self.path) + len(line.encode('utf-8')) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+            except FileNotFoundError:
+                pass
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+class PrometheusExporter:
+    """Агрегация событий в метрики и отдача их в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.server = None
+
+    @staticmethod
+    def format_labels(labels):
+        parts = []
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def add(self, name, labels, value):
+        key = (name, tuple(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def export(self, event):
+        operation = event['operation']
+        status = 'success' if event['success'] else 'error'
+        with self.lock:
+            self.add('sqlbackup_operations_total', [('operation', operation), ('status', status)], 1)
+            self.add('sqlbackup_operation_duration_seconds_sum', [('operation', operation)], event['duration'])
+            self.add('sqlbackup_operation_duration_seconds_count', [('operation', operation)], 1)
+            if event['bytes']:
+                self.add('sqlbackup_bytes_total', [('operation', operation)], event['bytes'])
+            if event['database'] and event['success']:
+                labels = (('operation', operation), ('database', event['database']))
+                self.gauges[('sqlbackup_last_duration_seconds', labels)] = event['duration']
+                if event['mb_per_sec'] is not None:
+                    self.gauges[('sqlbackup_last_throughput_mbps', labels)] = event['mb_per_sec']
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric_type, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+                declared = set()
+                for (name, labels), value in sorted(metrics.items()):
+                    base_name = re.sub(r'_(sum|count)$', '', name)
+                    if base_name not in declared:
+                        declared.add(base_name)
+                        kind = 'summary' if base_name != name else metric_type
+                        lines.append(f"# TYPE {base_name} {kind}")
+                    lines.append(f"{name}{self.format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start(self, host, port):
+        """Запуск HTTP endpoint /metrics в фоновом потоке"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+# Коды состояний заданий в API
+JOB_STATE_CODES = {JOB_QUEUED: 'queued', JOB_RUNNING: 'running', JOB_DONE: 'done',
+                   JOB_FAILED: 'failed', JOB_CANCELLED: 'cancelled'}
+
+class CatalogApi(QObject):
+    """Локальный HTTP/JSON API только для чтения: каталог файлов бэкапов и очередь заданий.
+    Запросы обслуживаются из снимков в памяти, которые публикует окно приложения; ETag - версия
+    снимка, поэтому опрос с If-None-Match не вызывает ни сканирования папок, ни сборки ответа."""
+    # Каталог еще не загружался - окно запускает сканирование (сигнал из потока HTTP сервера);
+    # если сканирование не дало снимка, запрос повторяется не чаще раза в CATALOG_REQUEST_RETRY секунд
+    catalog_requested = Signal()
+    CATALOG_REQUEST_RETRY = 30
 
-class BackupApp(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.lock = threading.Lock()
+        self.files = []         # записи файлов, новые сверху
+        self.files_by_db = {}   # {база в нижнем регистре: [записи]}
+        self.jobs = []
+        self.versions = {'backups': 0, 'jobs': 0}
+        # Версии нумеруются заново при каждом запуске: ETag включает метку процесса
+        self.instance = uuid.uuid4().hex[:12]
+        self.requested = None   # time.monotonic() последнего запроса сканирования
+        self.server = None
+
+    @staticmethod
+    def file_record(file_info):
+        return {
+            'name': file_info['name'],
+            'server': file_info['server'],
+            'database': file_info['database'],
+            'type': file_info['type'],
+            'size': file_info['size'],
+            'modified': datetime.fromtimestamp(file_info['mtime']).isoformat(timespec='seconds'),
+            'path': file_info['path'],
+            'parts': [part['path'] for part in backup_parts([file_info])],
+            'remote': bool(file_info.get('remote')),
+        }
+
+    @staticmethod
+    def job_record(job):
+        return {
+            'id': job['id'],
+            'name': job['name'],
+            'state': JOB_STATE_CODES[job['state']],
+            'databases': sorted(job['databases']),
+            'server': job['server'],
+            'started': job['started'].isoformat(timespec='seconds') if job['started'] else None,
+            'duration': round(job['duration'], 1),
+            'percent': job['percent'],
+            'bytes': job['bytes'],
+            'message': job['message'],
+        }
+
+    def publish_files(self, files):
+        """Новый снимок каталога (индексы строятся вне блокировки)"""
+        records = sorted((self.file_record(f) for f in files), key=lambda r: r['modified'], reverse=True)
+        by_db = {}
+        for record in records:
+            by_db.setdefault(record['database'].lower(), []).append(record)
+        with self.lock:
+            self.files = records
+            self.files_by_db = by_db
+            self.versions['backups'] += 1
+
+    def publish_jobs(self, jobs):
+        records = [self.job_record(job) for job in jobs]
+        with self.lock:
+            if records != self.jobs:
+                self.jobs = records
+                self.versions['jobs'] += 1
+
+    @staticmethod
+    def page(items, params):
+        """Страница результатов: limit (до 10 страниц по умолчанию) и offset"""
+        try:
+            limit = min(int(params.get('limit', API_PAGE_SIZE)), API_PAGE_SIZE * 10)
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            raise ValueError("limit и offset должны быть числами")
+        if limit < 0 or offset < 0:
+            raise ValueError("limit и offset не могут быть отрицательными")
+        return {'total': len(items), 'offset': offset, 'limit': limit, 'items': items[offset:offset + limit]}
+
+    def filter_files(self, params):
+        """Записи каталога по фильтрам: db, server, type (FULL/DIFF/... или название, несколько через запятую), since/until
+        (дата ISO), remote (0/1), q - подстрока имени"""
+        db = params.get('db')
+        items = self.files_by_db.get(db.lower(), []) if db else self.files
+        if params.get('server'):
+            server = params['server'].lower()
+            items = [r for r in items if r['server'].lower() == server]
+        if params.get('type'):
+            types = {BACKUP_TYPE_TITLES.get(t.strip().upper(), t.strip()).lower() for t in params['type'].split(',')}
+            items = [r for r in items if r['type'].lower() in types]
+        if params.get('since'):
+            items = [r for r in items if r['modified'] >= params['since']]
+        if params.get('until'):
+            items = [r for r in items if r['modified'] < params['until']]
+        if params.get('remote') in ('0', '1'):
+            items = [r for r in items if r['remote'] == (params['remote'] == '1')]
+        if params.get('q'):
+            text = params['q'].lower()
+            items = [r for r in items if text in r['name'].lower()]
+        return items
+
+    def handle(self, path, params):
+        """Ответ на запрос: (код, тело, коллекция для ETag)"""
+        if path == '/api/status':
+            return 200, {'versions': dict(self.versions), 'backups': len(self.files), 'jobs': len(self.jobs),
+                         'catalog_loaded': self.versions['backups'] > 0}, None
+        if path in ('/api/backups', '/api/backups/latest'):
+            if not self.versions['backups']:
+                return 503, {'error': "Каталог файлов загружается, повторите запрос позже"}, None
+            if path == '/api/backups':
+                return 200, self.page(self.filter_files(params), params), 'backups'
+            # Последний бэкап каждой базы (по умолчанию полный, в том числе по расписанию)
+            params.setdefault('type', 'FULL,SCHEDULED')
+            latest = {}
+            for record in self.filter_files(params):
+                latest.setdefault(record['database'].lower(), record)
+            return 200, {'items': sorted(latest.values(), key=lambda r: r['database'].lower())}, 'backups'
+        if path == '/api/jobs':
+            items = self.jobs
+            if params.get('state'):
+                states = set(params['state'].lower().split(','))
+                items = [j for j in items if j['state'] in states]
+            if params.get('db'):
+                db = params['db'].lower()
+                items = [j for j in items if db in (d.lower() for d in j['databases'])]
+            return 200, self.page(items, params), 'jobs'
+        return 404, {'error': f"Неизвестный путь: {path}"}, None
+
+    def start(self, host, port):
+        """Запуск HTTP сервера в фоновом потоке"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        api = self
+
+        class ApiHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                path = url.path.rstrip('/')
+                params = dict(urllib.parse.parse_qsl(url.query))
+                with api.lock:
+                    versions = dict(api.versions)
+                    collection = {'/api/backups': 'backups', '/api/backups/latest': 'backups',
+                                  '/api/jobs': 'jobs'}.get(path)
+                    etag = f'"{api.instance}-{collection}-{versions[collection]}"' if collection else None
+                    # Снимок не изменился - 304 без сборки ответа
+                    if etag and versions[collection]:
+                        tags = [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]
+                        if etag in tags or '*' in tags:
+                            self.send_response(304)
+                            self.send_header('ETag', etag)
+                            self.end_headers()
+                            return
+                    try:
+                        status, data, _ = api.handle(path, params)
+                    except ValueError as e:
+                        status, data = 400, {'error': str(e)}
+                if status == 503 and (api.requested is None or
+                                      time.monotonic() - api.requested > api.CATALOG_REQUEST_RETRY):
+                    api.requested = time.monotonic()
+                    api.catalog_requested.emit()
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if status == 200 and etag:
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', 'no-cache')
+                if status == 503:
+                    self.send_header('Retry-After', '5')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), ApiHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+class MetricsRecorder(QObject):
+    """Запись событий метрик во все подключенные экспортеры. Ошибка экспортера испускается
+    как failed(текст) - один раз, пока она повторяется (после успешной записи - снова)"""
+    failed = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.exporters = []
+        self.errors = {}        # {экспортер: текст последней ошибки}
+        self.lock = threading.Lock()
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def record(self, event):
+        with self.lock:
+            for exporter in self.exporters:
+                try:
+                    exporter.export(event)
+                    self.errors.pop(exporter, None)
+                except Exception as e:
+                    if self.errors.get(exporter) != str(e):
+                        self.errors[exporter] = str(e)
+                        self.failed.emit(f"{type(exporter).__name__}: {e}")
+
+# Условия выбора баз: size>10GB, state=ONLINE, recovery!=SIMPLE
+DB_CONDITION_PATTERN = re.compile(r"^(size|state|recovery)\s*(>=|<=|!=|=|>|<)\s*(.+)$", re.IGNORECASE)
+SIZE_UNITS_MB = {'': 1024, 'KB': 1 / 1024, 'MB': 1, 'GB': 1024, 'TB': 1024**2}
+
+def parse_db_predicate(text):
+    """Условие выбора баз из строки (условия через пробел, все должны выполняться):
+    re:<выражение> - имя по регулярному выражению, size>10GB / size<=500MB - размер (без единиц - GB),
+    state=ONLINE, recovery=FULL (также !=), иначе - маска имени (tenant_*)"""
+    checks = []
+    for token in text.split():
+        if token.lower().startswith('re:'):
+            try:
+                regex = re.compile(token[3:], re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"Неверное регулярное выражение '{token[3:]}': {e}")
+            checks.append(lambda db, regex=regex: regex.search(db['name']) is not None)
+            continue
+        match = DB_CONDITION_PATTERN.match(token)
+        if not match:
+            pattern = token.lower()
+            checks.append(lambda db, pattern=pattern: fnmatch.fnmatchcase(db['name'].lower(), pattern))
+            continue
+        field, op, value = match.group(1).lower(), match.group(2), match.group(3)
+        if field == 'size':
+            size = re.match(r"^([\d.]+)\s*([KMGT]?B?)$", value, re.IGNORECASE)
+            unit = size.group(2).upper() if size else ''
+            if not size or unit not in SIZE_UNITS_MB:
+                raise ValueError(f"Неверный размер '{value}' (пример: size>10GB)")
+            limit = float(size.group(1)) * SIZE_UNITS_MB[unit]
+            compare = {'>': float.__gt__, '<': float.__lt__, '>=': float.__ge__, '<=': float.__le__,
+                       '=': float.__eq__, '!=': float.__ne__}[op]
+            checks.append(lambda db, compare=compare, limit=limit:
+                          db['size_mb'] is not None and compare(float(db['size_mb']), limit))
+        else:
+            if op not in ('=', '!='):
+                raise ValueError(f"Для '{field}' допустимы только = и !=")
+            expected = value.upper()
+            checks.append(lambda db, field=field, expected=expected, equal=(op == '='):
+                          ((db[field] or '').upper() == expected) == equal)
+    if not checks:
+        raise ValueError("Пустое условие выбора")
+    return lambda db: all(check(db) for check in checks)
+
+class DatabaseListModel(QAbstractTableModel):
+    """Список баз для вкладки бэкапа: данные строк и множество отмеченных имен
+    (представление запрашивает только видимые ячейки)"""
+    selection_changed = Signal()
+    HEADERS = ["✓", "Имя Базы", "Размер", "Состояние", "Модель восстановления", "Занято (данные / журнал)"]
+    # Перечисления Qt заранее: data() вызывается для каждой видимой ячейки и при сортировке,
+    # а обращение к атрибутам Qt в PySide6 заметно медленнее
+    DISPLAY_ROLE, TOOLTIP_ROLE, FOREGROUND_ROLE = Qt.DisplayRole, Qt.ToolTipRole, Qt.ForegroundRole
+    CHECK_STATE_ROLE = Qt.CheckStateRole
+    CHECKED, UNCHECKED = Qt.Checked, Qt.Unchecked
+    ONLINE_COLOR, OFFLINE_COLOR = QColor('#4CAF50'), QColor(Qt.red)
+
+    def __init__(self, usage_provider, parent=None):
+        super().__init__(parent)
+        self.rows = []              # [{'name', 'size_mb', 'state', 'recovery'}]
+        self.selected = set()
+        # Колонка занятого места считается по запросу и кешируется
+        self.usage_provider = usage_provider
+        self.usage_cache = {}
+        self.sort_column = 1
+        self.sort_order = Qt.AscendingOrder
+
+    def set_rows(self, rows):
+        """Новый список баз; отметки сохраняются для баз, которые остались в сети"""
+        self.beginResetModel()
+        self.rows = rows
+        self.usage_cache = {}
+        online = {db['name'] for db in rows if db['state'] == 'ONLINE'}
+        self.selected &= online
+        self.rows.sort(key=self.sort_key_function(self.sort_column),
+                       reverse=self.sort_order == Qt.DescendingOrder)
+        self.endResetModel()
+        self.selection_changed.emit()
+
+    def sort_key_function(self, column):
+        if column == 0:
+            return lambda db: db['name'] in self.selected
+        if column == 1:
+            return lambda db: db['name'].lower()
+        if column == 2:
+            return lambda db: db['size_mb'] or 0
+        if column == 3:
+            return lambda db: db['state']
+        if column == 4:
+            return lambda db: db['recovery'] or ""
+        return lambda db: self.usage(db['name'])[2]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Сортировка самих строк ключом Python (сравнения через прокси на тысячах строк медленные)"""
+        self.sort_column, self.sort_order = column, order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        names = [self.rows[index.row()]['name'] for index in persistent]
+        self.rows.sort(key=self.sort_key_function(column), reverse=order == Qt.DescendingOrder)
+        positions = {db['name']: row for row, db in enumerate(self.rows)}
+        self.changePersistentIndexList(persistent, [self.index(positions[name], index.column())
+                                                    for name, index in zip(names, persistent)])
+        self.layoutChanged.emit()
+
+    def refresh_usage(self):
+        self.usage_cache = {}
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 5), self.index(len(self.rows) - 1, 5))
+
+    def selected_names(self):
+        """Отмеченные базы в порядке списка"""
+        return [db['name'] for db in self.rows if db['name'] in self.selected]
+
+    def set_selected(self, names, select=True):
+        """Отметка или снятие отметки с баз (только базы в сети)"""
+        names = {db['name'] for db in self.rows if db['name'] in names and db['state'] == 'ONLINE'}
+        if select:
+            self.selected |= names
+        else:
+            self.selected -= names
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, 0), [Qt.CheckStateRole])
+        self.selection_changed.emit()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        db = self.rows[index.row()]
+        if db['state'] != 'ONLINE':
+            return Qt.NoItemFlags | Qt.ItemIsSelectable
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def usage(self, name):
+        if name not in self.usage_cache:
+            self.usage_cache[name] = self.usage_provider(name)
+        return self.usage_cache[name]
+
+    def data(self, index, role=Qt.DisplayRole):
+        db = self.rows[index.row()]
+        column = index.column()
+        online = db['state'] == 'ONLINE'
+        if role == self.CHECK_STATE_ROLE and column == 0:
+            return self.CHECKED if db['name'] in self.selected else self.UNCHECKED
+        if role == self.DISPLAY_ROLE:
+            if column == 1:
+                return db['name']
+            if column == 2:
+                return f"{db['size_mb'] / 1024:.2f} GB" if db['size_mb'] is not None else "N/A"
+            if column == 3:
+                return db['state']
+            if column == 4:
+                return db['recovery'] or "N/A"
+            if column == 5:
+                return self.usage(db['name'])[0]
+        elif role == self.TOOLTIP_ROLE:
+            if column == 1 and not online:
+                return f"База не в сети: {db['state']}"
+            if column == 2 and db['size_mb'] is not None:
+                return f"{db['size_mb']:.2f} MB"
+            if column == 5:
+                return self.usage(db['name'])[1]
+        elif role == self.FOREGROUND_ROLE:
+            if column == 1 and not online:
+                return self.OFFLINE_COLOR
+            if column == 3:
+                return self.ONLINE_COLOR if online else self.OFFLINE_COLOR
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or index.column() != 0:
+            return False
+        name = self.rows[index.row()]['name']
+        if Qt.CheckState(value) == Qt.Checked:
+            self.selected.add(name)
+        else:
+            self.selected.discard(name)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.selection_changed.emit()
+        return True
+
+class DatabaseFilterProxy(QSortFilterProxyModel):
+    """Поиск по имени базы; сортировку выполняет сама модель"""
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+class FileListModel(QAbstractTableModel):
+    """Список файлов бэкапов: строки - записи parse_backup_file (новые сверху),
+    представление запрашивает только видимые ячейки"""
+    HEADERS = ["Имя файла", "Сервер", "База", "Размер", "Дата создания", "Тип", "Полный путь", "Копии"]
+    REPLICA_COLUMN = 7
+    DISPLAY_ROLE, TOOLTIP_ROLE, FOREGROUND_ROLE = Qt.DisplayRole, Qt.ToolTipRole, Qt.ForegroundRole
+    TYPE_COLORS = {"Полный": QColor('#4CAF50'), "Диф": QColor('#2196F3'), "Лог": QColor('#FF9800')}
+    REMOTE_COLOR = QColor('#2196F3')
+
+    def __init__(self, replica_provider, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        # Колонка копий: (текст, подсказка, цвет) или None по записи файла
+        self.replica_provider = replica_provider
+
+    def set_rows(self, rows):
+        """Новый список файлов (список не копируется)"""
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def insert_rows(self, rows):
+        """Новые файлы в начало списка"""
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self.rows[0:0] = rows
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def row_changed(self, row, first=0, last=None):
+        last = len(self.HEADERS) - 1 if last is None else last
+        self.dataChanged.emit(self.index(row, first), self.index(row, last))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        file_info = self.rows[index.row()]
+        column = index.column()
+        if column == self.REPLICA_COLUMN:
+            replicas = self.replica_provider(file_info)
+            if replicas is None:
+                return "" if role == self.DISPLAY_ROLE else None
+            text, tooltip, color = replicas
+            return {self.DISPLAY_ROLE: text, self.TOOLTIP_ROLE: tooltip, self.FOREGROUND_ROLE: color}.get(role)
+        if role == self.DISPLAY_ROLE:
+            if column == 0:
+                if len(file_info.get('parts', ())) > 1:
+                    return f"{file_info['name']} (частей: {len(file_info['parts'])})"
+                return file_info['name']
+            if column == 1:
+                return file_info['server']
+            if column == 2:
+                return file_info['database']
+            if column == 3:
+                return format_size(file_info['size'])
+            if column == 4:
+                return file_info['date']
+            if column == 5:
+                return file_info['type']
+            if column == 6:
+                return file_info['path']
+        elif role == self.TOOLTIP_ROLE:
+            if column == 6:
+                return "\n".join(part['path'] for part in file_info.get('parts', (file_info,)))
+        elif role == self.FOREGROUND_ROLE:
+            if column == 5:
+                return self.TYPE_COLORS.get(file_info['type'])
+            if column == 6 and file_info.get('remote'):
+                return self.REMOTE_COLOR
+        return None
+
+class FileFilterProxy(QSortFilterProxyModel):
+    """Фильтры вкладки файлов: подстроки сервера, базы и даты (без учета регистра)"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filters = ("", "", "")
+
+    def set_filters(self, server, db, date):
+        self.filters = (server.lower(), db.lower(), date.lower())
+        self.invalidateFilter()
+
+    def is_active(self):
+        return any(self.filters)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        server, db, date = self.filters
+        file_info = self.sourceModel().rows[source_row]
+        return ((not server or server in file_info['server'].lower())
+                and (not db or db in file_info['database'].lower())
+                and (not date or date in file_info['date'].lower()))
+
+class BackupApp(QMainWindow):
+    def __init__(self, benchmark_startup=False):
+        super().__init__()
+        self.benchmark_startup = benchmark_startup
+        self.startup_ms = None
         self.setWindowTitle("SQL Server Backup Manager")
         self.resize(1200, 800)
         
@@ -61,10 +2496,68 @@ class BackupApp(QMainWindow):
         self.connection = None
         self.conn_str_cache = ""
         self.history = self.load_history()
+        self.backup_history = load_json_file(BACKUP_HISTORY_FILE, {})
+        # Снимки размеров баз: {сервер: {база: [[время, данные выд., данные занято, журнал выд., журнал занято], ...]}}
+        self.size_history = load_json_file(SIZE_HISTORY_FILE, {})
+        self.size_sampler = None
+        # Загрузка истории из msdb в фоне; повтор после текущей, если запрошен во время нее
+        self.history_sync = None
+        self.history_sync_rerun = False
+        # Состояние копий файлов бэкапа: {replica_key(путь файла): {путь назначения: состояние}};
+        # незавершенные при прошлом запуске копирования считаются прерванными. Записи прежнего
+        # формата (ключ - только имя файла) не сопоставить с папкой и не загружаются
+        self.replica_status = {key: statuses for key, statuses in load_json_file(REPLICA_STATUS_FILE, {}).items()
+                               if '/' in key}
+        for statuses in self.replica_status.values():
+            for dest, state in statuses.items():
+                if state in (REPLICA_PENDING, REPLICA_COPYING):
+                    statuses[dest] = f"{REPLICA_FAILED}: прервано"
+        self.replica_workers = []
+        # Опрос реплик AG в фоне и его результаты: {реплика: (time.monotonic(), базы, ошибка)}
+        self.ag_probe_workers = []
+        self.ag_probe_cache = {}
+        # Хранилище S3 (None - не настроено) и объекты бэкапов в нем
+        self.s3 = get_s3_client()
+        self.s3_workers = []
+        self.s3_list_worker = None
+        self.remote_files = []
+        # Снимки баз на сервере: [(снимок, исходная база)]
+        self.snapshots = []
+        self.current_server = ""
+        self.copy_workers = []
+        # Записи файлов бэкапов; индекс записи совпадает с номером строки в таблице
+        self.backup_files = []
+        # Слежение за папкой бэкапов
+        self.watched_dir_mtimes = {}
+        self.pending_delta_dirs = set()
+        self.growing_files = {}
+        self.delta_worker = None
+        # Задания (операции на сервере и передачи файлов): индекс записи совпадает с номером строки
+        # в таблице заданий; процент выполнения опрашивается в фоне
+        self.jobs = []
+        self.progress_poller = None
+        # Фоновый поиск устаревших бэкапов при нехватке места перед пакетом бэкапов
+        self.retention_scan = None
+        self.scan_worker = None
+        self.scan_rerun = False
+        self.scanned_dirs = {}
+        self.scanned_dir_mtimes = {}
+        self.scan_include = SCAN_INCLUDE.split(',')
+        self.scan_exclude = []
+        self.scan_max_depth = SCAN_MAX_DEPTH
+        # Ошибки настройки до построения окна - показываются в строке состояния после него
+        self.startup_warnings = []
+        if THROTTLE_WINDOW_ERRORS:
+            self.startup_warnings.append("Некорректные окна ограничения нагрузки (THROTTLE_WINDOWS) пропущены: "
+                                         + ", ".join(THROTTLE_WINDOW_ERRORS))
+        self.init_metrics()
         self.current_backup_path = DEFAULT_BACKUP_PATH
         self.last_backup_day = None
+        # Задание SQL Agent, выполняющее расписание на сервере (None - расписание ведет приложение)
+        self.agent_job = None
         
         self.init_ui()
+        self.show_startup_warnings()
         
     def set_dark_theme(self):
         app = QApplication.instance()
@@ -322,20 +2815,66 @@ class BackupApp(QMainWindow):
             }
         """)
 
+    def init_metrics(self):
+        """Настройка экспорта метрик операций"""
+        self.metrics = MetricsRecorder()
+        self.metrics.failed.connect(self.on_metrics_failed)
+        self.concurrency = ConcurrencyController()
+        self.path_status = PathStatus()
+        self.path_status.updated.connect(self.on_path_status_updated)
+        if METRICS_JSONL_FILE:
+            self.metrics.add_exporter(JsonLinesExporter(METRICS_JSONL_FILE, int(METRICS_JSONL_MAX_MB * 1024**2)))
+        if METRICS_PORT:
+            prometheus = PrometheusExporter()
+            try:
+                prometheus.start(METRICS_HOST, METRICS_PORT)
+                self.metrics.add_exporter(prometheus)
+            except OSError as e:
+                self.startup_warnings.append(f"Не удалось запустить endpoint метрик на порту {METRICS_PORT}: {e}")
+        
+        # HTTP/JSON API каталога и заданий (снимки публикуются при изменениях)
+        self.api = None
+        self.api_jobs_pending = False
+        if API_PORT:
+            api = CatalogApi()
+            try:
+                api.start(API_HOST, API_PORT)
+                api.catalog_requested.connect(self.load_api_catalog, Qt.QueuedConnection)
+                self.api = api
+            except OSError as e:
+                self.startup_warnings.append(f"Не удалось запустить API на порту {API_PORT}: {e}")
+
+    def on_metrics_failed(self, error):
+        self.notify(f"⚠️ Ошибка экспорта метрик: {error}", "#ff9800")
+        self.status_label.setToolTip(error)
+
+    def load_api_catalog(self):
+        """Первый запрос каталога через API: сканирование папок бэкапов без открытия вкладки"""
+        self.ensure_tab_built(TAB_FILES)
+        self.refresh_backup_files()
+
+    def publish_backup_files(self):
+        if self.api:
+            self.api.publish_files(self.backup_files)
+
+    def publish_jobs(self):
+        """Снимок очереди заданий для API (изменения за один проход цикла событий - одним снимком)"""
+        if not self.api or self.api_jobs_pending:
+            return
+        self.api_jobs_pending = True
+        QTimer.singleShot(0, self.flush_jobs_snapshot)
+
+    def flush_jobs_snapshot(self):
+        self.api_jobs_pending = False
+        self.api.publish_jobs(self.jobs)
+
     def load_history(self):
         """Загрузка истории подключений из JSON"""
-        if os.path.exists(SETTINGS_FILE):
-            try:
-                with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        return load_json_file(SETTINGS_FILE, {})
 
     def save_history(self):
         """Сохранение истории подключений в JSON"""
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.history, f, ensure_ascii=False, indent=4)
+        save_json_file(SETTINGS_FILE, self.history)
 
     def init_ui(self):
         """Инициализация пользовательского интерфейса"""
@@ -350,12 +2889,38 @@ class BackupApp(QMainWindow):
         self.tabs = QTabWidget()
         main_layout.addWidget(self.tabs)
 
-        # Создаем вкладки
-        self.init_connection_tab()
-        self.init_backup_tab()
-        self.init_restore_tab()
-        self.init_scheduler_tab()
-        self.init_backup_files_tab()  
+        # Создаем вкладки: сразу строится только вкладка подключения,
+        # остальные - при первом открытии
+        self.tab_builders = {
+            TAB_CONNECTION: self.init_connection_tab,
+            TAB_BACKUP: self.init_backup_tab,
+            TAB_RESTORE: self.init_restore_tab,
+            TAB_SCHEDULER: self.init_scheduler_tab,
+            TAB_FILES: self.init_backup_files_tab,
+            TAB_HISTORY: self.init_history_tab,
+        }
+        self.built_tabs = set()
+        for title in ["Подключение", "Создание Бэкапа", "Восстановление", "Планировщик",
+                      "Файлы Бэкапов", "История"]:
+            self.tabs.addTab(QWidget(), title)
+        self.ensure_tab_built(TAB_CONNECTION)
+        self.tabs.currentChanged.connect(self.ensure_tab_built)
+        
+        # Таймер для проверки времени планировщика
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.check_schedule)
+        self.timer.start(SCHEDULER_CHECK_INTERVAL)
+        
+        # Периодический снимок размеров баз
+        self.size_timer = QTimer(self)
+        self.size_timer.timeout.connect(self.start_size_sampling)
+        
+        # Периодические проверочные восстановления (RTO)
+        self.drills_pending = False
+        self.drill_timer = QTimer(self)
+        self.drill_timer.timeout.connect(lambda: self.run_restore_drills(auto=True))
+        if DRILL_INTERVAL_HOURS:
+            self.drill_timer.start(int(DRILL_INTERVAL_HOURS * 3600 * 1000))
 
         # Статус бар
         status_container = QWidget()
@@ -370,8 +2935,57 @@ class BackupApp(QMainWindow):
         
         status_layout.addWidget(self.status_label)
         status_layout.addWidget(self.progress_bar)
+        main_layout.addWidget(self.init_jobs_panel())
         main_layout.addWidget(status_container)
 
+    def ensure_tab_built(self, index):
+        """Построение вкладки при первом обращении к ней"""
+        if index in self.built_tabs or index not in self.tab_builders:
+            return
+        self.built_tabs.add(index)
+        self.tab_builders[index](self.tabs.widget(index))
+        
+        # Пути бэкапов проверяются в фоне заранее (диалоги выбора, место, доступность)
+        if index in (TAB_BACKUP, TAB_RESTORE, TAB_FILES):
+            self.prefetch_backup_paths()
+        
+        # Заполняем вкладку данными, если подключение уже установлено
+        if self.connection:
+            if index == TAB_BACKUP:
+                self.load_databases_with_sizes()
+            elif index == TAB_RESTORE:
+                self.load_databases_for_restore()
+            elif index == TAB_SCHEDULER:
+                self.load_databases_for_schedule()
+
+    def is_tab_built(self, index):
+        return index in self.built_tabs
+
+    def prefetch_backup_paths(self):
+        paths = [DEFAULT_BACKUP_PATH, BACKUP_SECONDARY_PATH]
+        if self.is_tab_built(TAB_BACKUP):
+            paths.append(self.backup_path.text())
+        for path in paths:
+            self.path_status.refresh(path)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.startup_ms is None:
+            self.startup_ms = (time.perf_counter() - STARTUP_T0) * 1000
+            QTimer.singleShot(0, self.report_startup_time)
+
+    def report_startup_time(self):
+        """Запись времени холодного старта до первой отрисовки окна"""
+        started = datetime.now() - timedelta(milliseconds=self.startup_ms)
+        self.metrics.record(make_event('startup', 'startup', started, self.startup_ms / 1000))
+        over_budget = self.startup_ms > STARTUP_BUDGET_MS
+        
+        if self.benchmark_startup:
+            print(f"startup_ms={self.startup_ms:.0f} budget_ms={STARTUP_BUDGET_MS}")
+            QApplication.instance().exit(1 if over_budget else 0)
+        elif over_budget:
+            print(f"Запуск занял {self.startup_ms:.0f} мс (бюджет {STARTUP_BUDGET_MS} мс)")
+
     def create_menu(self):
         """Создание меню"""
         menubar = self.menuBar()
@@ -389,8 +3003,7 @@ class BackupApp(QMainWindow):
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
 
-    def init_connection_tab(self):
-        tab = QWidget()
+    def init_connection_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(15)
 
@@ -451,7 +3064,6 @@ class BackupApp(QMainWindow):
         layout.addWidget(self.btn_connect)
         
         layout.addStretch()
-        self.tabs.addTab(tab, "Подключение")
 
     def fill_connection_data(self):
         data = self.combo_history.currentData()
@@ -491,7 +3103,8 @@ class BackupApp(QMainWindow):
         self.conn_str_cache = f'DRIVER={{{ODBC_DRIVER}}};SERVER={server};UID={user};PWD={password};TrustServerCertificate=yes;'
 
         try:
-            self.connection = pyodbc.connect(self.conn_str_cache)
+            self.connection = odbc_connect(self.conn_str_cache)
+            self.current_server = server
             self.status_label.setText(f"✅ Успешное подключение к {server}")
             self.status_label.setStyleSheet("color: #4caf50; font-weight: bold;")
             
@@ -506,7 +3119,10 @@ class BackupApp(QMainWindow):
             self.load_databases_with_sizes()
             self.load_databases_for_restore()
             self.load_databases_for_schedule()
-            self.tabs.setCurrentIndex(1) # Переключаем на вкладку бэкапа
+            self.sync_backup_history(silent=True)
+            self.start_size_sampling()
+            self.size_timer.start(SIZE_SAMPLE_INTERVAL * 60 * 1000)
+            self.tabs.setCurrentIndex(TAB_BACKUP) # Переключаем на вкладку бэкапа
             
         except Exception as e:
             self.status_label.setText("❌ Ошибка подключения")
@@ -516,8 +3132,9 @@ class BackupApp(QMainWindow):
 
     def load_databases_with_sizes(self):
         """Загрузка списка баз данных с размерами"""
-        if not self.connection:
+        if not self.connection or not self.is_tab_built(TAB_BACKUP):
             return
+        self.update_saved_selections()
             
         try:
             cursor = self.connection.cursor()
@@ -532,59 +3149,96 @@ class BackupApp(QMainWindow):
                 FROM sys.databases d
                 JOIN sys.master_files mf ON d.database_id = mf.database_id
                 WHERE d.name NOT IN ('master', 'tempdb', 'model', 'msdb')
+                AND d.source_database_id IS NULL
                 GROUP BY d.name, d.state_desc, d.recovery_model_desc
                 ORDER BY d.name
             """
             cursor.execute(sql_query)
-            dbs = cursor.fetchall()
             
-            self.db_table.setRowCount(0)
-            self.db_table.setRowCount(len(dbs))
-            
-            for i, db in enumerate(dbs):
-                db_name = db[0]
-                size_mb = db[1]
-                size_gb = db[2]
-                state = db[3]
-                recovery_model = db[4]
-                
-                # Чекбокс
-                chk = QTableWidgetItem()
-                if state == 'ONLINE':
-                    chk.setCheckState(Qt.Unchecked)
-                else:
-                    chk.setCheckState(Qt.Unchecked)
-                    chk.setFlags(chk.flags() & ~Qt.ItemIsEnabled)  # Делаем недоступным
-                self.db_table.setItem(i, 0, chk)
-                
-                # Имя базы
-                name_item = QTableWidgetItem(db_name)
-                if state != 'ONLINE':
-                    name_item.setForeground(Qt.red)
-                    name_item.setToolTip(f"База не в сети: {state}")
-                self.db_table.setItem(i, 1, name_item)
-                
-                # Размер в GB
-                size_item = QTableWidgetItem(f"{size_gb:.2f} GB")
-                size_item.setToolTip(f"{size_mb:.2f} MB")
-                self.db_table.setItem(i, 2, size_item)
-                
-                # Состояние
-                state_item = QTableWidgetItem(state)
-                if state == 'ONLINE':
-                    state_item.setForeground(QColor('#4CAF50'))
-                else:
-                    state_item.setForeground(Qt.red)
-                self.db_table.setItem(i, 3, state_item)
-                
-                # Модель восстановления
-                self.db_table.setItem(i, 4, QTableWidgetItem(recovery_model))
+            # Строки хранятся в модели, таблица отрисовывает только видимые
+            self.db_model.set_rows([{'name': name, 'size_mb': float(size_mb), 'state': state,
+                                     'recovery': recovery_model}
+                                    for name, size_mb, _, state, recovery_model in cursor.fetchall()])
                 
         except Exception as e:
             QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить размеры баз:\n{str(e)}")
             # Загружаем без размеров
             self.load_databases_simple()
 
+    def start_size_sampling(self):
+        """Запуск фонового снимка размеров баз"""
+        if not self.connection or self.size_sampler is not None:
+            return
+        self.size_sampler = SizeSampler(self.conn_str_cache)
+        self.size_sampler.event.connect(self.metrics.record)
+        self.size_sampler.finished.connect(self.on_size_sampled)
+        self.size_sampler.start()
+
+    def on_size_sampled(self, sizes, error):
+        """Добавление снимка в компактный временной ряд и проверка места для ближайшего бэкапа"""
+        self.size_sampler.wait()
+        self.size_sampler = None
+        if error or not sizes:
+            return
+            
+        now = int(time.time())
+        server_series = self.size_history.setdefault(self.current_server, {})
+        for db, values in sizes.items():
+            series = server_series.setdefault(db, [])
+            # Без изменений за последние сутки новый снимок не добавляется
+            if series and series[-1][1:] == values and now - series[-1][0] < 86400:
+                continue
+            series.append([now] + values)
+            del series[:-SIZE_HISTORY_MAX]
+        try:
+            save_json_file(SIZE_HISTORY_FILE, self.size_history, indent=None)
+        except OSError:
+            pass
+            
+        if self.is_tab_built(TAB_BACKUP):
+            self.db_model.refresh_usage()
+        self.update_next_backup_time()
+
+    def get_size_series(self, db):
+        return self.size_history.get(self.current_server, {}).get(db, [])
+
+    def describe_db_usage(self, db):
+        """Занятое место базы (текст, подсказка с приростом и оценкой бэкапа, значение для сортировки)"""
+        series = self.get_size_series(db)
+        if not series:
+            return "-", None, -1.0
+        _, data_alloc, data_used, log_alloc, log_used = series[-1]
+        text = f"{format_size(data_used * 1024**2)} / {format_size(log_used * 1024**2)}"
+        tooltip = (f"Данные: занято {format_size(data_used * 1024**2)} из {format_size(data_alloc * 1024**2)}\n"
+                   f"Журнал: занято {format_size(log_used * 1024**2)} из {format_size(log_alloc * 1024**2)}\n"
+                   f"Прирост данных: {growth_per_day(series, 2):+.1f} MB/сутки")
+        estimate = self.estimate_backup(db)
+        if estimate:
+            size, duration = estimate
+            tooltip += f"\nОценка полного бэкапа: {format_size(size)}"
+            if duration:
+                tooltip += f", {format_duration(duration)}"
+        return text, tooltip, float(data_used + log_used)
+
+    def estimate_backup(self, db, at_time=None):
+        """Оценка полного бэкапа (размер в байтах, длительность в секундах или None) по снимкам размеров
+        и истории бэкапов: занятое место с учетом прироста, коэффициент сжатия и скорость прошлых запусков"""
+        series = self.get_size_series(db)
+        if not series:
+            return None
+        used_mb = series[-1][2]
+        if at_time is not None:
+            days = max((at_time.timestamp() - series[-1][0]) / 86400, 0)
+            used_mb += max(growth_per_day(series, 2), 0) * days
+        used_bytes = used_mb * 1024**2
+        
+        rows = [r for r in self.get_history_rows(db, 'FULL') if r['size'] and r['duration']][-5:]
+        if not rows:
+            return used_bytes, None
+        ratio = sum((r['compressed'] or r['size']) / r['size'] for r in rows) / len(rows)
+        throughput = sum(r['size'] / r['duration'] for r in rows) / len(rows)
+        return used_bytes * ratio, used_bytes / throughput
+
     def load_databases_simple(self):
         """Загрузка только имен баз (резервный метод)"""
         try:
@@ -593,38 +3247,36 @@ class BackupApp(QMainWindow):
                 SELECT name 
                 FROM sys.databases 
                 WHERE name NOT IN ('master', 'tempdb', 'model', 'msdb')
-                AND state_desc = 'ONLINE'
+                AND state_desc = 'ONLINE' AND source_database_id IS NULL
             """
             cursor.execute(sql_query)
-            dbs = cursor.fetchall()
-            
-            self.db_table.setRowCount(0)
-            self.db_table.setRowCount(len(dbs))
-            for i, db in enumerate(dbs):
-                db_name = db[0]
-                
-                chk = QTableWidgetItem()
-                chk.setCheckState(Qt.Unchecked)
-                self.db_table.setItem(i, 0, chk)
-                
-                self.db_table.setItem(i, 1, QTableWidgetItem(db_name))
-                self.db_table.setItem(i, 2, QTableWidgetItem("N/A"))
-                self.db_table.setItem(i, 3, QTableWidgetItem("ONLINE"))
-                self.db_table.setItem(i, 4, QTableWidgetItem("N/A"))
+            self.db_model.set_rows([{'name': db[0], 'size_mb': None, 'state': 'ONLINE', 'recovery': None}
+                                    for db in cursor.fetchall()])
                 
         except Exception as e:
             print(f"Ошибка при загрузке баз: {e}")
 
     # Вкладка  Бэкап 
-    def init_backup_tab(self):
-        tab = QWidget()
+    def init_backup_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(10)
 
-        # Таблица баз данных
-        self.db_table = QTableWidget()
-        self.db_table.setColumnCount(5)
-        self.db_table.setHorizontalHeaderLabels(["✓", "Имя Базы", "Размер", "Состояние", "Модель восстановления"])
+        # Таблица баз данных: модель со множеством отмеченных баз, фильтр поиска и сортировка
+        self.db_model = DatabaseListModel(self.describe_db_usage, self)
+        self.db_model.selection_changed.connect(self.update_db_selection_label)
+        self.db_proxy = DatabaseFilterProxy(self)
+        self.db_proxy.setSourceModel(self.db_model)
+        self.db_proxy.setFilterKeyColumn(1)
+        self.db_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        
+        self.db_table = QTableView()
+        self.db_table.setModel(self.db_proxy)
+        self.db_table.setSortingEnabled(True)
+        self.db_table.sortByColumn(1, Qt.AscendingOrder)
+        self.db_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.db_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.db_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.db_table.verticalHeader().setDefaultSectionSize(24)
         self.db_table.setColumnWidth(0, 40)
         self.db_table.setColumnWidth(1, 200)
         self.db_table.setColumnWidth(2, 100)
@@ -641,15 +3293,55 @@ class BackupApp(QMainWindow):
         btn_deselect_all.clicked.connect(lambda: self.select_all_databases(False))
         btn_refresh_sizes = QPushButton("🔄 Обновить размеры")
         btn_refresh_sizes.clicked.connect(self.load_databases_with_sizes)
+        self.lbl_db_selected = QLabel("Выбрано: 0")
+        
+        # Сохраненные наборы баз (по серверу)
+        self.combo_db_selections = QComboBox()
+        self.combo_db_selections.setMinimumWidth(160)
+        self.combo_db_selections.setToolTip("Сохраненные наборы баз")
+        self.combo_db_selections.activated.connect(self.apply_saved_selection)
+        btn_save_selection = QPushButton("Сохранить набор")
+        btn_save_selection.clicked.connect(self.save_db_selection)
+        btn_delete_selection = QPushButton("Удалить набор")
+        btn_delete_selection.clicked.connect(self.delete_db_selection)
         
         table_buttons.addWidget(btn_select_all)
         table_buttons.addWidget(btn_deselect_all)
+        table_buttons.addWidget(self.lbl_db_selected)
         table_buttons.addStretch()
+        table_buttons.addWidget(self.combo_db_selections)
+        table_buttons.addWidget(btn_save_selection)
+        table_buttons.addWidget(btn_delete_selection)
         table_buttons.addWidget(btn_refresh_sizes)
         
+        # Поиск по имени и отметка баз по условию
+        search_layout = QHBoxLayout()
+        self.db_search = QLineEdit()
+        self.db_search.setPlaceholderText("Поиск по имени")
+        self.db_search.setClearButtonEnabled(True)
+        self.db_search.textChanged.connect(self.db_proxy.setFilterFixedString)
+        self.db_predicate = QLineEdit()
+        self.db_predicate.setPlaceholderText("Условие: tenant_* re:^crm size>10GB state=ONLINE recovery=FULL")
+        self.db_predicate.setToolTip("Условия через пробел (все должны выполняться):\n"
+                                     "маска имени (tenant_*), re:<регулярное выражение>,\n"
+                                     "size>10GB / size<=500MB (без единиц - GB),\n"
+                                     "state=ONLINE, recovery=FULL (также !=)")
+        self.db_predicate.returnPressed.connect(lambda: self.pick_databases(True))
+        btn_pick = QPushButton("Отметить")
+        btn_pick.clicked.connect(lambda: self.pick_databases(True))
+        btn_unpick = QPushButton("Снять")
+        btn_unpick.clicked.connect(lambda: self.pick_databases(False))
+        
+        search_layout.addWidget(self.db_search, 1)
+        search_layout.addWidget(self.db_predicate, 2)
+        search_layout.addWidget(btn_pick)
+        search_layout.addWidget(btn_unpick)
+        
         layout.addWidget(QLabel("Выберите базы для резервного копирования:"))
         layout.addLayout(table_buttons)
+        layout.addLayout(search_layout)
         layout.addWidget(self.db_table)
+        self.update_saved_selections()
 
         # Настройки бэкапа
         sett_group = QGroupBox("Настройки Бэкапа")
@@ -660,6 +3352,8 @@ class BackupApp(QMainWindow):
         path_layout = QHBoxLayout()
         self.backup_path = QLineEdit(DEFAULT_BACKUP_PATH)
         self.backup_path.setPlaceholderText("Сетевой путь для бэкапов")
+        # Доступность и свободное место проверяются в фоне заранее - к запуску бэкапа результат готов
+        self.backup_path.editingFinished.connect(self.prefetch_backup_paths)
         
         btn_test_path = QPushButton("Проверить путь")
         btn_test_path.clicked.connect(self.test_backup_path)
@@ -668,6 +3362,42 @@ class BackupApp(QMainWindow):
         path_layout.addWidget(self.backup_path, 1)
         path_layout.addWidget(btn_test_path)
         
+        # Дополнительные копии: зеркало на сервере или фоновая репликация
+        dest_layout = QHBoxLayout()
+        self.combo_destinations = QComboBox()
+        self.combo_destinations.addItem("Без дополнительных копий", DEST_NONE)
+        self.combo_destinations.addItem("MIRROR TO (одновременная запись сервером)", DEST_MIRROR)
+        self.combo_destinations.addItem("Фоновая репликация готовых файлов", DEST_REPLICA)
+        if self.s3:
+            self.combo_destinations.addItem("Загрузка готовых файлов в S3", DEST_S3)
+        self.combo_destinations.setToolTip("MIRROR TO требует Enterprise Edition и создает новый набор носителей (FORMAT)")
+        self.destination_paths = QLineEdit(REPLICA_PATHS or BACKUP_MIRROR_PATHS)
+        self.destination_paths.setPlaceholderText("Пути дополнительных копий через ';'")
+        self.combo_destinations.currentIndexChanged.connect(self.on_destination_mode_changed)
+        if REPLICA_PATHS:
+            self.combo_destinations.setCurrentIndex(DEST_REPLICA)
+        elif BACKUP_MIRROR_PATHS:
+            self.combo_destinations.setCurrentIndex(DEST_MIRROR)
+        self.destination_paths.setEnabled(self.combo_destinations.currentData() in (DEST_MIRROR, DEST_REPLICA))
+        
+        dest_layout.addWidget(QLabel("Копии:"))
+        dest_layout.addWidget(self.combo_destinations)
+        dest_layout.addWidget(self.destination_paths, 1)
+        
+        # Бэкап сразу в хранилище S3 (SQL Server 2022+, нужен CREDENTIAL с адресом бакета)
+        s3_layout = QHBoxLayout()
+        self.chk_backup_to_url = QCheckBox("Бэкап сразу в S3 (BACKUP TO URL)")
+        self.chk_backup_to_url.setEnabled(self.s3 is not None)
+        self.chk_backup_to_url.setToolTip(f"Сервер пишет бэкап в {self.s3.base_url}" if self.s3
+                                          else "Хранилище не настроено (S3_ENDPOINT, S3_BUCKET)")
+        btn_s3_credential = QPushButton("Создать CREDENTIAL S3")
+        btn_s3_credential.setEnabled(self.s3 is not None)
+        btn_s3_credential.clicked.connect(self.create_s3_credential)
+        
+        s3_layout.addWidget(self.chk_backup_to_url)
+        s3_layout.addWidget(btn_s3_credential)
+        s3_layout.addStretch()
+        
         # Тип бэкапа
         type_group = QGroupBox("Тип бэкапа")
         type_layout = QHBoxLayout()
@@ -681,11 +3411,18 @@ class BackupApp(QMainWindow):
         self.radio_differential = QRadioButton("Дифференциальный")
         self.radio_differential.setToolTip("Создает бэкап только изменений с момента последнего полного бэкапа")
         
+        self.radio_auto = QRadioButton("Авто (по доле изменений)")
+        self.radio_auto.setToolTip(
+            "Для каждой базы выбирает дифференциальный или полный бэкап по доле "
+            f"измененных экстентов (порог {AUTO_DIFF_THRESHOLD:g}%)")
+        
         self.backup_type_group.addButton(self.radio_full)
         self.backup_type_group.addButton(self.radio_differential)
+        self.backup_type_group.addButton(self.radio_auto)
         
         type_layout.addWidget(self.radio_full)
         type_layout.addWidget(self.radio_differential)
+        type_layout.addWidget(self.radio_auto)
         type_group.setLayout(type_layout)
         
         # Дополнительные опции
@@ -701,11 +3438,38 @@ class BackupApp(QMainWindow):
         self.chk_verify.setChecked(True)
         self.chk_verify.setToolTip("Проверяет целостность бэкапа после создания")
         
+        self.chk_throttle = QCheckBox("Щадящий режим (по окнам нагрузки)")
+        self.chk_throttle.setChecked(True)
+        self.chk_throttle.setToolTip("В окнах ограничения (THROTTLE_WINDOWS) добавляет BUFFERCOUNT/MAXTRANSFERSIZE "
+                                     "и подключается с именем приложения для Resource Governor")
+        
         opt_layout.addWidget(self.chk_compression)
         opt_layout.addWidget(self.chk_copy_only)
         opt_layout.addWidget(self.chk_verify)
+        opt_layout.addWidget(self.chk_throttle)
+        
+        self.chk_ag_routing = QCheckBox("AG: на предпочтительной реплике")
+        self.chk_ag_routing.setChecked(AG_BACKUP_ROUTING)
+        self.chk_ag_routing.setToolTip("Бэкап баз группы доступности выполняется на реплике, где "
+                                       "sys.fn_hadr_backup_is_preferred_replica = 1;\n"
+                                       "полный бэкап на вторичной реплике - всегда COPY_ONLY")
+        opt_layout.addWidget(self.chk_ag_routing)
+        
+        self.chk_adaptive = QCheckBox("Адаптивный параллелизм")
+        self.chk_adaptive.setChecked(ADAPTIVE_CONCURRENCY)
+        self.chk_adaptive.setToolTip("Отдельное задание на каждую базу; число одновременных бэкапов "
+                                     "подбирается по скорости (AIMD)\nи запоминается для сервера и пути бэкапа")
+        opt_layout.addWidget(self.chk_adaptive)
+        
+        self.chk_partial = QCheckBox("Частичный (READ_WRITE_FILEGROUPS)")
+        self.chk_partial.setToolTip("Для баз с файлгруппами только для чтения бэкапятся только файлгруппы "
+                                    "для записи;\nфайлгруппы только для чтения бэкапятся однократно "
+                                    "и учитываются в каталоге для поэтапного восстановления")
+        opt_layout.addWidget(self.chk_partial)
         
         sett_layout.addLayout(path_layout)
+        sett_layout.addLayout(dest_layout)
+        sett_layout.addLayout(s3_layout)
         sett_layout.addWidget(type_group)
         sett_layout.addLayout(opt_layout)
         sett_group.setLayout(sett_layout)
@@ -718,7 +3482,6 @@ class BackupApp(QMainWindow):
         self.btn_backup.clicked.connect(self.start_backup)
         layout.addWidget(self.btn_backup)
         
-        self.tabs.addTab(tab, "Создание Бэкапа")
 
     def test_backup_path(self):
         """Проверка доступности пути для бэкапов"""
@@ -766,29 +3529,88 @@ class BackupApp(QMainWindow):
                               f"Указан локальный путь:\n{path}\n\n")
 
     def select_all_databases(self, select):
-        """Выделить/снять все базы данных"""
-        for i in range(self.db_table.rowCount()):
-            item = self.db_table.item(i, 0)
-            if item and item.flags() & Qt.ItemIsEnabled:
-                item.setCheckState(Qt.Checked if select else Qt.Unchecked)
+        """Выделить/снять все базы данных, видимые с учетом поиска"""
+        names = {self.db_proxy.index(row, 1).data() for row in range(self.db_proxy.rowCount())}
+        self.db_model.set_selected(names, select)
+
+    def pick_databases(self, select):
+        """Отметка или снятие отметки с баз по условию (с учетом поиска)"""
+        try:
+            predicate = parse_db_predicate(self.db_predicate.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Ошибка", str(e))
+            return
+        visible = {self.db_proxy.index(row, 1).data() for row in range(self.db_proxy.rowCount())}
+        self.db_model.set_selected({db['name'] for db in self.db_model.rows
+                                    if db['name'] in visible and predicate(db)}, select)
+
+    def update_db_selection_label(self):
+        """Число и общий размер отмеченных баз"""
+        selected = [db for db in self.db_model.rows if db['name'] in self.db_model.selected]
+        total_mb = sum(db['size_mb'] or 0 for db in selected)
+        self.lbl_db_selected.setText(f"Выбрано: {len(selected)} из {len(self.db_model.rows)}"
+                                     + (f", {format_size(total_mb * 1024**2)}" if total_mb else ""))
+
+    def update_saved_selections(self):
+        """Список сохраненных наборов баз текущего сервера"""
+        saved = load_json_file(DB_SELECTIONS_FILE, {}).get(self.current_server, {})
+        self.combo_db_selections.clear()
+        self.combo_db_selections.addItem("Наборы баз...", None)
+        for name, databases in sorted(saved.items()):
+            self.combo_db_selections.addItem(f"{name} ({len(databases)})", name)
+
+    def apply_saved_selection(self):
+        """Отметка баз из сохраненного набора (вместо текущего выбора)"""
+        name = self.combo_db_selections.currentData()
+        if name is None:
+            return
+        databases = load_json_file(DB_SELECTIONS_FILE, {}).get(self.current_server, {}).get(name, [])
+        self.db_model.set_selected(set(self.db_model.selected), False)
+        self.db_model.set_selected(set(databases))
+        missing = len(set(databases) - self.db_model.selected)
+        if missing:
+            self.notify(f"Набор '{name}': {missing} баз нет на сервере или не в сети", "#ff9800")
+
+    def save_db_selection(self):
+        """Сохранение отмеченных баз как именованного набора"""
+        databases = self.db_model.selected_names()
+        if not databases:
+            QMessageBox.warning(self, "Ошибка", "Отметьте базы для сохранения набора")
+            return
+        name, ok = QInputDialog.getText(self, "Сохранить набор", f"Название набора ({len(databases)} баз):",
+                                        text=self.combo_db_selections.currentData() or "")
+        if not ok or not name.strip():
+            return
+        selections = load_json_file(DB_SELECTIONS_FILE, {})
+        selections.setdefault(self.current_server, {})[name.strip()] = databases
+        save_json_file(DB_SELECTIONS_FILE, selections, indent=None)
+        self.update_saved_selections()
+        self.combo_db_selections.setCurrentIndex(self.combo_db_selections.findData(name.strip()))
+
+    def delete_db_selection(self):
+        name = self.combo_db_selections.currentData()
+        if name is None:
+            return
+        selections = load_json_file(DB_SELECTIONS_FILE, {})
+        selections.get(self.current_server, {}).pop(name, None)
+        save_json_file(DB_SELECTIONS_FILE, selections, indent=None)
+        self.update_saved_selections()
 
     def start_backup(self):
         if not self.connection:
             QMessageBox.warning(self, "Ошибка", "Сначала подключитесь к серверу!")
             return
 
-        selected_dbs = []
-        for i in range(self.db_table.rowCount()):
-            item = self.db_table.item(i, 0)
-            if item and item.checkState() == Qt.Checked:
-                selected_dbs.append(self.db_table.item(i, 1).text())
+        selected_dbs = self.db_model.selected_names()
 
         if not selected_dbs:
             QMessageBox.warning(self, "Ошибка", "Выберите хотя бы одну базу данных из списка.")
             return
 
+        # Бэкап в S3 пишет сам сервер, путь и место на диске не нужны
+        to_url = self.s3 is not None and self.chk_backup_to_url.isChecked()
         target_path = self.backup_path.text()
-        if not target_path:
+        if not target_path and not to_url:
             QMessageBox.warning(self, "Ошибка", "Укажите путь для сохранения бэкапов.")
             return
 
@@ -797,9 +3619,10 @@ class BackupApp(QMainWindow):
             target_path += "\\"
             
         # Для сетевых путей могут потребоваться дополнительные проверки
-        if target_path.startswith('\\\\'):
-            # Проверяем доступность сетевого пути
-            if not os.path.exists(target_path):
+        if target_path.startswith('\\\\') and not to_url:
+            # Доступность сетевого пути - по последней фоновой проверке (пока не проверен - без вопроса)
+            status = self.path_status.get(target_path)
+            if status is not None and not status[0]:
                 reply = QMessageBox.question(self, "Путь не существует", 
                                            f"Сетевой путь {target_path} не существует или недоступен.\n"
                                            "Продолжить? (Может возникнуть ошибка)",
@@ -807,43 +3630,651 @@ class BackupApp(QMainWindow):
                 if reply == QMessageBox.No:
                     return
 
-        sql_commands = []
-        backup_type = "дифференциальный" if self.radio_differential.isChecked() else "полный"
+        throttle_options, conn_str = self.get_throttle_hints()
+        if self.radio_auto.isChecked():
+            backup_types = self.choose_backup_types(selected_dbs)
+            diff_count = sum(1 for t in backup_types.values() if t == 'DIFF')
+            backup_type = f"авто ({len(selected_dbs) - diff_count} полн., {diff_count} диф.)"
+        else:
+            chosen = 'DIFF' if self.radio_differential.isChecked() else 'FULL'
+            backup_types = {db: chosen for db in selected_dbs}
+            backup_type = "дифференциальный" if chosen == 'DIFF' else "полный"
         
-        for db in selected_dbs:
-            # Имя сервера
+        # Самые долгие бэкапы ставим в начало очереди (по прогнозу из истории)
+        selected_dbs.sort(key=lambda db: self.predict_backup_duration(db, backup_types[db]) or 0,
+                          reverse=True)
+        
+        # Проверка места на пути бэкапов для всего пакета; задания ставятся после выбора
+        # пользователя (старые бэкапы для удаления ищутся в фоне)
+        def proceed(targets):
             server_address = self.server_input.text()
-            server_name = server_address.split('\\')[0].split('.')[0]
-            
-            # Форматируем дату и время
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            mode, extra_paths = self.get_backup_destinations()
+            if to_url:
+                mode, extra_paths = DEST_NONE, []
+            mirror_paths = extra_paths if mode == DEST_MIRROR else ()
             
-            # Формируем имя файла
-            filename = f"{target_path}{server_name}_{db}_{timestamp}.bak"
-            
-            # Формируем SQL команду
-            cmd = f"BACKUP DATABASE [{db}] TO DISK = '{filename}' WITH INIT"
+            # Группы доступности: каждая база бэкапится на своей предпочтительной реплике.
+            # Реплики опрашиваются в фоне - задания создаются после получения маршрутов
+            def submit(routes):
+                if not self.connection:
+                    return
+                batches = {}
+                
+                # Частичные бэкапы: файлгруппы только для чтения баз и их бэкапы из каталога
+                read_only, diff_bases = {}, {}
+                if self.chk_partial.isChecked():
+                    try:
+                        read_only = self.get_read_only_filegroups(selected_dbs)
+                        diff_bases = self.get_differential_bases(list(read_only))
+                    except Exception as e:
+                        self.notify(f"⚠️ Не удалось получить файлгруппы, бэкап баз целиком: {e}", "#ff9800")
+                catalog = load_json_file(FILEGROUP_CATALOG_FILE, {}).get(self.current_server, {})
+                
+                def filegroup_backed_up(entry, lsn):
+                    """Бэкап файлгруппы из каталога актуален: файлгруппа не переводилась в режим записи
+                    (read_only_lsn не изменился) и файлы бэкапа есть на сервере"""
+                    if not entry or entry['read_only_lsn'] != lsn:
+                        return False
+                    try:
+                        cursor = self.connection.cursor()
+                        return all(server_file_exists(cursor, path) for path in entry['files'])
+                    except Exception:
+                        return False     # не удалось проверить - файлгруппа бэкапится заново
+                
+                def target_clause(db, kind):
+                    """Файлы бэкапа по шаблону имени (папки шаблона создаются на сервере)"""
+                    if to_url:
+                        return [], backup_url_clause(self.s3, server_address, db, kind)
+                    return backup_disk_clause(targets[db], server_address, db, kind, mirror_paths=mirror_paths)
+                
+                for db in selected_dbs:
+                    route = routes.get(db)
+                    batch = batches.setdefault(route['server'] if route else None, {
+                        'parts': [], 'conn_str': route['conn_str'] if route else conn_str})
+                    sql_commands = []
+                    catalog_entries = []
+                    
+                    # Общие опции (зеркалу нужен новый набор носителей)
+                    options = ", FORMAT" if mirror_paths else ""
+                    
+                    if self.chk_compression.isChecked():
+                        options += ", COMPRESSION"
+                    
+                    # Полный бэкап на вторичной реплике AG возможен только как COPY_ONLY
+                    if self.chk_copy_only.isChecked() or (route and route['secondary']):
+                        options += ", COPY_ONLY"
+                    
+                    if self.chk_verify.isChecked():
+                        options += ", CHECKSUM"
+                    
+                    options += throttle_options
+                    
+                    # Частичный бэкап (не на вторичной реплике): файлгруппы только для чтения - однократно,
+                    # пока файлгруппа не переводилась в режим записи (read_only_lsn не изменился)
+                    partial = db in read_only and not (route and route['secondary'])
+                    kind = backup_types[db]
+                    if partial:
+                        known = catalog.get(db, {})
+                        for fg, lsn in read_only[db].items():
+                            if filegroup_backed_up(known.get('filegroups', {}).get(fg), lsn):
+                                continue
+                            fg_create, fg_clause = target_clause(db, "FG-" + re.sub(r"[^\w.-]", "_", fg))
+                            sql_commands.extend(fg_create)
+                            sql_commands.append(f"BACKUP DATABASE [{db}] FILEGROUP = N'{sql_quote(fg)}' {fg_clause} "
+                                                f"WITH INIT{options}")
+                            catalog_entries.append((db, fg, backup_clause_files(fg_clause), lsn))
+                        # Дифференциальный бэкап строится от текущей основы базы: если это не частичный полный
+                        # бэкап из каталога (его нет или после него был другой полный), снимается новый частичный
+                        if kind == 'DIFF' and (known.get('partial') or {}).get('guid') != diff_bases.get(db):
+                            kind = 'FULL'
+                    
+                    create_commands, disk_clause = target_clause(db, 'PARTIAL' if partial and kind == 'FULL' else kind)
+                    sql_commands.extend(create_commands)
+                    
+                    # Формируем SQL команду
+                    cmd = f"BACKUP DATABASE [{db}] {'READ_WRITE_FILEGROUPS ' if partial else ''}{disk_clause} WITH INIT"
+                    if kind == 'DIFF':
+                        cmd += ", DIFFERENTIAL"
+                    
+                    sql_commands.append(cmd + options)
+                    # COPY_ONLY бэкап не может быть основой дифференциального - в каталог не записывается
+                    if partial and kind == 'FULL' and 'COPY_ONLY' not in options:
+                        catalog_entries.append((db, None, backup_clause_files(disk_clause), None))
+                    batch['parts'].append((db, kind, sql_commands, catalog_entries))
+
+                # Отдельное задание на каждую реплику; маршрут каждой базы виден в задании.
+                # С адаптивным параллелизмом - задание на каждую базу, число одновременных подбирает регулятор
+                adaptive = self.chk_adaptive.isChecked()
+                for server, batch in batches.items():
+                    for parts in ([[part] for part in batch['parts']] if adaptive else [batch['parts']]):
+                        databases = [db for db, _, _, _ in parts]
+                        if adaptive:
+                            db, kind = parts[0][:2]
+                            operation_name = f"{BACKUP_TYPE_TITLES[kind]} бэкап '{db}'"
+                        else:
+                            operation_name = f"Массовый {backup_type} бэкап ({len(databases)} баз)"
+                        if server:
+                            operation_name += f" → {server}"
+                        job = self.run_worker([sql for _, _, sqls, _ in parts for sql in sqls], operation_name,
+                                              batch['conn_str'], queue=False)
+                        job['server'] = server
+                        job['route'] = "\n".join(f"{db}: {routes[db]['server']} - {routes[db]['reason']}"
+                                                 for db in databases if db in routes)
+                        if extra_paths:
+                            job['destinations'] = (mode, extra_paths)
+                        job['s3_url'] = to_url
+                        entries = [entry for _, _, _, catalog_entries in parts for entry in catalog_entries]
+                        if entries:
+                            job['catalog'] = (self.current_server, entries)
+                        if adaptive:
+                            job['pool'] = f"{server or self.current_server} → {self.s3.base_url if to_url else targets[db]}"
+                self.start_queued_jobs()
+            self.resolve_ag_routes(selected_dbs, backup_types, conn_str, submit)
+        
+        if to_url:
+            proceed({db: None for db in selected_dbs})
+        else:
+            self.plan_backup_space(selected_dbs, backup_types, target_path, proceed)
+
+    def get_read_only_filegroups(self, databases):
+        """Файлгруппы только для чтения: {база: {файлгруппа: read_only_lsn}}.
+        Кандидаты отбираются одним запросом по sys.master_files, имена файлгрупп - только для них.
+        Учитываются файлгруппы, все файлы которых в сети (файл не в сети не попадет в бэкап)."""
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT DISTINCT DB_NAME(database_id) FROM sys.master_files "
+                       "WHERE type = 0 AND is_read_only = 1 AND state = 0 AND database_id > 4")
+        candidates = {row[0] for row in cursor.fetchall()} & set(databases)
+        result = {}
+        for db in candidates:
+            cursor.execute(f"""
+                SELECT fg.name, MAX(df.read_only_lsn)
+                FROM [{db.replace(']', ']]')}].sys.filegroups fg
+                JOIN [{db.replace(']', ']]')}].sys.database_files df ON df.data_space_id = fg.data_space_id
+                WHERE fg.is_read_only = 1
+                GROUP BY fg.name
+                HAVING MIN(df.state) = 0 AND MAX(df.state) = 0
+            """)
+            filegroups = {name: str(lsn) for name, lsn in cursor.fetchall()}
+            if filegroups:
+                result[db] = filegroups
+        return result
+
+    def get_differential_bases(self, databases):
+        """Текущая основа дифференциальных бэкапов баз: {база: differential_base_guid}"""
+        if not databases:
+            return {}
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT DB_NAME(database_id), differential_base_guid FROM sys.master_files "
+                       "WHERE file_id = 1 AND database_id > 4")
+        return {db: normalize_guid(guid) for db, guid in cursor.fetchall() if db in databases}
+
+    def update_filegroup_catalog(self, server, entries, backup_sets):
+        """Запись выполненных частичных бэкапов и бэкапов файлгрупп только для чтения в каталог:
+        {сервер: {база: {'partial': {...}, 'filegroups': {файлгруппа: {...}}}}}.
+        Частичный полный бэкап хранится с backup_set_guid - по нему находится основа дифференциального."""
+        catalog = load_json_file(FILEGROUP_CATALOG_FILE, {})
+        databases = catalog.setdefault(server, {})
+        now = datetime.now().isoformat(timespec='seconds')
+        for db, fg, files, lsn in entries:
+            record = {'files': files, 'date': now}
+            if fg is None:
+                backup_set = backup_sets.get(files[0]) if files else None
+                if not backup_set or not backup_set['guid'] or backup_set['copy_only']:
+                    continue
+                record['guid'] = backup_set['guid']
+                databases.setdefault(db, {})['partial'] = record
+            else:
+                record['read_only_lsn'] = lsn
+                databases.setdefault(db, {}).setdefault('filegroups', {})[fg] = record
+        try:
+            save_json_file(FILEGROUP_CATALOG_FILE, catalog)
+        except OSError as e:
+            self.notify(f"⚠️ Не удалось сохранить каталог файлгрупп: {e}", "#ff9800")
+
+    def resolve_ag_routes(self, databases, backup_types, conn_str, callback):
+        """Маршруты бэкапов баз AG без блокировки окна: состав групп доступности запрашивается и реплики
+        опрашиваются в фоне (результат опроса реплики используется AG_PROBE_CACHE_SECONDS секунд),
+        затем вызывается callback(routes)"""
+        if not self.chk_ag_routing.isChecked():
+            callback({})
+            return
+        now = time.monotonic()
+        fresh = {server for server, (probed, _, _) in self.ag_probe_cache.items()
+                 if now - probed <= AG_PROBE_CACHE_SECONDS}
+        self.notify("Определение реплик AG...", "#2196f3")
+        worker = AgProbeWorker(conn_str, databases, fresh)
+        worker.finished.connect(lambda topology, results, error:
+                                self.on_ag_probed(worker, topology, results, error, backup_types, conn_str, callback))
+        self.ag_probe_workers.append(worker)
+        worker.start()
+
+    def on_ag_probed(self, worker, topology, results, error, backup_types, conn_str, callback):
+        worker.wait()
+        self.ag_probe_workers.remove(worker)
+        if error:
+            self.notify(f"⚠️ Не удалось определить реплики AG, бэкап на подключенном сервере: {error}", "#ff9800")
+            callback({})
+            return
+        now = time.monotonic()
+        for server, (preferred, probe_error) in results.items():
+            self.ag_probe_cache[server] = (now, preferred, probe_error)
+        replicas, groups, primaries = topology
+        if not replicas:
+            callback({})
+            return
+        
+        servers = {replica for rows in replicas.values() for replica, _ in rows}
+        preferred = {server: self.ag_probe_cache[server][1] for server in servers
+                     if self.ag_probe_cache[server][1] is not None}
+        errors = {server: self.ag_probe_cache[server][2] for server in servers
+                  if self.ag_probe_cache[server][2]}
+        callback(self.plan_ag_routes(replicas, groups, primaries, preferred, errors, backup_types, conn_str))
+
+    def plan_ag_routes(self, replicas, groups, primaries, preferred, errors, backup_types, conn_str):
+        """Маршруты бэкапов баз групп доступности: {база: {'server', 'conn_str', 'secondary', 'reason'}}.
+        Бэкап идет на реплику, где sys.fn_hadr_backup_is_preferred_replica = 1 (функция проверяется на
+        каждой реплике); если таких реплик несколько - на наименее загруженную этим пакетом по размеру баз.
+        Базы вне групп доступности и дифференциальные бэкапы при неизвестной первичной реплике
+        в результат не входят (выполняются на подключенном сервере)."""
+        servers = {replica for rows in replicas.values() for replica, _ in rows}
+        # Крупные базы распределяются первыми
+        sizes = {db['name']: db['size_mb'] or 0 for db in self.db_model.rows}
+        load = dict.fromkeys(servers, 0)
+        routes = {}
+        for db in sorted(replicas, key=lambda name: sizes.get(name, 0), reverse=True):
+            primary = primaries.get(db)
+            candidates = [replica for replica, _ in replicas[db] if db in preferred.get(replica, ())]
+            if backup_types[db] == 'DIFF':
+                # Дифференциальный бэкап на вторичной реплике невозможен
+                if not primary:
+                    continue
+                server, reason = primary, "дифференциальный бэкап - только на первичной реплике"
+            elif candidates:
+                server = min(candidates, key=lambda replica: load[replica])
+                reason = "предпочтительная реплика"
+                if len(candidates) > 1:
+                    reason += f" (наименее загруженная из {len(candidates)})"
+            elif primary:
+                server = primary
+                reason = "нет доступной предпочтительной реплики"
+                if errors:
+                    reason += " (" + "; ".join(f"{s}: {e}" for s, e in errors.items()) + ")"
+            else:
+                continue
+            load[server] = load.get(server, 0) + sizes.get(db, 0)
+            routes[db] = {
+                'server': server,
+                'conn_str': replica_connection_string(conn_str, server),
+                'secondary': server != primary,
+                'reason': f"AG {groups[db]}, {reason}",
+            }
+        return routes
+
+    def get_backup_destinations(self):
+        """Режим дополнительных копий и их пути"""
+        mode = self.combo_destinations.currentData()
+        if mode == DEST_S3:
+            return DEST_S3, [self.s3.base_url]
+        paths = split_paths(self.destination_paths.text()) if mode != DEST_NONE else []
+        return (mode, paths) if paths else (DEST_NONE, [])
+
+    def on_destination_mode_changed(self):
+        self.destination_paths.setEnabled(self.combo_destinations.currentData() in (DEST_MIRROR, DEST_REPLICA))
+
+    def handle_backup_destinations(self, job):
+        """После бэкапа: отметка зеркальных копий или запуск фоновой репликации"""
+        mode, paths = job['destinations']
+        primary = []
+        for sql in job['cmds']:
+            if COMMAND_PATTERN.match(sql):
+                # Файлы основного пути - до первого MIRROR TO
+                main_part = re.split(r"\sMIRROR\s+TO\s", sql, flags=re.IGNORECASE)[0]
+                primary += [p.replace("''", "'") for p in DISK_LIST_PATTERN.findall(main_part)]
+        if mode == DEST_MIRROR:
+            for src in primary:
+                for dest in paths:
+                    self.set_replica_status(src, dest, REPLICA_DONE)
+        elif mode == DEST_S3:
+            self.start_s3_upload(primary)
+        else:
+            self.start_replication(primary, paths)
+
+    def start_replication(self, files, destinations):
+        """Фоновое копирование файлов на вторичные пути"""
+        for src in files:
+            for dest in destinations:
+                self.set_replica_status(src, dest, REPLICA_PENDING)
+        worker = ReplicaWorker(files, destinations, REPLICA_MBPS or get_throttle_policy()['job_mbps'])
+        self.run_transfer(worker, f"Репликация ({len(files)} файлов)",
+                          [f"{src} -> {dest}" for src in files for dest in destinations])
+        worker.status.connect(self.set_replica_status)
+        worker.event.connect(self.metrics.record)
+        worker.finished.connect(lambda success, msg: self.on_replication_finished(worker))
+        self.replica_workers.append(worker)
+        worker.start()
+
+    def on_replication_finished(self, worker):
+        worker.wait()
+        if worker in self.replica_workers:
+            self.replica_workers.remove(worker)
+
+    def set_replica_status(self, path, dest, state):
+        """Состояние копии файла (полный путь) на пути назначения (сохраняется между запусками)"""
+        key = replica_key(path)
+        self.replica_status.setdefault(key, {})[dest] = state
+        if not state.startswith((REPLICA_PENDING, REPLICA_COPYING)):
+            try:
+                save_json_file(REPLICA_STATUS_FILE, self.replica_status, indent=None)
+            except OSError:
+                pass
+        if self.is_tab_built(TAB_FILES):
+            for row, file_info in enumerate(self.backup_files):
+                if any(replica_key(part['path']) == key for part in backup_parts([file_info])):
+                    self.files_model.row_changed(row, FileListModel.REPLICA_COLUMN, FileListModel.REPLICA_COLUMN)
+
+    def describe_replicas(self, file_info):
+        """Колонка копий: число готовых копий и состояние по каждому пути в подсказке (текст, подсказка, цвет).
+        Копия набора частей готова, когда готовы копии всех частей"""
+        parts = [self.replica_status.get(replica_key(part['path']), {}) for part in backup_parts([file_info])]
+        statuses = {}
+        for dest in dict.fromkeys(dest for part in parts for dest in part):
+            unfinished = [part.get(dest) for part in parts if part.get(dest) != REPLICA_DONE]
+            statuses[dest] = (REPLICA_DONE if not unfinished else
+                              next((s for s in unfinished if s), f"{REPLICA_FAILED}: нет копии части"))
+        if not statuses:
+            return None
+        done = sum(1 for s in statuses.values() if s == REPLICA_DONE)
+        failed = any(s.startswith(REPLICA_FAILED) for s in statuses.values())
+        tooltip = "\n".join(f"{dest}: {REPLICA_STATE_TITLES.get(s.split(':')[0], s)}"
+                            + (s[len(REPLICA_FAILED):] if s.startswith(REPLICA_FAILED) else "")
+                            for dest, s in statuses.items())
+        if failed:
+            color = QColor('#f44336')
+        elif done == len(statuses):
+            color = QColor('#4CAF50')
+        else:
+            color = QColor('#2196F3')
+        return f"{done}/{len(statuses)}", tooltip, color
+
+    def replicate_selected_files(self):
+        """Ручная (повторная) репликация выбранных файлов на вторичные пути"""
+        self.ensure_tab_built(TAB_BACKUP)
+        mode, paths = self.get_backup_destinations()
+        if mode != DEST_REPLICA:
+            paths = split_paths(REPLICA_PATHS)
+        files = [f for f in backup_parts(self.get_selected_files()) if not f.get('remote')]
+        if not files or not paths:
+            QMessageBox.warning(self, "Ошибка", "Выберите файлы и укажите пути репликации на вкладке бэкапа")
+            return
+        self.start_replication([f['path'] for f in files], paths)
+
+    def create_s3_credential(self):
+        """Создание на сервере CREDENTIAL для BACKUP TO URL (имя - адрес бакета)"""
+        if not self.connection:
+            QMessageBox.warning(self, "Ошибка", "Сначала подключитесь к серверу!")
+            return
+        name = self.s3.base_url
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT 1 FROM sys.credentials WHERE name = ?", name)
+            action = "ALTER" if cursor.fetchone() else "CREATE"
+            # Секрет не попадает в задания и метрики - команда выполняется напрямую
+            cursor.execute(f"{action} CREDENTIAL [{name}] WITH IDENTITY = 'S3 Access Key', "
+                           f"SECRET = N'{sql_quote(S3_ACCESS_KEY + ':' + S3_SECRET_KEY)}'")
+            self.connection.commit()
+            QMessageBox.information(self, "Успех", f"CREDENTIAL для {name} сохранен на сервере")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать CREDENTIAL:\n{str(e)}")
+
+    def start_s3_upload(self, files):
+        """Фоновая загрузка файлов в S3 (состояние - в колонке копий)"""
+        for src in files:
+            self.set_replica_status(src, self.s3.base_url, REPLICA_PENDING)
+        worker = S3UploadWorker(self.s3, files, S3_MBPS or get_throttle_policy()['job_mbps'])
+        self.run_transfer(worker, f"Загрузка в S3 ({len(files)} файлов)",
+                          [f"{src} -> {self.s3.base_url}" for src in files])
+        worker.status.connect(self.set_replica_status)
+        worker.progress.connect(self.update_status)
+        worker.event.connect(self.metrics.record)
+        worker.finished.connect(lambda success, msg: self.on_s3_upload_finished(worker))
+        self.s3_workers.append(worker)
+        worker.start()
+
+    def on_s3_upload_finished(self, worker):
+        worker.wait()
+        if worker in self.s3_workers:
+            self.s3_workers.remove(worker)
+        self.drop_s3_listing_cache()
+        self.start_s3_listing()
+
+    def upload_selected_files_to_s3(self):
+        """Загрузка (или продолжение прерванной загрузки) выбранных файлов в S3"""
+        if not self.s3:
+            QMessageBox.warning(self, "Ошибка", "Хранилище S3 не настроено (S3_ENDPOINT, S3_BUCKET)")
+            return
+        files = [f['path'] for f in backup_parts(self.get_selected_files()) if not f.get('remote')]
+        if not files:
+            QMessageBox.warning(self, "Ошибка", "Выберите локальные файлы для загрузки")
+            return
+        self.start_s3_upload(files)
+
+    def start_s3_download(self, items, on_finished):
+        """Фоновое скачивание объектов S3: items - [(ключ, локальный путь)]"""
+        policy = get_throttle_policy()
+        GLOBAL_COPY_LIMITER.set_rate(policy['global_mbps'])
+        worker = S3DownloadWorker(self.s3, items, S3_MBPS or policy['job_mbps'])
+        self.run_transfer(worker, f"Скачивание из S3 ({len(items)} файлов)",
+                          [f"{key} -> {dst}" for key, dst in items])
+        worker.progress.connect(self.update_status)
+        worker.event.connect(self.metrics.record)
+        worker.finished.connect(lambda success, msg: on_finished(worker, success, msg))
+        self.copy_workers.append(worker)
+        worker.start()
+
+    def drop_s3_listing_cache(self):
+        """Сброс кеша списка объектов бакета (после загрузки, бэкапа в S3 или удаления)"""
+        cache = load_json_file(S3_LIST_CACHE_FILE, {})
+        stale = [key for key in cache if key.startswith(self.s3.base_url + "/")]
+        if stale:
+            for key in stale:
+                del cache[key]
+            try:
+                save_json_file(S3_LIST_CACHE_FILE, cache, indent=None)
+            except OSError:
+                pass
+
+    def estimate_batch_sizes(self, databases, backup_types):
+        """Оценка размера бэкапа каждой базы: история и снимки размеров, иначе размер файлов данных
+        (sys.master_files) с коэффициентом сжатия, усвоенным по истории сервера"""
+        estimates = {}
+        for db in databases:
+            if backup_types[db] == 'DIFF':
+                rows = self.get_history_rows(db, 'DIFF')
+                if rows:
+                    estimates[db] = rows[-1]['compressed']
+                    continue
+            estimate = self.estimate_backup(db)
+            if estimate:
+                estimates[db] = estimate[0]
+                continue
+            rows = self.get_history_rows(db, 'FULL')
+            if rows:
+                estimates[db] = rows[-1]['compressed']
+        
+        missing = [db for db in databases if db not in estimates]
+        if missing:
+            ratio = 1.0
+            if self.chk_compression.isChecked():
+                full_rows = [r for r in self.backup_history.get(self.current_server, {}).get('rows', [])
+                             if r['type'] == 'D' and r['size']]
+                if full_rows:
+                    ratio = sum(r['compressed'] / r['size'] for r in full_rows) / len(full_rows)
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT DB_NAME(database_id), SUM(CAST(size AS BIGINT)) * 8192 "
+                           "FROM sys.master_files WHERE type = 0 GROUP BY database_id")
+            data_sizes = {name: int(size) for name, size in cursor.fetchall()}
+            for db in missing:
+                estimates[db] = data_sizes.get(db, 0) * ratio
+        return estimates
+
+    def plan_backup_space(self, databases, backup_types, target_path, callback):
+        """Распределение пакета бэкапов по путям с учетом свободного места: callback({база: путь}),
+        при отмене запуска не вызывается. Если места не хватает, устаревшие бэкапы на пути ищутся
+        в фоне, а диалог выбора показывается по итогам поиска."""
+        targets = {db: target_path for db in databases}
+        free = self.path_status.free_space(target_path)
+        if free is None:
+            callback(targets)
+            return
+        try:
+            estimates = self.estimate_batch_sizes(databases, backup_types)
+        except Exception as e:
+            self.notify(f"Не удалось оценить размер бэкапов: {str(e)[:80]}", "#ff9800")
+            callback(targets)
+            return
             
-            if self.radio_differential.isChecked():
-                cmd += ", DIFFERENTIAL"
+        reserve = 1 + SPACE_RESERVE_PCT / 100
+        total = sum(estimates.values()) * reserve
+        if total <= free:
+            callback(targets)
+            return
             
-            if self.chk_compression.isChecked():
-                cmd += ", COMPRESSION"
+        # Базы, которые не помещаются на основной путь (в порядке очереди)
+        overflow = []
+        remaining = free
+        for db in databases:
+            need = estimates[db] * reserve
+            if need <= remaining:
+                remaining -= need
+            else:
+                overflow.append(db)
+        overflow_size = sum(estimates[db] for db in overflow) * reserve
+        
+        secondary = BACKUP_SECONDARY_PATH
+        if secondary and not secondary.endswith(("\\", "/")):
+            secondary += "\\"
+        secondary_free = self.path_status.free_space(secondary) if secondary else None
+        
+        def choose(prune_files):
+            prune_size = sum(f['size'] for f in prune_files)
+            box = QMessageBox(QMessageBox.Warning, "Недостаточно места",
+                              f"Для {len(databases)} баз нужно около {format_size(total)} "
+                              f"(с запасом {SPACE_RESERVE_PCT:.0f}%), свободно {format_size(free)} на {target_path}.\n"
+                              f"Не помещаются: {len(overflow)} баз ({format_size(overflow_size)}).", parent=self)
+            btn_secondary = btn_prune = None
+            if secondary_free is not None and secondary_free >= overflow_size:
+                btn_secondary = box.addButton(f"Перенести {len(overflow)} баз на {secondary}", QMessageBox.AcceptRole)
+            if prune_files and free + prune_size >= total:
+                btn_prune = box.addButton(f"Удалить {len(prune_files)} старых бэкапов ({format_size(prune_size)})",
+                                          QMessageBox.DestructiveRole)
+            btn_force = box.addButton("Запустить как есть", QMessageBox.RejectRole)
+            box.addButton("Отмена", QMessageBox.RejectRole)
+            box.setDetailedText("\n".join(f"{db}: {format_size(estimates[db])}" for db in databases))
+            box.exec()
             
-            if self.chk_copy_only.isChecked():
-                cmd += ", COPY_ONLY"
+            clicked = box.clickedButton()
+            if clicked is btn_secondary and btn_secondary is not None:
+                for db in overflow:
+                    targets[db] = secondary
+                callback(targets)
+            elif clicked is btn_prune and btn_prune is not None:
+                failed = []
+                for f in prune_files:
+                    try:
+                        os.remove(f['path'])
+                    except OSError:
+                        failed.append(f['path'])
+                if failed:
+                    QMessageBox.warning(self, "Ошибка", "Не удалось удалить файлы:\n" + "\n".join(failed[:10]))
+                    return
+                callback(targets)
+            elif clicked is btn_force:
+                callback(targets)
+        
+        if not BACKUP_RETENTION_DAYS:
+            choose([])
+            return
+        if self.retention_scan is not None:
+            self.notify("Поиск устаревших бэкапов еще выполняется", "#ff9800")
+            return
+        
+        def on_scanned(found, dirs, timings, errors):
+            self.retention_scan.wait()
+            self.retention_scan = None
+            choose(find_retention_candidates(found, BACKUP_RETENTION_DAYS))
+        
+        self.notify(f"Не хватает места на {target_path}, поиск устаревших бэкапов...", "#ff9800")
+        self.retention_scan = ScanWorker([target_path], SCAN_MAX_DEPTH, ('*.bak',), ())
+        self.retention_scan.finished.connect(on_scanned)
+        self.retention_scan.start()
+
+    def get_throttle_hints(self):
+        """Серверные опции бэкапа и строка подключения для текущего окна нагрузки"""
+        policy = get_throttle_policy()
+        if not self.chk_throttle.isChecked() or not policy['throttled']:
+            return "", self.conn_str_cache
             
-            if self.chk_verify.isChecked():
-                cmd += ", CHECKSUM"
+        options = ""
+        if THROTTLE_BUFFERCOUNT:
+            options += f", BUFFERCOUNT = {THROTTLE_BUFFERCOUNT}"
+        if THROTTLE_MAXTRANSFERSIZE:
+            options += f", MAXTRANSFERSIZE = {THROTTLE_MAXTRANSFERSIZE}"
             
-            sql_commands.append(cmd)
+        # Классификатор Resource Governor может отнести сессию к ограниченной группе по APP_NAME()
+        conn_str = self.conn_str_cache
+        if THROTTLE_APP_NAME:
+            conn_str += f"APP={THROTTLE_APP_NAME};"
+        return options, conn_str
 
-        operation_name = f"Массовый {backup_type} бэкап ({len(selected_dbs)} баз)"
-        self.run_worker(sql_commands, operation_name)
+    def choose_backup_types(self, databases):
+        """Выбор типа бэкапа (FULL/DIFF) для каждой базы по доле измененных экстентов"""
+        backup_types = {db: 'FULL' for db in databases}
+        if not databases:
+            return backup_types
+            
+        def extent_query(db):
+            return f"""
+                SELECT N'{sql_quote(db)}' AS name,
+                       SUM(fsu.modified_extent_page_count) AS modified_pages,
+                       SUM(fsu.allocated_extent_page_count) AS allocated_pages,
+                       (SELECT COUNT(*) FROM sys.master_files mf
+                        WHERE mf.database_id = DB_ID(N'{sql_quote(db)}') AND mf.type = 0
+                        AND mf.differential_base_lsn IS NOT NULL) AS has_base
+                FROM [{db.replace(']', ']]')}].sys.dm_db_file_space_usage fsu"""
+        
+        # Обычно все выбранные базы читаются одним пакетным запросом; если он не выполнился
+        # из-за одной из баз, базы опрашиваются по отдельности и полный бэкап получают только они
+        cursor = self.connection.cursor()
+        failed = {}
+        try:
+            cursor.execute(" UNION ALL ".join(extent_query(db) for db in databases))
+            rows = cursor.fetchall()
+        except Exception:
+            rows = []
+            for db in databases:
+                try:
+                    cursor.execute(extent_query(db))
+                    rows += cursor.fetchall()
+                except Exception as e:
+                    # modified_extent_page_count есть только в SQL Server 2016 SP2+
+                    failed[db] = str(e)
+        
+        for name, modified_pages, allocated_pages, has_base in rows:
+            # Без базового полного бэкапа дифференциальный невозможен
+            if not has_base or not allocated_pages:
+                continue
+            changed_percent = (modified_pages or 0) * 100.0 / allocated_pages
+            if changed_percent < AUTO_DIFF_THRESHOLD:
+                backup_types[name] = 'DIFF'
+        
+        if failed:
+            self.notify(f"Авто-режим: не удалось оценить изменения, полный бэкап для {', '.join(failed)}",
+                        "#ff9800")
+            self.status_label.setToolTip("\n".join(f"{db}: {error}" for db, error in failed.items()))
+        return backup_types
 
     # Вкладка  Восстановление 
-    def init_restore_tab(self):
-        tab = QWidget()
+    def init_restore_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(15)
 
@@ -860,7 +4291,7 @@ class BackupApp(QMainWindow):
         self.db_combo_restore = QComboBox()
         
         self.file_path_restore = QLineEdit()
-        self.file_path_restore.setPlaceholderText("Выберите .bak файл или введите путь")
+        self.file_path_restore.setPlaceholderText("Выберите .bak файл или введите путь (части бэкапа - через ';')")
         
         file_layout = QHBoxLayout()
         btn_browse = QPushButton("Обзор файлов")
@@ -877,13 +4308,94 @@ class BackupApp(QMainWindow):
         
         layout.addLayout(form)
         
+        # Восстановление в новую базу (клон) с переносом файлов
+        clone_group = QGroupBox("Восстановление как новая база")
+        clone_group.setCheckable(True)
+        clone_group.setChecked(False)
+        clone_layout = QFormLayout()
+        
+        self.clone_name_edit = QLineEdit()
+        self.clone_name_edit.setPlaceholderText("Имя новой базы, например Sales_DEV")
+        self.clone_data_dir = QLineEdit(RESTORE_DATA_PATH)
+        self.clone_data_dir.setPlaceholderText("Папка файлов данных (по умолчанию - папка сервера)")
+        self.clone_log_dir = QLineEdit(RESTORE_LOG_PATH)
+        self.clone_log_dir.setPlaceholderText("Папка журнала (по умолчанию - папка сервера)")
+        
+        btn_check_clone = QPushButton("Проверить место и IFI")
+        btn_check_clone.clicked.connect(self.check_clone_restore)
+        self.lbl_clone_info = QLabel("")
+        self.lbl_clone_info.setWordWrap(True)
+        
+        clone_layout.addRow("Новая база:", self.clone_name_edit)
+        clone_layout.addRow("Файлы данных:", self.clone_data_dir)
+        clone_layout.addRow("Журнал:", self.clone_log_dir)
+        clone_layout.addRow(btn_check_clone, self.lbl_clone_info)
+        clone_group.setLayout(clone_layout)
+        self.clone_group = clone_group
+        layout.addWidget(clone_group)
+        
+        # Снимки базы (database snapshot): быстрый откат тестовой базы без полного восстановления
+        snapshot_group = QGroupBox("Снимки базы (откат за секунды)")
+        snapshot_layout = QVBoxLayout()
+        
+        self.snapshots_table = QTableWidget()
+        self.snapshots_table.setColumnCount(4)
+        self.snapshots_table.setHorizontalHeaderLabels(["Снимок", "База", "Создан", "Размер на диске"])
+        self.snapshots_table.horizontalHeader().setStretchLastSection(True)
+        self.snapshots_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.snapshots_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.snapshots_table.verticalHeader().setVisible(False)
+        self.snapshots_table.setMaximumHeight(130)
+        self.snapshots_table.setColumnWidth(0, 250)
+        self.snapshots_table.setColumnWidth(1, 150)
+        self.snapshots_table.setColumnWidth(2, 130)
+        
+        snapshot_form = QHBoxLayout()
+        self.snapshot_name_edit = QLineEdit()
+        self.snapshot_name_edit.setPlaceholderText("Имя снимка (по умолчанию база_snap_дата)")
+        self.snapshot_dir = QLineEdit(SNAPSHOT_PATH)
+        self.snapshot_dir.setPlaceholderText("Папка sparse-файлов (по умолчанию - рядом с файлами данных)")
+        self.snapshot_dir.setToolTip("Папка на сервере, локальный том NTFS/ReFS (сетевые пути не поддерживаются)")
+        snapshot_form.addWidget(self.snapshot_name_edit, 1)
+        snapshot_form.addWidget(self.snapshot_dir, 1)
+        
+        snapshot_buttons = QHBoxLayout()
+        btn_create_snapshot = QPushButton("Создать снимок")
+        btn_create_snapshot.setObjectName("BlueBtn")
+        btn_create_snapshot.clicked.connect(self.create_snapshot)
+        btn_revert_snapshot = QPushButton("Откатить к снимку")
+        btn_revert_snapshot.setObjectName("YellowBtn")
+        btn_revert_snapshot.clicked.connect(self.revert_to_snapshot)
+        btn_drop_snapshot = QPushButton("Удалить снимки")
+        btn_drop_snapshot.setObjectName("RedBtn")
+        btn_drop_snapshot.clicked.connect(self.drop_snapshots)
+        btn_refresh_snapshots = QPushButton("Обновить")
+        btn_refresh_snapshots.clicked.connect(self.load_snapshots)
+        snapshot_buttons.addWidget(btn_create_snapshot)
+        snapshot_buttons.addWidget(btn_revert_snapshot)
+        snapshot_buttons.addWidget(btn_drop_snapshot)
+        snapshot_buttons.addStretch()
+        snapshot_buttons.addWidget(btn_refresh_snapshots)
+        
+        snapshot_layout.addWidget(self.snapshots_table)
+        snapshot_layout.addLayout(snapshot_form)
+        snapshot_layout.addLayout(snapshot_buttons)
+        snapshot_group.setLayout(snapshot_layout)
+        layout.addWidget(snapshot_group)
+        
         # Опции восстановления
         options_group = QGroupBox("Опции восстановления")
         options_layout = QVBoxLayout()
         
-        self.chk_close_conns = QCheckBox("Принудительно отключить пользователей (SINGLE_USER)")
-        self.chk_close_conns.setChecked(True)
-        self.chk_close_conns.setToolTip("Необходимо, если в базе кто-то работает")
+        # Способ отключения пользователей перед восстановлением
+        close_layout = QHBoxLayout()
+        self.combo_close_conns = QComboBox()
+        for title, mode in CLOSE_CONNECTION_MODES:
+            self.combo_close_conns.addItem(title, mode)
+        self.combo_close_conns.setToolTip("Необходимо, если в базе кто-то работает. "
+                                          "Перед восстановлением показываются активные сессии и оценка отката")
+        close_layout.addWidget(QLabel("Отключение пользователей:"))
+        close_layout.addWidget(self.combo_close_conns, 1)
         
         self.chk_overwrite = QCheckBox("Перезаписать существующую базу (REPLACE)")
         self.chk_overwrite.setChecked(True)
@@ -893,7 +4405,7 @@ class BackupApp(QMainWindow):
         self.chk_recovery.setChecked(True)
         self.chk_recovery.setToolTip("Восстанавливает базу данных и делает её доступной")
         
-        options_layout.addWidget(self.chk_close_conns)
+        options_layout.addLayout(close_layout)
         options_layout.addWidget(self.chk_overwrite)
         options_layout.addWidget(self.chk_recovery)
         options_group.setLayout(options_layout)
@@ -907,12 +4419,11 @@ class BackupApp(QMainWindow):
         layout.addWidget(btn_restore)
         
         layout.addStretch()
-        self.tabs.addTab(tab, "Восстановление")
 
     def browse_backup_file_local(self):
         """Просмотр файлов бэкапов в сетевой папке"""
         # Используем сетевой путь по умолчанию
-        initial_path = DEFAULT_BACKUP_PATH if os.path.exists(DEFAULT_BACKUP_PATH) else r""
+        initial_path = DEFAULT_BACKUP_PATH if self.path_status.exists(DEFAULT_BACKUP_PATH) else r""
         
         fname, _ = QFileDialog.getOpenFileName(self, "Выберите файл бэкапа", 
                                               initial_path, "Backup Files (*.bak);;All Files (*)")
@@ -921,34 +4432,235 @@ class BackupApp(QMainWindow):
 
     def load_databases_for_restore(self):
         """Загрузка списка баз для восстановления"""
-        if not self.connection:
+        if not self.connection or not self.is_tab_built(TAB_RESTORE):
             return
             
         cursor = self.connection.cursor()
-        cursor.execute("SELECT name FROM sys.databases WHERE name NOT IN ('master', 'tempdb', 'model')")
+        cursor.execute("SELECT name FROM sys.databases WHERE name NOT IN ('master', 'tempdb', 'model') "
+                       "AND source_database_id IS NULL")
         dbs = cursor.fetchall()
         
         self.db_combo_restore.clear()
         for db in dbs:
             self.db_combo_restore.addItem(db[0])
+        
+        # Папки сервера по умолчанию для файлов клона
+        try:
+            cursor.execute("SELECT CAST(SERVERPROPERTY('InstanceDefaultDataPath') AS NVARCHAR(512)), "
+                           "CAST(SERVERPROPERTY('InstanceDefaultLogPath') AS NVARCHAR(512))")
+            data_path, log_path = cursor.fetchone()
+            self.clone_data_dir.setPlaceholderText(data_path or "")
+            self.clone_log_dir.setPlaceholderText(log_path or "")
+        except Exception:
+            pass
+        
+        self.load_snapshots()
+
+    def get_clone_plan(self, media_files, new_db):
+        """План восстановления клона: MOVE для каждого файла базы и требуемое место по томам
+        (media_files - все части бэкапа)"""
+        cursor = self.connection.cursor()
+        cursor.execute(f"RESTORE FILELISTONLY FROM {backup_media_clause(media_files)}")
+        columns = [c[0] for c in cursor.description]
+        files = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        data_dir = self.clone_data_dir.text() or self.clone_data_dir.placeholderText()
+        log_dir = self.clone_log_dir.text() or self.clone_log_dir.placeholderText()
+        if not data_dir or not log_dir:
+            raise ValueError("Не удалось определить папки для файлов новой базы")
+        
+        moves = []
+        required = {}   # {папка: байт}
+        for f in files:
+            directory = log_dir if f['Type'] == 'L' else data_dir
+            directory = directory.rstrip('\\/') + '\\'
+            # Расширение берем из исходного файла (для FILESTREAM - папка без расширения)
+            ext = ntpath.splitext(f['PhysicalName'])[1] if f['Type'] != 'S' else ""
+            target = f"{directory}{new_db}_{f['LogicalName']}{ext}"
+            moves.append((f['LogicalName'], target))
+            required[directory] = required.get(directory, 0) + int(f['Size'] or 0)
+        return moves, required, files
+
+    def get_volume_free_space(self):
+        """Свободное место на томах сервера: {точка монтирования: байт}"""
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT DISTINCT vs.volume_mount_point, vs.available_bytes
+            FROM sys.master_files mf
+            CROSS APPLY sys.dm_os_volume_stats(mf.database_id, mf.file_id) vs
+        """)
+        return {row[0]: int(row[1]) for row in cursor.fetchall()}
+
+    def get_instant_file_init(self):
+        """Включена ли мгновенная инициализация файлов (None - не удалось определить)"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                SELECT instant_file_initialization_enabled FROM sys.dm_server_services
+                WHERE servicename LIKE 'SQL Server (%'
+            """)
+            row = cursor.fetchone()
+            return row[0] == 'Y' if row else None
+        except Exception:
+            return None
+
+    def check_clone_space(self, required):
+        """Проверка места: список строк отчета и признак нехватки"""
+        volumes = self.get_volume_free_space()
+        lines = []
+        shortage = False
+        per_volume = {}
+        for directory, size in required.items():
+            # Том с самым длинным совпадающим префиксом
+            mount = max((m for m in volumes if directory.lower().startswith(m.lower())), key=len, default=None)
+            per_volume[mount] = per_volume.get(mount, 0) + size
+        for mount, size in per_volume.items():
+            if mount is None:
+                lines.append(f"⚠️ Не удалось определить том для {format_size(size)}")
+                continue
+            free = volumes[mount]
+            ok = free >= size
+            shortage = shortage or not ok
+            lines.append(f"{'✅' if ok else '❌'} {mount}: нужно {format_size(size)}, свободно {format_size(free)}")
+        return lines, shortage
+
+    def describe_clone_restore(self, files, ifi):
+        """Оценка влияния мгновенной инициализации файлов на время восстановления"""
+        data_size = sum(int(f['Size'] or 0) for f in files if f['Type'] != 'L')
+        log_size = sum(int(f['Size'] or 0) for f in files if f['Type'] == 'L')
+        if ifi is None:
+            text = "❔ Мгновенная инициализация файлов: не удалось определить"
+        elif ifi:
+            text = "✅ Мгновенная инициализация файлов включена - файлы данных не заполняются нулями"
+        else:
+            text = (f"⚠️ Мгновенная инициализация файлов выключена - {format_size(data_size)} "
+                    "файлов данных будут заполнены нулями перед восстановлением")
+        # Журнал заполняется нулями всегда
+        return text + f"\nЖурнал {format_size(log_size)} заполняется нулями в любом случае"
+
+    def check_clone_restore(self):
+        """Проверка места и мгновенной инициализации файлов для клона"""
+        if not self.connection:
+            return
+        media_files = restore_media_files(self.file_path_restore.text())
+        new_db = self.clone_name_edit.text().strip()
+        if not media_files or not new_db:
+            QMessageBox.warning(self, "Ошибка", "Укажите файл бэкапа и имя новой базы")
+            return
+        try:
+            moves, required, files = self.get_clone_plan(media_files, new_db)
+            lines, shortage = self.check_clone_space(required)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать бэкап:\n{str(e)}")
+            return
+        lines.append(self.describe_clone_restore(files, self.get_instant_file_init()))
+        self.lbl_clone_info.setText("\n".join(lines))
+        self.lbl_clone_info.setStyleSheet("color: #f44336;" if shortage else "")
+
+    def start_clone_restore(self, media_files):
+        """Восстановление бэкапа (все части) в новую базу с переносом файлов (WITH MOVE)"""
+        new_db = self.clone_name_edit.text().strip()
+        if not new_db:
+            QMessageBox.warning(self, "Ошибка", "Укажите имя новой базы")
+            return
+        exists = self.db_combo_restore.findText(new_db) >= 0
+        if exists and not self.chk_overwrite.isChecked():
+            QMessageBox.warning(self, "Ошибка", f"База '{new_db}' уже существует. Включите REPLACE или выберите другое имя.")
+            return
+            
+        try:
+            moves, required, files = self.get_clone_plan(media_files, new_db)
+            lines, shortage = self.check_clone_space(required)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать бэкап:\n{str(e)}")
+            return
+        lines.append(self.describe_clone_restore(files, self.get_instant_file_init()))
+        self.lbl_clone_info.setText("\n".join(lines))
+        
+        if shortage:
+            QMessageBox.critical(self, "Недостаточно места", "\n".join(lines))
+            return
+            
+        reply = QMessageBox.question(self, "Подтверждение",
+                                     f"Восстановить '{describe_media(media_files)}' как базу '{new_db}'?\n\n" +
+                                     "\n".join(lines),
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.No:
+            return
+            
+        options = [f"MOVE N'{sql_quote(logical)}' TO N'{sql_quote(target)}'" for logical, target in moves]
+        if exists:
+            options.append("REPLACE")
+        options.append("RECOVERY" if self.chk_recovery.isChecked() else "NORECOVERY")
+        cmd = (f"RESTORE DATABASE [{new_db}] FROM {backup_media_clause(media_files)} WITH " +
+               ", ".join(options))
+        self.run_worker([cmd], f"Клонирование в '{new_db}'")
 
     def start_restore(self):
         if not self.connection: 
             return
         
         db_name = self.db_combo_restore.currentText()
-        file_path = self.file_path_restore.text()
+        # Бэкап в несколько файлов: части через ';', в команды передаются все части
+        media_files = restore_media_files(self.file_path_restore.text())
         
-        if not db_name or not file_path:
+        # Бэкап из S3 сначала скачивается, восстановление продолжится из локальной копии
+        if self.s3 and any(path.startswith("s3://") for path in media_files):
+            self.download_for_restore(media_files)
+            return
+        
+        if self.clone_group.isChecked():
+            if not media_files:
+                QMessageBox.warning(self, "Ошибка", "Выберите файл бэкапа")
+                return
+            self.start_clone_restore(media_files)
+            return
+        
+        if not db_name or not media_files:
             QMessageBox.warning(self, "Ошибка", "Выберите базу данных и файл бэкапа")
             return
-
-        if not os.path.exists(file_path):
-            QMessageBox.critical(self, "Ошибка", f"Файл не найден:\n{file_path}")
+        
+        # Путь - путь сервера: файл проверяется на сервере, а не в файловой системе приложения
+        try:
+            cursor = self.connection.cursor()
+            missing = [path for path in media_files if not server_file_exists(cursor, path)]
+        except Exception:
+            missing = []     # не удалось проверить - ошибку покажет само восстановление
+        if missing:
+            QMessageBox.critical(self, "Ошибка", "Файл не найден на сервере:\n" + "\n".join(missing))
             return
-
+        
+        # Частичный бэкап восстанавливается поэтапно: файлгруппы для записи, затем только для чтения
+        try:
+            plan = self.get_piecemeal_plan(media_files)
+        except ValueError as e:
+            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+        except Exception:
+            plan = None     # заголовок не прочитан - ошибку покажет само восстановление
+        plan_text = ""
+        if plan:
+            plan_text = "Поэтапное восстановление частичного бэкапа:\n"
+            if plan['base']:
+                plan_text += f"• частичный полный бэкап: {os.path.basename(plan['base'][0])}\n"
+            plan_text += f"• файлгруппы для записи: {describe_media(media_files)}\n"
+            plan_text += "".join(f"• файлгруппа {fg}: {os.path.basename(files[0])}\n"
+                                 for fg, files in plan['filegroups'])
+            if plan['missing']:
+                plan_text += ("⚠️ Нет бэкапа в каталоге, останутся недоступны: "
+                              + ", ".join(plan['missing']) + "\n")
+            plan_text += "\n"
+        
+        # Предварительная проверка: активные сессии и открытые транзакции
+        mode = self.combo_close_conns.currentData()
+        try:
+            preflight = self.get_restore_preflight(db_name)
+        except Exception as e:
+            preflight = f"⚠️ Не удалось получить активные сессии: {str(e)}"
+        
         reply = QMessageBox.question(self, "Подтверждение", 
-                                   f"Вы ТОЧНО хотите восстановить базу '{db_name}' из файла '{os.path.basename(file_path)}'?\n\n"
+                                   f"Вы ТОЧНО хотите восстановить базу '{db_name}' из файла '{describe_media(media_files)}'?\n\n"
+                                   f"{plan_text}{preflight}\n\n"
                                    "⚠️ ВСЕ ТЕКУЩИЕ ДАННЫЕ БУДУТ УДАЛЕНЫ!",
                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
@@ -956,28 +4668,291 @@ class BackupApp(QMainWindow):
             return
 
         cmds = []
-        # Переводим в Single User (выкидываем всех)
-        if self.chk_close_conns.isChecked():
-            cmds.append(f"ALTER DATABASE [{db_name}] SET SINGLE_USER WITH ROLLBACK IMMEDIATE")
+        cleanup_cmds = []
+        # Отключаем пользователей; возврат режима выполняется и при ошибке восстановления
+        if mode:
+            access, termination, restore_access = mode
+            cmds.append(f"ALTER DATABASE [{db_name}] SET {access} WITH {termination}")
+            cleanup_cmds.append(f"ALTER DATABASE [{db_name}] SET {restore_access}")
         
         # Само восстановление
-        restore_cmd = f"RESTORE DATABASE [{db_name}] FROM DISK = '{file_path}'"
+        options = []
         if self.chk_overwrite.isChecked():
-            restore_cmd += " WITH REPLACE"
-        if self.chk_recovery.isChecked():
-            restore_cmd += ", RECOVERY"
+            options.append("REPLACE")
+        recovery = "RECOVERY" if self.chk_recovery.isChecked() else "NORECOVERY"
+        options.append(recovery)
+        media = backup_media_clause(media_files)
+        if not plan:
+            cmds.append(f"RESTORE DATABASE [{db_name}] FROM {media} WITH " + ", ".join(options))
+        else:
+            # База становится доступной после файлгрупп для записи; файлгруппы только для чтения
+            # бэкапились после перевода в этот режим, журнал для них не нужен
+            partial_options = ", ".join(["PARTIAL"] + options[:-1])
+            if plan['base']:
+                cmds.append(f"RESTORE DATABASE [{db_name}] READ_WRITE_FILEGROUPS FROM "
+                            f"{backup_media_clause(plan['base'])} WITH {partial_options}, NORECOVERY")
+                cmds.append(f"RESTORE DATABASE [{db_name}] FROM {media} WITH {recovery}")
+            else:
+                cmds.append(f"RESTORE DATABASE [{db_name}] READ_WRITE_FILEGROUPS FROM "
+                            f"{media} WITH {partial_options}, {recovery}")
+            for fg, files in plan['filegroups']:
+                cmds.append(f"RESTORE DATABASE [{db_name}] FILEGROUP = N'{sql_quote(fg)}' FROM "
+                            f"{backup_media_clause(files)} WITH {recovery}")
+
+        self.run_worker(cmds, f"Восстановление '{db_name}'", cleanup_cmds=cleanup_cmds)
+
+    def get_piecemeal_plan(self, media_files):
+        """План поэтапного восстановления частичного бэкапа (READ_WRITE_FILEGROUPS), None - обычный бэкап.
+        {'base': файлы частичного полного бэкапа (для дифференциального) или None,
+         'filegroups': [(файлгруппа, файлы бэкапа из каталога)], 'missing': [файлгруппы без бэкапа]}"""
+        cursor = self.connection.cursor()
+        disk = backup_media_clause(media_files)
+        cursor.execute(f"RESTORE HEADERONLY FROM {disk}")
+        columns = [c[0] for c in cursor.description]
+        header = dict(zip(columns, cursor.fetchone()))
+        kind = (header.get('BackupTypeDescription') or "").lower()
+        if 'partial' not in kind:
+            return None
+        
+        # Файлгруппы, файлов которых нет в бэкапе (только для чтения на момент бэкапа)
+        cursor.execute(f"RESTORE FILELISTONLY FROM {disk}")
+        columns = [c[0] for c in cursor.description]
+        absent = dict.fromkeys(f['FileGroupName'] for f in (dict(zip(columns, row)) for row in cursor.fetchall())
+                               if f['Type'] == 'D' and not f['IsPresent'])
+        
+        source_db = header['DatabaseName']
+        known = load_json_file(FILEGROUP_CATALOG_FILE, {}).get(self.current_server, {}).get(source_db, {})
+        plan = {'base': None, 'filegroups': [], 'missing': []}
+        if 'differential' in kind:
+            # Основа - частичный полный бэкап с backup_set_guid, равным DifferentialBaseGUID
+            base = known.get('partial')
+            if not base or base.get('guid') != normalize_guid(header.get('DifferentialBaseGUID')):
+                raise ValueError(f"В каталоге нет полного бэкапа базы '{source_db}', от которого снят "
+                                 f"дифференциальный (DifferentialBaseGUID {header.get('DifferentialBaseGUID')})")
+            plan['base'] = base['files']
+        for fg in absent:
+            entry = known.get('filegroups', {}).get(fg)
+            # Файлы бэкапа проверяются на сервере - восстанавливает их сервер
+            if entry and all(server_file_exists(cursor, path) for path in entry['files']):
+                plan['filegroups'].append((fg, entry['files']))
+            else:
+                plan['missing'].append(fg)
+        return plan
+
+    def download_for_restore(self, urls):
+        """Скачивание бэкапа (всех частей) из S3 (параллельные ranged GET) в папку, доступную серверу"""
+        keys = [self.s3.key_from_url(url) for url in urls]
+        foreign = [url for url, key in zip(urls, keys) if not key]
+        if foreign:
+            QMessageBox.warning(self, "Ошибка", "Файл не из настроенного бакета:\n" + "\n".join(foreign))
+            return
+        # Путь бэкапов - путь сервера и не обязательно доступен приложению по тому же имени,
+        # поэтому папка для скачивания задается явно
+        if not S3_DOWNLOAD_PATH:
+            QMessageBox.warning(self, "Ошибка",
+                                "Для восстановления из S3 задайте S3_DOWNLOAD_PATH - папку, доступную и "
+                                "приложению, и серверу (например, UNC путь), в которую скачивается бэкап")
+            return
+        items = [(key, os.path.join(S3_DOWNLOAD_PATH, key.rsplit('/', 1)[-1])) for key in keys]
+        self.notify(f"Скачивание {describe_media(keys)} из S3 для восстановления...", "#2196f3")
+        self.start_s3_download(items, lambda worker, success, msg:
+                               self.on_restore_download_finished(worker, success, msg, [dst for _, dst in items]))
+
+    def on_restore_download_finished(self, worker, success, msg, files):
+        self.on_copy_finished(worker, success, msg)
+        if success:
+            self.file_path_restore.setText("; ".join(files))
+            self.start_restore()
+
+    def load_snapshots(self):
+        """Список снимков баз сервера с занятым местом sparse-файлов"""
+        if not self.connection or not self.is_tab_built(TAB_RESTORE):
+            return
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                SELECT s.name, src.name, s.create_date,
+                       (SELECT SUM(vfs.size_on_disk_bytes)
+                        FROM sys.dm_io_virtual_file_stats(s.database_id, NULL) vfs)
+                FROM sys.databases s
+                JOIN sys.databases src ON src.database_id = s.source_database_id
+                ORDER BY src.name, s.create_date DESC
+            """)
+            snapshots = cursor.fetchall()
+            cursor.execute("""
+                SELECT DB_NAME(mf.database_id), mf.physical_name
+                FROM sys.master_files mf
+                JOIN sys.databases d ON d.database_id = mf.database_id
+                WHERE d.source_database_id IS NOT NULL
+            """)
+            files = {}
+            for name, path in cursor.fetchall():
+                files.setdefault(name, []).append(path)
+        except Exception as e:
+            self.notify(f"⚠️ Не удалось получить список снимков: {e}", "#ff9800")
+            return
+        
+        self.snapshots = [(name, source) for name, source, _, _ in snapshots]
+        self.snapshots_table.setRowCount(len(snapshots))
+        for row, (name, source, created, size) in enumerate(snapshots):
+            name_item = QTableWidgetItem(name)
+            name_item.setToolTip("\n".join(files.get(name, [])))
+            self.snapshots_table.setItem(row, 0, name_item)
+            self.snapshots_table.setItem(row, 1, QTableWidgetItem(source))
+            self.snapshots_table.setItem(row, 2, QTableWidgetItem(created.strftime("%d.%m.%Y %H:%M")))
+            self.snapshots_table.setItem(row, 3, QTableWidgetItem(format_size(int(size or 0))))
+
+    def selected_snapshots(self):
+        rows = sorted({index.row() for index in self.snapshots_table.selectedIndexes()})
+        return [self.snapshots[row] for row in rows if row < len(self.snapshots)]
+
+    def create_snapshot(self):
+        """Снимок выбранной базы: sparse-файл на каждый файл данных (в папке снимков или рядом с файлом)"""
+        if not self.connection:
+            return
+        db = self.db_combo_restore.currentText()
+        if not db:
+            QMessageBox.warning(self, "Ошибка", "Выберите базу данных")
+            return
+        name = self.snapshot_name_edit.text().strip() or f"{db}_snap_{datetime.now():%Y%m%d_%H%M%S}"
+        folder = self.snapshot_dir.text().strip()
         
-        cmds.append(restore_cmd)
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT name, physical_name, type, CAST(size AS BIGINT) * 8192 "
+                           "FROM sys.master_files WHERE database_id = DB_ID(?) AND type IN (0, 2)", db)
+            files = cursor.fetchall()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось получить файлы базы:\n{str(e)}")
+            return
+        data_files = [f for f in files if f[2] == 0]
+        if not data_files:
+            QMessageBox.warning(self, "Ошибка", f"Не найдены файлы данных базы '{db}'")
+            return
+        
+        # Sparse-файл растет по мере изменения страниц базы, в худшем случае - до размера файла данных
+        placement = []
+        required = {}
+        for logical, physical, _, size in data_files:
+            directory = folder or ntpath.dirname(physical)
+            placement.append((logical, ntpath.join(directory, f"{name}_{logical}.ss")))
+            required[directory] = required.get(directory, 0) + int(size)
+        try:
+            space_lines, _ = self.check_clone_space(required)
+        except Exception as e:
+            space_lines = [f"⚠️ Не удалось проверить место: {str(e)}"]
+        
+        text = (f"Создать снимок '{name}' базы '{db}'?\n\nSparse-файлы:\n"
+                + "\n".join(path for _, path in placement)
+                + "\n\nМесто при изменении всех страниц базы:\n" + "\n".join(space_lines))
+        if any(f[2] == 2 for f in files):
+            text += "\n\n⚠️ В базе есть FILESTREAM: в снимке он будет недоступен, откат к снимку невозможен."
+        if QMessageBox.question(self, "Снимок базы", text, QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        
+        cmds = []
+        if folder:
+            cmds.append(f"EXEC master.sys.xp_create_subdir N'{sql_quote(folder)}'")
+        cmds.append(f"CREATE DATABASE [{name}] ON "
+                    + ", ".join(f"(NAME = N'{sql_quote(logical)}', FILENAME = N'{sql_quote(path)}')"
+                                for logical, path in placement)
+                    + f" AS SNAPSHOT OF [{db}]")
+        job = self.run_worker(cmds, f"Снимок '{name}' базы '{db}'")
+        job['snapshots'] = True
+        self.snapshot_name_edit.clear()
+
+    def revert_to_snapshot(self):
+        """Откат базы к снимку (RESTORE ... FROM DATABASE_SNAPSHOT); остальные снимки базы удаляются"""
+        selected = self.selected_snapshots()
+        if len(selected) != 1:
+            QMessageBox.warning(self, "Ошибка", "Выберите один снимок для отката")
+            return
+        name, db = selected[0]
+        # Откат возможен, только если у базы один снимок
+        others = [s for s, source in self.snapshots if source == db and s != name]
+        
+        try:
+            preflight = self.get_restore_preflight(db)
+        except Exception as e:
+            preflight = f"⚠️ Не удалось получить активные сессии: {str(e)}"
+        text = (f"Откатить базу '{db}' к снимку '{name}'?\n\n{preflight}\n\n"
+                "⚠️ Все изменения после создания снимка будут потеряны. Журнал базы пересоздается, "
+                "цепочка бэкапов журнала прерывается - после отката нужен полный бэкап.")
+        if others:
+            text += "\n\nДругие снимки базы будут удалены:\n" + "\n".join(others)
+        if QMessageBox.question(self, "Откат к снимку", text, QMessageBox.Yes | QMessageBox.No,
+                                QMessageBox.No) != QMessageBox.Yes:
+            return
         
-        # Возвращаем Multi User
-        if self.chk_close_conns.isChecked():
-            cmds.append(f"ALTER DATABASE [{db_name}] SET MULTI_USER")
+        cmds = [f"DROP DATABASE [{s}]" for s in others]
+        cleanup_cmds = []
+        mode = self.combo_close_conns.currentData()
+        if mode:
+            access, termination, restore_access = mode
+            cmds.append(f"ALTER DATABASE [{db}] SET {access} WITH {termination}")
+            cleanup_cmds.append(f"ALTER DATABASE [{db}] SET {restore_access}")
+        cmds.append(f"RESTORE DATABASE [{db}] FROM DATABASE_SNAPSHOT = N'{sql_quote(name)}'")
+        job = self.run_worker(cmds, f"Откат '{db}' к снимку '{name}'", cleanup_cmds=cleanup_cmds)
+        job['snapshots'] = True
+
+    def drop_snapshots(self):
+        selected = self.selected_snapshots()
+        if not selected:
+            QMessageBox.warning(self, "Ошибка", "Выберите снимки для удаления")
+            return
+        if QMessageBox.question(self, "Удаление снимков", "Удалить снимки?\n\n"
+                                + "\n".join(f"{name} ({db})" for name, db in selected),
+                                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        job = self.run_worker([f"DROP DATABASE [{name}]" for name, _ in selected],
+                              f"Удаление снимков ({len(selected)})")
+        job['snapshots'] = True
 
-        self.run_worker(cmds, f"Восстановление '{db_name}'")
+    def get_restore_preflight(self, db_name):
+        """Отчет об активных сессиях базы, открытых транзакциях и оценке времени отката"""
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT s.session_id, s.login_name, s.host_name, s.program_name,
+                   COUNT(dt.transaction_id) AS open_transactions,
+                   COALESCE(SUM(dt.database_transaction_log_bytes_used), 0) AS log_bytes,
+                   MIN(dt.database_transaction_begin_time) AS tran_begin
+            FROM sys.dm_exec_sessions s
+            LEFT JOIN sys.dm_tran_session_transactions st ON st.session_id = s.session_id
+            LEFT JOIN sys.dm_tran_database_transactions dt
+                   ON dt.transaction_id = st.transaction_id AND dt.database_id = s.database_id
+            WHERE s.database_id = DB_ID(?) AND s.session_id <> @@SPID
+            GROUP BY s.session_id, s.login_name, s.host_name, s.program_name
+            ORDER BY log_bytes DESC
+        """, db_name)
+        sessions = cursor.fetchall()
+        if not sessions:
+            return "✅ Активных сессий в базе нет"
+            
+        open_transactions = sum(s[4] for s in sessions)
+        log_bytes = sum(int(s[5]) for s in sessions)
+        text = (f"Активных сессий: {len(sessions)}, открытых транзакций: {open_transactions}, "
+                f"использовано журнала: {format_size(log_bytes)}")
+        
+        if open_transactions:
+            # Откат занимает время, сравнимое с объемом изменений в журнале
+            rollback_seconds = log_bytes / (ROLLBACK_MBPS * 1024**2)
+            oldest = min((s[6] for s in sessions if s[6] is not None), default=None)
+            if oldest is not None:
+                text += f"\nСамая долгая транзакция открыта с {oldest.strftime('%H:%M:%S')}"
+            text += f"\nОценка отката: ~{format_duration(rollback_seconds)}"
+            if rollback_seconds > 60:
+                text += ("\n⚠️ Откат будет долгим: лучше дождаться завершения транзакций "
+                         "или выбрать NO_WAIT, чтобы не блокировать базу на время отката")
+        
+        # Сессии с наибольшим объемом журнала
+        for s in sessions[:5]:
+            text += f"\n  • SPID {s[0]} {s[1]}@{s[2]} ({s[3] or '-'}): {format_size(int(s[5]))}"
+        if len(sessions) > 5:
+            text += f"\n  ... и еще {len(sessions) - 5} сессий"
+        return text
 
     # Вкладка Планировщик
-    def init_scheduler_tab(self):
-        tab = QWidget()
+    def init_scheduler_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(15)
         
@@ -1020,8 +4995,27 @@ class BackupApp(QMainWindow):
         timer_layout.addWidget(self.btn_schedule)
         # timer_layout.addWidget(self.btn_test_backup)
         
+        # Окно, в которое бэкап должен уложиться
+        window_layout = QHBoxLayout()
+        self.chk_backup_window = QCheckBox("Должен завершиться до")
+        self.chk_backup_window.setToolTip("Проверять по истории, успеет ли бэкап завершиться в окне")
+        self.chk_backup_window.toggled.connect(self.update_next_backup_time)
+        self.window_end_edit = QTimeEdit()
+        self.window_end_edit.setTime(QTime(7, 0))
+        self.window_end_edit.setDisplayFormat("HH:mm")
+        self.window_end_edit.timeChanged.connect(self.update_next_backup_time)
+        window_layout.addWidget(self.chk_backup_window)
+        window_layout.addWidget(self.window_end_edit)
+        window_layout.addStretch()
+        
         gl.addRow("База данных:", self.db_combo_schedule)
         gl.addRow("Время запуска:", self.time_edit)
+        gl.addRow("Окно бэкапа:", window_layout)
+        
+        self.chk_agent_schedule = QCheckBox("На сервере (задание SQL Server Agent)")
+        self.chk_agent_schedule.setToolTip("Расписание переносится в задание SQL Agent и выполняется сервером "
+                                           "без открытого приложения;\nпуть и опции бэкапа - с вкладки бэкапа")
+        gl.addRow("Выполнение:", self.chk_agent_schedule)
         group.setLayout(gl)
         
         layout.addWidget(group)
@@ -1040,22 +5034,55 @@ class BackupApp(QMainWindow):
         self.lbl_next_backup.setAlignment(Qt.AlignCenter)
         self.lbl_next_backup.setStyleSheet("font-size: 12px; color: #aaa;")
         
+        self.lbl_schedule_forecast = QLabel("")
+        self.lbl_schedule_forecast.setAlignment(Qt.AlignCenter)
+        self.lbl_schedule_forecast.setStyleSheet("font-size: 12px; color: #aaa;")
+        
         status_layout.addWidget(self.lbl_timer_status)
         status_layout.addWidget(self.lbl_next_backup)
+        status_layout.addWidget(self.lbl_schedule_forecast)
         status_group.setLayout(status_layout)
         layout.addWidget(status_group)
         
-        layout.addStretch()
-        self.tabs.addTab(tab, "Планировщик")
+        # Задания SQL Agent, созданные приложением, и история их запусков
+        agent_group = QGroupBox("Задания SQL Server Agent")
+        agent_layout = QVBoxLayout()
+        self.lbl_agent_jobs = QLabel("")
+        self.lbl_agent_jobs.setStyleSheet("color: #aaa;")
+        self.agent_table = QTableWidget()
+        self.agent_table.setColumnCount(5)
+        self.agent_table.setHorizontalHeaderLabels(["Задание", "Запуск", "Длительность", "Результат", "Сообщение"])
+        self.agent_table.horizontalHeader().setStretchLastSection(True)
+        self.agent_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.agent_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.agent_table.verticalHeader().setVisible(False)
+        self.agent_table.setColumnWidth(0, 220)
+        self.agent_table.setColumnWidth(1, 130)
         
-        # Таймер для проверки времени
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.check_schedule)
-        self.timer.start(SCHEDULER_CHECK_INTERVAL)
+        agent_buttons = QHBoxLayout()
+        btn_agent_sync = QPushButton("Синхронизировать задание")
+        btn_agent_sync.clicked.connect(self.resync_agent_job)
+        btn_agent_refresh = QPushButton("Обновить историю")
+        btn_agent_refresh.clicked.connect(self.load_agent_history)
+        btn_agent_delete = QPushButton("Удалить задание")
+        btn_agent_delete.setObjectName("RedBtn")
+        btn_agent_delete.clicked.connect(self.delete_agent_job)
+        agent_buttons.addWidget(btn_agent_sync)
+        agent_buttons.addWidget(btn_agent_refresh)
+        agent_buttons.addStretch()
+        agent_buttons.addWidget(btn_agent_delete)
+        
+        agent_layout.addWidget(self.lbl_agent_jobs)
+        agent_layout.addWidget(self.agent_table)
+        agent_layout.addLayout(agent_buttons)
+        agent_group.setLayout(agent_layout)
+        layout.addWidget(agent_group)
+        
+        layout.addStretch()
 
     def load_databases_for_schedule(self):
         """Загрузка списка баз для планировщика"""
-        if not self.connection:
+        if not self.connection or not self.is_tab_built(TAB_SCHEDULER):
             return
             
         cursor = self.connection.cursor()
@@ -1065,6 +5092,7 @@ class BackupApp(QMainWindow):
         self.db_combo_schedule.clear()
         for db in dbs:
             self.db_combo_schedule.addItem(db[0])
+        self.reflect_agent_job(self.load_agent_history())
 
     def toggle_schedule(self, checked):
         if checked:
@@ -1072,22 +5100,263 @@ class BackupApp(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Выберите базу данных для планирования")
                 self.btn_schedule.setChecked(False)
                 return
+            
+            # Режим SQL Agent: бэкап запускает сервер, таймер приложения не нужен
+            if self.chk_agent_schedule.isChecked():
+                self.agent_job = self.sync_agent_job()
+                if not self.agent_job:
+                    self.btn_schedule.setChecked(False)
+                    return
+                self.timer.stop()
                 
-            self.btn_schedule.setText("Остановить планировщик")
-            self.btn_schedule.setStyleSheet("background-color: #f44336; color: white;")
-            self.lbl_timer_status.setText(f"Планировщик активен для базы '{self.db_combo_schedule.currentText()}'")
-            self.lbl_timer_status.setStyleSheet("color: #4CAF50; font-weight: bold;")
-            self.update_next_backup_time()
+            self.show_schedule_active()
         else:
+            if self.agent_job:
+                self.disable_agent_jobs()
+                self.agent_job = None
+                self.timer.start(SCHEDULER_CHECK_INTERVAL)
+            self.chk_agent_schedule.setEnabled(True)
             self.btn_schedule.setText("Активировать планировщик")
             self.btn_schedule.setStyleSheet("")
             self.lbl_timer_status.setText("Планировщик отключен")
             self.lbl_timer_status.setStyleSheet("color: grey;")
             self.lbl_next_backup.setText("Следующий бэкап: -")
+            self.lbl_schedule_forecast.setText("")
+
+    def show_schedule_active(self):
+        """Вид активного планировщика (таймер приложения или задание SQL Agent)"""
+        self.btn_schedule.setText("Остановить планировщик")
+        self.btn_schedule.setStyleSheet("background-color: #f44336; color: white;")
+        if self.agent_job:
+            self.lbl_timer_status.setText(f"Бэкап базы '{self.db_combo_schedule.currentText()}' выполняет "
+                                          f"SQL Server Agent (задание '{self.agent_job}')")
+        else:
+            self.lbl_timer_status.setText(f"Планировщик активен для базы '{self.db_combo_schedule.currentText()}'")
+        self.lbl_timer_status.setStyleSheet("color: #4CAF50; font-weight: bold;")
+        self.chk_agent_schedule.setEnabled(False)
+        self.update_next_backup_time()
+
+    def reflect_agent_job(self, jobs):
+        """Планировщик по заданиям SQL Agent подключенного сервера. Включенное задание приложения
+        (например, после перезапуска приложения) показывается как активный планировщик в режиме SQL Agent
+        с базой, днями и временем задания; задание, отключенное или удаленное на сервере, - как отключенный"""
+        if jobs is None:
+            return
+        enabled = {name: (days_mask, start_time) for name, is_enabled, _, days_mask, start_time in jobs
+                   if is_enabled}
+        if self.agent_job:
+            if self.agent_job not in enabled:
+                self.agent_job = None
+                self.timer.start(SCHEDULER_CHECK_INTERVAL)
+                self.btn_schedule.setChecked(False)
+                self.toggle_schedule(False)
+            return
+        if self.btn_schedule.isChecked() or not enabled:
+            return
+        
+        name = next(iter(enabled))
+        days_mask, start_time = enabled[name]
+        db = name[len(AGENT_JOB_PREFIX):]
+        if self.db_combo_schedule.findText(db) == -1:
+            self.db_combo_schedule.addItem(db)
+        self.db_combo_schedule.setCurrentText(db)
+        if days_mask:
+            for i, chk in enumerate(self.days_checkboxes):
+                chk.setChecked(bool(days_mask & (1 << ((i + 1) % 7))))
+        if start_time is not None:
+            self.time_edit.setTime(QTime(start_time // 10000, start_time // 100 % 100))
+        self.agent_job = name
+        self.timer.stop()
+        self.chk_agent_schedule.setChecked(True)
+        self.btn_schedule.setChecked(True)
+        self.show_schedule_active()
+
+    def sync_agent_job(self):
+        """Перенос расписания в задание SQL Server Agent (создание или обновление на месте).
+        Задания приложения для других баз отключаются - расписание одно. Возвращает имя задания."""
+        db = self.db_combo_schedule.currentText()
+        days_mask = sum(1 << ((i + 1) % 7) for i, chk in enumerate(self.days_checkboxes) if chk.isChecked())
+        if not days_mask:
+            QMessageBox.warning(self, "Ошибка", "Отметьте хотя бы один день недели")
+            return None
+        job_name = f"{AGENT_JOB_PREFIX}{db}"
+        start = self.time_edit.time()
+        try:
+            step, notes = self.build_agent_backup_step(db)
+            days = ", ".join(chk.text() for chk in self.days_checkboxes if chk.isChecked())
+            description = f"Бэкап базы {db}: {days} в {start.toString('HH:mm')} (создано SQL Server Backup Manager)"
+            cursor = self.connection.cursor()
+            cursor.execute(agent_job_script(job_name, description, step, days_mask,
+                                            start.hour() * 10000 + start.minute() * 100))
+            while cursor.nextset():
+                pass
+            self.connection.commit()
+            self.disable_agent_jobs(keep=job_name)
+        except Exception as e:
+            try:
+                self.connection.rollback()
+            except Exception:
+                pass
+            QMessageBox.critical(self, "Ошибка", f"Не удалось создать задание SQL Agent:\n{str(e)}")
+            return None
+        
+        # Задание выполнится, только если служба агента запущена
+        try:
+            cursor.execute("SELECT status_desc FROM sys.dm_server_services WHERE servicename LIKE N'SQL Server Agent%'")
+            row = cursor.fetchone()
+            if row and row[0] != 'Running':
+                notes.append(f"служба SQL Server Agent не запущена ({row[0]})")
+        except Exception:
+            pass
+        self.notify(f"Задание SQL Agent '{job_name}' синхронизировано"
+                    + ("; ⚠️ " + "; ".join(notes) if notes else ""), "#ff9800" if notes else "#4caf50")
+        self.load_agent_history()
+        return job_name
+
+    def build_agent_backup_step(self, db):
+        """Шаг задания SQL Agent с бэкапом как у встроенного планировщика и замечания о настройках,
+        которые выполняет только приложение"""
+        self.ensure_tab_built(TAB_BACKUP)
+        to_url = self.s3 is not None and self.chk_backup_to_url.isChecked()
+        mode, extra_paths = self.get_backup_destinations() if not to_url else (DEST_NONE, [])
+        mirror_paths = extra_paths if mode == DEST_MIRROR else ()
+        if to_url:
+            create_commands, disk_clause = [], backup_url_clause(self.s3, self.server_input.text(), db,
+                                                                 'SCHEDULED', AGENT_TIMESTAMP)
+        else:
+            path = self.backup_path.text()
+            if not path:
+                raise ValueError("Укажите путь для бэкапов на вкладке бэкапа")
+            if not path.endswith(("\\", "/")):
+                path += "\\"
+            create_commands, disk_clause = backup_disk_clause(path, self.server_input.text(), db, 'SCHEDULED',
+                                                              AGENT_TIMESTAMP, mirror_paths)
+        sql = f"BACKUP DATABASE [{db}] {disk_clause} WITH COMPRESSION, INIT, CHECKSUM"
+        if mirror_paths:
+            sql += ", FORMAT"
+        
+        # База группы доступности: задание проверяет предпочтительную реплику при запуске
+        guard_db = None
+        if self.chk_ag_routing.isChecked():
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT 1 FROM sys.databases WHERE name = ? AND replica_id IS NOT NULL", db)
+            if cursor.fetchone():
+                guard_db = db
+        notes = []
+        if mode in (DEST_REPLICA, DEST_S3):
+            notes.append("копирование на вторичные пути и в S3 выполняет приложение, в задание оно не входит")
+        if guard_db:
+            notes.append("для AG создайте задание и на остальных репликах")
+        return agent_backup_step(create_commands + [sql], guard_db), notes
+
+    def disable_agent_jobs(self, keep=None):
+        """Отключение заданий SQL Agent приложения (кроме keep); история запусков сохраняется"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT name FROM msdb.dbo.sysjobs WHERE name LIKE ? AND enabled = 1",
+                           agent_job_pattern())
+            for (name,) in cursor.fetchall():
+                if name != keep:
+                    cursor.execute("EXEC msdb.dbo.sp_update_job @job_name = ?, @enabled = 0", name)
+            self.connection.commit()
+        except Exception as e:
+            self.notify(f"⚠️ Не удалось отключить задания SQL Agent: {e}", "#ff9800")
+        self.load_agent_history()
+
+    def resync_agent_job(self):
+        """Повторная синхронизация после изменения расписания или опций бэкапа"""
+        if not self.agent_job:
+            QMessageBox.warning(self, "Ошибка", "Активируйте планировщик в режиме SQL Server Agent")
+            return
+        job_name = self.sync_agent_job()
+        if job_name:
+            self.agent_job = job_name
+            self.show_schedule_active()
+
+    def load_agent_history(self):
+        """Задания SQL Agent приложения (состояние, следующий запуск) и история их запусков.
+        Возвращает задания [(имя, включено, следующий запуск, маска дней, время запуска)] или None"""
+        if not self.connection or not self.is_tab_built(TAB_SCHEDULER):
+            return None
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                SELECT j.name, j.enabled, MIN(CASE WHEN js.next_run_date > 0
+                                              THEN js.next_run_date * 1000000 + js.next_run_time END),
+                       MAX(s.freq_interval), MAX(s.active_start_time)
+                FROM msdb.dbo.sysjobs j
+                LEFT JOIN msdb.dbo.sysjobschedules js ON js.job_id = j.job_id
+                LEFT JOIN msdb.dbo.sysschedules s ON s.schedule_id = js.schedule_id
+                WHERE j.name LIKE ?
+                GROUP BY j.name, j.enabled
+                ORDER BY j.name
+            """, agent_job_pattern())
+            jobs = cursor.fetchall()
+            cursor.execute(f"""
+                SELECT TOP {AGENT_HISTORY_ROWS} j.name, h.run_date, h.run_time, h.run_duration, h.run_status, h.message
+                FROM msdb.dbo.sysjobhistory h
+                JOIN msdb.dbo.sysjobs j ON j.job_id = h.job_id
+                WHERE j.name LIKE ? AND h.step_id = 0
+                ORDER BY h.instance_id DESC
+            """, agent_job_pattern())
+            history = cursor.fetchall()
+        except Exception as e:
+            self.lbl_agent_jobs.setText(f"⚠️ История SQL Agent недоступна: {str(e).splitlines()[0]}")
+            return None
+        
+        lines = []
+        for name, enabled, next_run, _, _ in jobs:
+            state = "включено" if enabled else "отключено"
+            if enabled and next_run:
+                run = datetime.strptime(f"{int(next_run):014d}", "%Y%m%d%H%M%S")
+                state += f", следующий запуск {run.strftime('%d.%m.%Y %H:%M')}"
+            lines.append(f"{name}: {state}")
+        self.lbl_agent_jobs.setText("\n".join(lines) or "Заданий SQL Agent нет")
+        
+        self.agent_table.setRowCount(len(history))
+        for row, (name, run_date, run_time, duration, status, message) in enumerate(history):
+            started = datetime.strptime(f"{run_date:08d}{run_time:06d}", "%Y%m%d%H%M%S")
+            seconds = duration // 10000 * 3600 + duration // 100 % 100 * 60 + duration % 100
+            title, color = AGENT_RUN_STATUS.get(status, (str(status), '#aaa'))
+            status_item = QTableWidgetItem(title)
+            status_item.setForeground(QColor(color))
+            message_item = QTableWidgetItem(message or "")
+            message_item.setToolTip(message or "")
+            self.agent_table.setItem(row, 0, QTableWidgetItem(name))
+            self.agent_table.setItem(row, 1, QTableWidgetItem(started.strftime("%d.%m.%Y %H:%M:%S")))
+            self.agent_table.setItem(row, 2, QTableWidgetItem(format_duration(seconds)))
+            self.agent_table.setItem(row, 3, status_item)
+            self.agent_table.setItem(row, 4, message_item)
+        return jobs
+
+    def delete_agent_job(self):
+        """Удаление задания SQL Agent выбранной строки истории (вместе с его историей)"""
+        rows = sorted({index.row() for index in self.agent_table.selectedIndexes()})
+        names = list(dict.fromkeys(self.agent_table.item(row, 0).text() for row in rows))
+        if not names:
+            QMessageBox.warning(self, "Ошибка", "Выберите запуск задания в истории")
+            return
+        reply = QMessageBox.question(self, "Удаление заданий",
+                                     "Удалить задания SQL Agent вместе с историей?\n" + "\n".join(names),
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.No:
+            return
+        try:
+            cursor = self.connection.cursor()
+            for name in names:
+                cursor.execute("EXEC msdb.dbo.sp_delete_job @job_name = ?", name)
+            self.connection.commit()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось удалить задание:\n{str(e)}")
+            return
+        if self.agent_job in names:
+            self.btn_schedule.setChecked(False)
+            self.toggle_schedule(False)
+        self.load_agent_history()
 
     def update_next_backup_time(self):
         """Обновление времени следующего бэкапа"""
-        if not self.btn_schedule.isChecked():
+        if not self.is_tab_built(TAB_SCHEDULER) or not self.btn_schedule.isChecked():
             return
             
         now = datetime.now()
@@ -1100,6 +5369,7 @@ class BackupApp(QMainWindow):
             
             if now < scheduled_time:
                 self.lbl_next_backup.setText(f"Следующий бэкап: сегодня в {target_time.toString('HH:mm')}")
+                self.update_schedule_forecast(scheduled_time)
                 return
         
         # Ищем следующий подходящий день
@@ -1109,11 +5379,72 @@ class BackupApp(QMainWindow):
                 next_date = datetime(next_day.year, next_day.month, next_day.day,
                                     target_time.hour(), target_time.minute())
                 self.lbl_next_backup.setText(f"Следующий бэкап: {next_date.strftime('%d.%m.%Y в %H:%M')}")
+                self.update_schedule_forecast(next_date)
                 return
 
+    def on_path_status_updated(self, path):
+        """Проверен путь бэкапов: пересчет прогноза места для ближайшего запуска по расписанию"""
+        target = self.backup_path.text() if self.is_tab_built(TAB_BACKUP) else DEFAULT_BACKUP_PATH
+        if target and PathStatus.key(path) == PathStatus.key(target):
+            self.update_next_backup_time()
+
+    def update_schedule_forecast(self, start_time):
+        """Прогноз длительности запланированного бэкапа и проверка окна"""
+        db = self.db_combo_schedule.currentText()
+        predicted = self.predict_backup_duration(db, 'FULL') if db else None
+        estimate = self.estimate_backup(db, start_time) if db else None
+        if predicted is None and estimate and estimate[1]:
+            predicted = estimate[1]
+        if predicted is None and not estimate:
+            self.lbl_schedule_forecast.setText("Прогноз длительности: нет данных в истории")
+            self.lbl_schedule_forecast.setStyleSheet("font-size: 12px; color: #aaa;")
+            return
+            
+        color = "#aaa"
+        if predicted is not None:
+            finish_time = start_time + timedelta(seconds=predicted)
+            text = (f"Прогноз длительности: {predicted / 60:.1f} мин, "
+                    f"завершение около {finish_time.strftime('%H:%M')}")
+        else:
+            finish_time = start_time
+            text = "Прогноз длительности: нет данных в истории"
+        
+        # Хватит ли места на пути бэкапов к моменту запуска (с учетом прироста базы)
+        if estimate:
+            size = estimate[0]
+            text += f"\nОценка размера бэкапа: {format_size(size)}"
+            path = self.backup_path.text() if self.is_tab_built(TAB_BACKUP) else DEFAULT_BACKUP_PATH
+            # Последняя фоновая проверка пути; по ее завершении прогноз пересчитывается
+            free = self.path_status.free_space(path)
+            if free is not None:
+                text += f", свободно: {format_size(free)}"
+                if free < size * (1 + SPACE_RESERVE_PCT / 100):
+                    text += "\n❌ Недостаточно места на пути бэкапов для ближайшего запуска"
+                    self.notify(f"⚠️ Для бэкапа '{db}' в {start_time.strftime('%H:%M')} не хватит места на {path}",
+                                "#f44336")
+                    self.lbl_schedule_forecast.setText(text)
+                    self.lbl_schedule_forecast.setStyleSheet("font-size: 12px; color: #f44336;")
+                    return
+        
+        if predicted is not None and self.chk_backup_window.isChecked():
+            window_end = self.window_end_edit.time()
+            deadline = datetime(start_time.year, start_time.month, start_time.day,
+                                window_end.hour(), window_end.minute())
+            if deadline <= start_time:
+                deadline += timedelta(days=1)
+            if finish_time > deadline:
+                text += f"\n⚠️ Не успевает завершиться до {deadline.strftime('%H:%M')}"
+                color = "#ff9800"
+            else:
+                text += f"\n✅ Укладывается в окно до {deadline.strftime('%H:%M')}"
+                color = "#4caf50"
+        
+        self.lbl_schedule_forecast.setText(text)
+        self.lbl_schedule_forecast.setStyleSheet(f"font-size: 12px; color: {color};")
+
     def check_schedule(self):
         """Проверка времени для запуска запланированного бэкапа"""
-        if not self.btn_schedule.isChecked():
+        if not self.is_tab_built(TAB_SCHEDULER) or not self.btn_schedule.isChecked():
             return
             
         now = datetime.now()
@@ -1153,28 +5484,73 @@ class BackupApp(QMainWindow):
         if not db or not self.connection: 
             return
         
+        # Путь и настройки бэкапа берутся с вкладки бэкапа
+        self.ensure_tab_built(TAB_BACKUP)
         path = self.backup_path.text()
         if not path:
-            QMessageBox.warning(self, "Ошибка", "Укажите путь для бэкапов в настройках")
+            self.notify("Авто-бэкап пропущен: укажите путь для бэкапов в настройках", "#f44336")
             return
             
         if not path.endswith("\\") and not path.endswith("/"): 
             path += "\\"
+        
+        # Авто-режим вкладки бэкапа: при малой доле измененных экстентов - дифференциальный бэкап
+        kind = self.choose_backup_types([db])[db] if self.radio_auto.isChecked() else 'FULL'
+        name_kind = 'SCHEDULED' if kind == 'FULL' else kind
             
-        server_address = self.server_input.text()
-        server_name = server_address.split('\\')[0].split('.')[0]
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{path}{server_name}_{db}_SCHEDULED_{timestamp}.bak"
+        # При нехватке места бэкап идет на вторичный путь (без диалогов - рядом может никого не быть)
+        estimate = self.estimate_backup(db)
+        free = self.path_status.free_space(path) if estimate else None
+        if free is not None and free < estimate[0] * (1 + SPACE_RESERVE_PCT / 100):
+            if BACKUP_SECONDARY_PATH:
+                path = BACKUP_SECONDARY_PATH if BACKUP_SECONDARY_PATH.endswith(("\\", "/")) \
+                    else BACKUP_SECONDARY_PATH + "\\"
+                self.notify(f"⚠️ Мало места для авто-бэкапа '{db}', используется {path}", "#ff9800")
+            else:
+                self.notify(f"⚠️ Для авто-бэкапа '{db}' может не хватить места ({format_size(free)} свободно)",
+                            "#ff9800")
+        
+        to_url = self.s3 is not None and self.chk_backup_to_url.isChecked()
+        mode, extra_paths = self.get_backup_destinations() if not to_url else (DEST_NONE, [])
+        mirror_paths = extra_paths if mode == DEST_MIRROR else ()
+        if to_url:
+            create_commands, disk_clause = [], backup_url_clause(self.s3, self.server_input.text(), db, name_kind)
+        else:
+            create_commands, disk_clause = backup_disk_clause(path, self.server_input.text(), db, name_kind,
+                                                              mirror_paths=mirror_paths)
         
-        sql = f"BACKUP DATABASE [{db}] TO DISK='{filename}' WITH COMPRESSION, INIT, CHECKSUM"
-        self.run_worker([sql], f"Авто-бэкап '{db}'")
+        throttle_options, conn_str = self.get_throttle_hints()
+        sql = f"BACKUP DATABASE [{db}] {disk_clause} WITH COMPRESSION, INIT, CHECKSUM{throttle_options}"
+        if kind == 'DIFF':
+            sql += ", DIFFERENTIAL"
+        if mirror_paths:
+            sql += ", FORMAT"
         
-        # Обновляем список файлов
-        self.refresh_backup_files()
+        # База группы доступности - на предпочтительной реплике (реплики опрашиваются в фоне)
+        def submit(routes):
+            route = routes.get(db)
+            name = f"Авто-бэкап '{db}'" + (" (диф.)" if kind == 'DIFF' else "")
+            job_sql, job_conn_str = sql, conn_str
+            if route:
+                job_conn_str = route['conn_str']
+                name += f" → {route['server']}"
+                if route['secondary']:
+                    job_sql += ", COPY_ONLY"
+            job = self.run_worker(create_commands + [job_sql], name, job_conn_str)
+            if route:
+                job['server'] = route['server']
+                job['route'] = f"{db}: {route['server']} - {route['reason']}"
+            if extra_paths:
+                job['destinations'] = (mode, extra_paths)
+            job['s3_url'] = to_url
+            
+            # Обновляем список файлов (в режиме слежения новый файл появится сам)
+            if not self.is_tab_built(TAB_FILES) or not self.chk_watch_folder.isChecked():
+                self.refresh_backup_files()
+        self.resolve_ag_routes([db], {db: kind}, conn_str, submit)
 
     # Вкладка: Файлы бэкапов
-    def init_backup_files_tab(self):
-        tab = QWidget()
+    def init_backup_files_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(10)
 
@@ -1185,20 +5561,60 @@ class BackupApp(QMainWindow):
         # Путь для файлов
         path_layout = QHBoxLayout()
         self.files_path_edit = QLineEdit(DEFAULT_BACKUP_PATH)
-        self.files_path_edit.setPlaceholderText("Сетевой путь к папке с бэкапами")
+        self.files_path_edit.setPlaceholderText("Сетевой путь к папке с бэкапами (несколько через ';')")
         
         btn_browse = QPushButton("Обзор")
         btn_browse.clicked.connect(self.browse_backup_folder)
         btn_refresh = QPushButton("Обновить")
-        btn_refresh.clicked.connect(self.refresh_backup_files)
+        btn_refresh.clicked.connect(lambda: self.refresh_backup_files(force_remote=True))
         btn_test_path = QPushButton("Проверить")
         btn_test_path.clicked.connect(self.test_files_path)
         
+        self.chk_watch_folder = QCheckBox("Следить")
+        self.chk_watch_folder.setToolTip("Автоматически показывать новые, удаленные и изменившиеся файлы")
+        self.chk_watch_folder.toggled.connect(self.toggle_folder_watch)
+        self.files_path_edit.editingFinished.connect(self.on_files_path_changed)
+        
+        self.chk_show_s3 = QCheckBox("S3")
+        self.chk_show_s3.setEnabled(self.s3 is not None)
+        self.chk_show_s3.setToolTip(f"Показывать бэкапы из хранилища {self.s3.base_url}" if self.s3
+                                    else "Хранилище не настроено (S3_ENDPOINT, S3_BUCKET)")
+        self.chk_show_s3.toggled.connect(self.on_show_s3_toggled)
+        
         path_layout.addWidget(QLabel("Папка с бэкапами:"))
         path_layout.addWidget(self.files_path_edit, 1)
         path_layout.addWidget(btn_browse)
         path_layout.addWidget(btn_refresh)
         path_layout.addWidget(btn_test_path)
+        path_layout.addWidget(self.chk_watch_folder)
+        path_layout.addWidget(self.chk_show_s3)
+        
+        # Слежение: inotify для локальных папок, опрос для сетевых
+        self.folder_watcher = QFileSystemWatcher(self)
+        self.folder_watcher.directoryChanged.connect(self.schedule_folder_delta)
+        self.watch_poll_timer = QTimer(self)
+        self.watch_poll_timer.timeout.connect(self.poll_watched_folders)
+        self.delta_timer = QTimer(self)
+        self.delta_timer.setSingleShot(True)
+        self.delta_timer.setInterval(500)
+        self.delta_timer.timeout.connect(self.start_folder_delta)
+        
+        # Параметры сканирования
+        scan_layout = QHBoxLayout()
+        self.spin_scan_depth = QSpinBox()
+        self.spin_scan_depth.setRange(0, 20)
+        self.spin_scan_depth.setValue(SCAN_MAX_DEPTH)
+        self.spin_scan_depth.setToolTip("0 - только указанные папки, без подпапок")
+        self.scan_include_edit = QLineEdit(SCAN_INCLUDE)
+        self.scan_include_edit.setPlaceholderText("Включать: *.bak")
+        self.scan_exclude_edit = QLineEdit(SCAN_EXCLUDE)
+        self.scan_exclude_edit.setPlaceholderText("Исключать: *archive*, *.tmp")
+        
+        scan_layout.addWidget(QLabel("Глубина подпапок:"))
+        scan_layout.addWidget(self.spin_scan_depth)
+        scan_layout.addWidget(QLabel("Маски:"))
+        scan_layout.addWidget(self.scan_include_edit, 1)
+        scan_layout.addWidget(self.scan_exclude_edit, 1)
         
         # Фильтры
         filter_layout = QHBoxLayout()
@@ -1224,20 +5640,25 @@ class BackupApp(QMainWindow):
         self.filter_date.textChanged.connect(self.apply_filters)
         
         control_layout.addLayout(path_layout)
+        control_layout.addLayout(scan_layout)
         control_layout.addLayout(filter_layout)
         control_panel.setLayout(control_layout)
         layout.addWidget(control_panel)
 
-        # Таблица файлов
-        self.files_table = QTableWidget()
-        self.files_table.setColumnCount(7)
-        self.files_table.setHorizontalHeaderLabels(["Имя файла", "Сервер", "База", "Размер", "Дата создания", "Тип", "Полный путь"])
+        # Таблица файлов: модель записей и фильтр по серверу, базе и дате
+        self.files_model = FileListModel(self.describe_replicas, self)
+        self.files_proxy = FileFilterProxy(self)
+        self.files_proxy.setSourceModel(self.files_model)
+        self.files_table = QTableView()
+        self.files_table.setModel(self.files_proxy)
         self.files_table.horizontalHeader().setStretchLastSection(True)
+        self.files_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.files_table.verticalHeader().setDefaultSectionSize(24)
         self.files_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.files_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.files_table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.files_table.customContextMenuRequested.connect(self.show_files_context_menu)
-        self.files_table.itemSelectionChanged.connect(self.update_selected_count)
+        self.files_table.selectionModel().selectionChanged.connect(self.update_selected_count)
         
         # Настройка ширины колонок
         self.files_table.setColumnWidth(0, 250)  # Имя файла
@@ -1282,226 +5703,389 @@ class BackupApp(QMainWindow):
         self.lbl_total_files = QLabel("Всего файлов: 0")
         self.lbl_total_size = QLabel("Общий размер: 0 GB")
         self.lbl_selected_count = QLabel("Выбрано: 0")
+        self.lbl_scan_timing = QLabel("")
         
         stats_layout.addWidget(self.lbl_total_files)
         stats_layout.addWidget(self.lbl_total_size)
         stats_layout.addWidget(self.lbl_selected_count)
         stats_layout.addStretch()
+        stats_layout.addWidget(self.lbl_scan_timing)
         
         layout.addLayout(stats_layout)
         
-        self.tabs.addTab(tab, "Файлы Бэкапов")
 
     def browse_backup_folder(self):
         """Выбор папки с бэкапами"""
+        initial_path = DEFAULT_BACKUP_PATH if self.path_status.exists(DEFAULT_BACKUP_PATH) else ""
         folder = QFileDialog.getExistingDirectory(self, "Выберите папку с бэкапами", 
-                                                 DEFAULT_BACKUP_PATH)
+                                                 initial_path)
         if folder:
             self.files_path_edit.setText(folder)
             self.refresh_backup_files()
 
     def test_files_path(self):
-        """Проверка пути к файлам"""
-        path = self.files_path_edit.text()
-        if not path:
+        """Проверка путей к файлам"""
+        roots = self.get_backup_roots()
+        if not roots:
             QMessageBox.warning(self, "Ошибка", "Укажите путь для проверки")
             return
             
-        if os.path.exists(path):
+        include, exclude = self.get_scan_patterns()
+        info = ""
+        available = False
+        for path in roots:
+            if not os.path.exists(path):
+                info += f"❌ Путь не существует:\n{path}\n\n"
+                continue
             try:
-                files = os.listdir(path)
-                bak_files = [f for f in files if f.lower().endswith('.bak')]
+                bak_files, subdirs, _ = list_backup_directory(path, include, exclude)
+                available = True
                 
-                info = f"✅ Путь доступен:\n{path}\n\n"
-                info += f"Всего файлов в папке: {len(files)}\n"
-                info += f"Файлов .bak: {len(bak_files)}"
+                info += f"✅ Путь доступен:\n{path}\n"
+                info += f"Файлов бэкапов: {len(bak_files)}, подпапок: {len(subdirs)}\n"
                 
                 if bak_files:
                     # Показываем несколько примеров
-                    info += "\n\nПримеры файлов:\n"
-                    for i, f in enumerate(bak_files[:5]):
+                    names = [os.path.basename(f) for f in bak_files]
+                    info += "Примеры файлов:\n"
+                    for f in names[:5]:
                         info += f"  • {f}\n"
-                    if len(bak_files) > 5:
-                        info += f"  ... и еще {len(bak_files) - 5} файлов"
-                
-                QMessageBox.information(self, "Проверка пути", info)
-                
-                # Автоматически обновляем список файлов
-                self.refresh_backup_files()
-                
+                    if len(names) > 5:
+                        info += f"  ... и еще {len(names) - 5} файлов\n"
+                info += "\n"
             except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать папку:\n{str(e)}")
+                info += f"❌ Не удалось прочитать папку:\n{path}\n{str(e)}\n\n"
+        
+        if available:
+            QMessageBox.information(self, "Проверка пути", info.strip())
+            # Автоматически обновляем список файлов
+            self.refresh_backup_files()
         else:
-            QMessageBox.warning(self, "Ошибка", f"Путь не существует:\n{path}")
+            QMessageBox.warning(self, "Ошибка", info.strip())
+
+    def get_backup_roots(self):
+        """Корневые папки бэкапов (несколько путей через ';')"""
+        roots = []
+        for root in self.files_path_edit.text().split(';'):
+            root = root.strip()
+            if root and root not in roots:
+                roots.append(root)
+        return roots
 
-    def refresh_backup_files(self):
-        """Обновление списка файлов бэкапов из указанной папки"""
-        path = self.files_path_edit.text()
-        if not path or not os.path.exists(path):
+    def get_scan_patterns(self):
+        """Маски включения и исключения файлов (через запятую)"""
+        include = [p.strip() for p in self.scan_include_edit.text().split(',') if p.strip()]
+        exclude = [p.strip() for p in self.scan_exclude_edit.text().split(',') if p.strip()]
+        return include or ['*.bak'], exclude
+
+    def refresh_backup_files(self, force_remote=False):
+        """Обновление списка файлов бэкапов из указанных папок и S3 (в фоне)"""
+        if not self.is_tab_built(TAB_FILES):
             return
+        
+        self.start_s3_listing(force_remote)
             
-        try:
-            files = []
-            for filename in os.listdir(path):
-                if filename.lower().endswith('.bak'):
-                    filepath = os.path.join(path, filename)
-                    stat = os.stat(filepath)
-                    
-                    # Парсим имя файла для извлечения информации
-                    # Формат: Сервер_База_Дата_Время.bak
-                    name_parts = filename[:-4].split('_')
-                    
-                    server_name = name_parts[0] if len(name_parts) > 0 else "Неизвестно"
-                    db_name = name_parts[1] if len(name_parts) > 1 else "Неизвестно"
-                    
-                    # Определяем тип бэкапа по имени
-                    backup_type = "Полный"
-                    if 'DIFF' in filename.upper() or 'DIFFERENTIAL' in filename.upper():
-                        backup_type = "Диф"
-                    elif 'LOG' in filename.upper():
-                        backup_type = "Лог"
-                    elif 'SCHEDULED' in filename.upper():
-                        backup_type = "План"
-                    
-                    # Пытаемся извлечь дату из имени файла
-                    file_date = ""
-                    if len(name_parts) >= 3:
-                        date_str = name_parts[2]
-                        try:
-                            # Пробуем разные форматы дат
-                            if len(date_str) >= 8:
-                                # YYYYMMDD или YYYYMMDD_HHMMSS
-                                year = date_str[0:4]
-                                month = date_str[4:6]
-                                day = date_str[6:8]
-                                file_date = f"{day}.{month}.{year}"
-                        except:
-                            pass
-                    
-                    # Если не удалось из имени, берем дату модификации
-                    if not file_date:
-                        file_date = datetime.fromtimestamp(stat.st_mtime).strftime("%d.%m.%Y %H:%M")
-                    
-                    files.append({
-                        'name': filename,
-                        'server': server_name,
-                        'database': db_name,
-                        'size': stat.st_size,
-                        'date': file_date,
-                        'path': filepath,
-                        'type': backup_type,
-                        'mtime': stat.st_mtime
-                    })
-            
-            # Сортируем по дате (новые сверху)
-            files.sort(key=lambda x: x['mtime'], reverse=True)
-            
-            # Отображаем в таблице
-            self.files_table.setRowCount(0)
-            
-            total_size = 0
-            for i, file_info in enumerate(files):
-                self.files_table.insertRow(i)
-                
-                # Имя файла
-                self.files_table.setItem(i, 0, QTableWidgetItem(file_info['name']))
-                
-                # Сервер
-                self.files_table.setItem(i, 1, QTableWidgetItem(file_info['server']))
-                
-                # База данных
-                self.files_table.setItem(i, 2, QTableWidgetItem(file_info['database']))
-                
-                # Размер
-                size = file_info['size']
-                total_size += size
-                
-                if size >= 1024**3:  # GB
-                    size_str = f"{size/(1024**3):.2f} GB"
-                elif size >= 1024**2:  # MB
-                    size_str = f"{size/(1024**2):.2f} MB"
-                elif size >= 1024:  # KB
-                    size_str = f"{size/1024:.2f} KB"
+        roots = self.get_backup_roots()
+        if not roots:
+            return
+            
+        # Повторный запуск после завершения текущего сканирования
+        if self.scan_worker is not None:
+            self.scan_rerun = True
+            return
+            
+        self.scan_include, self.scan_exclude = self.get_scan_patterns()
+        self.scan_max_depth = self.spin_scan_depth.value()
+        self.scan_started = datetime.now()
+        self.lbl_scan_timing.setText("Сканирование...")
+        
+        self.scan_worker = ScanWorker(roots, self.scan_max_depth, self.scan_include, self.scan_exclude)
+        self.scan_worker.finished.connect(self.on_scan_finished)
+        self.scan_worker.start()
+
+    def on_scan_finished(self, found_files, scanned_dirs, timings, errors):
+        """Отображение результатов полного сканирования"""
+        self.scan_worker.wait()
+        self.scan_worker = None
+        
+        # Метрики и время сканирования по каждому корню
+        scan_job_id = new_job_id()
+        timing_parts = []
+        for root, stats in timings.items():
+            self.metrics.record(make_event(scan_job_id, 'scan', self.scan_started, stats['seconds'],
+                                           command=root, items=stats['files']))
+            timing_parts.append(f"{root}: {stats['seconds']:.2f} с, папок {stats['dirs']}, файлов {stats['files']}")
+        for error in errors:
+            self.metrics.record(make_event(scan_job_id, 'scan', self.scan_started, 0,
+                                           command=error.split(': ')[0], error=error))
+        
+        total_seconds = max((s['seconds'] for s in timings.values()), default=0)
+        self.lbl_scan_timing.setText(f"Сканирование: {total_seconds:.2f} с" +
+                                     (f", ошибок: {len(errors)}" if errors else ""))
+        self.lbl_scan_timing.setToolTip("\n".join(timing_parts + errors))
+        self.lbl_scan_timing.setStyleSheet("color: #f44336;" if errors else "")
+        if errors and not scanned_dirs:
+            QMessageBox.critical(self, "Ошибка", "Не удалось загрузить файлы:\n" + "\n".join(errors))
+        
+        files = group_backup_stripes([parse_backup_file(filepath, size, mtime)
+                                      for filepath, (size, mtime) in found_files.items()])
+        self.show_backup_files(files + self.remote_files)
+        
+        self.scanned_dirs = {path: depth for path, (depth, _) in scanned_dirs.items()}
+        self.scanned_dir_mtimes = {path: mtime for path, (_, mtime) in scanned_dirs.items()}
+        if self.chk_watch_folder.isChecked():
+            self.restart_folder_watch()
+        
+        if self.scan_rerun:
+            self.scan_rerun = False
+            self.refresh_backup_files()
+
+    def show_backup_files(self, files):
+        """Отображение списка файлов в таблице"""
+        # Сортируем по дате (новые сверху)
+        files.sort(key=lambda x: x['mtime'], reverse=True)
+        
+        # Модель и список приложения - один и тот же список записей
+        self.backup_files = files
+        self.files_model.set_rows(files)
+        
+        # Обновляем статистику
+        self.update_files_stats()
+        self.update_selected_count()
+        self.publish_backup_files()
+        if self.drills_pending:
+            self.drills_pending = False
+            QTimer.singleShot(0, self.run_restore_drills)
+
+    def start_s3_listing(self, force=False):
+        """Список бэкапов в S3 в фоне (из кеша, если он не старше S3_LIST_CACHE_TTL)"""
+        if not self.s3 or not self.is_tab_built(TAB_FILES) or not self.chk_show_s3.isChecked():
+            return
+        if self.s3_list_worker is not None:
+            return
+        include, exclude = self.get_scan_patterns()
+        self.s3_list_worker = S3ListWorker(self.s3, include, exclude, force)
+        self.s3_list_worker.event.connect(self.metrics.record)
+        self.s3_list_worker.finished.connect(self.on_s3_listed)
+        self.s3_list_worker.start()
+
+    def on_s3_listed(self, objects, error):
+        """Объекты S3 в списке файлов вместе с локальными"""
+        self.s3_list_worker.wait()
+        self.s3_list_worker = None
+        if error:
+            self.notify(f"⚠️ Не удалось получить список S3: {error}", "#ff9800")
+        if not self.chk_show_s3.isChecked():
+            return
+        remote_files = []
+        for key, size, mtime in objects:
+            file_info = parse_backup_file(key, size, mtime)
+            file_info.update(path=self.s3.object_url(key), key=key, remote=True)
+            remote_files.append(file_info)
+        self.remote_files = group_backup_stripes(remote_files)
+        self.show_backup_files([f for f in self.backup_files if not f.get('remote')] + self.remote_files)
+
+    def on_show_s3_toggled(self, checked):
+        if checked:
+            self.start_s3_listing()
+        else:
+            self.remote_files = []
+            self.show_backup_files([f for f in self.backup_files if not f.get('remote')])
+
+    def toggle_folder_watch(self, checked):
+        """Включение/выключение слежения за папкой бэкапов"""
+        if checked:
+            # Полное сканирование один раз, дальше - только изменения
+            self.refresh_backup_files()
+        else:
+            self.stop_folder_watch()
+
+    def on_files_path_changed(self):
+        """Смена папок в режиме слежения требует полного сканирования"""
+        if self.chk_watch_folder.isChecked():
+            self.refresh_backup_files()
+
+    def stop_folder_watch(self):
+        if self.folder_watcher.directories():
+            self.folder_watcher.removePaths(self.folder_watcher.directories())
+        self.watch_poll_timer.stop()
+        self.watched_dir_mtimes = {}
+        self.growing_files = {}
+
+    def restart_folder_watch(self):
+        """Настройка слежения для всех просканированных папок"""
+        if not self.chk_watch_folder.isChecked():
+            return
+        self.stop_folder_watch()
+        for directory in self.scanned_dirs:
+            self.watch_directory(directory, self.scanned_dir_mtimes.get(directory))
+        self.watch_poll_timer.start(WATCH_POLL_INTERVAL)
+
+    def watch_directory(self, directory, mtime=None):
+        """Подписка на изменения одной папки"""
+        if is_network_path(directory):
+            # Для SMB/NFS уведомления не приходят - опрашиваем время изменения каталога
+            self.watched_dir_mtimes[directory] = mtime
+        else:
+            self.folder_watcher.addPath(directory)
+
+    def unwatch_directory(self, directory):
+        self.watched_dir_mtimes.pop(directory, None)
+        if directory in self.folder_watcher.directories():
+            self.folder_watcher.removePath(directory)
+
+    def schedule_folder_delta(self, path):
+        """Накопление изменившихся папок (события приходят пачками)"""
+        self.pending_delta_dirs.add(path)
+        self.delta_timer.start()
+
+    def poll_watched_folders(self):
+        """Периодическая проверка сетевых папок и растущих файлов"""
+        if self.watched_dir_mtimes or self.growing_files:
+            self.start_folder_delta()
+
+    def start_folder_delta(self):
+        """Запуск фонового чтения изменений"""
+        if self.delta_worker is not None or self.scan_worker is not None:
+            return
+        scan_dirs = self.pending_delta_dirs
+        self.pending_delta_dirs = set()
+        self.delta_worker = FolderDeltaWorker(scan_dirs, dict(self.watched_dir_mtimes),
+                                              list(self.growing_files),
+                                              self.scan_include, self.scan_exclude)
+        self.delta_worker.finished.connect(self.apply_folder_delta)
+        self.delta_worker.start()
+
+    def apply_folder_delta(self, snapshots, dir_mtimes, rechecked):
+        """Применение изменений к списку файлов без полного пересканирования"""
+        self.delta_worker.wait()     # run() еще не вернулся
+        self.delta_worker = None
+        started = datetime.now()
+        t0 = time.perf_counter()
+        self.watched_dir_mtimes.update({d: m for d, m in dir_mtimes.items() if d in self.watched_dir_mtimes})
+        
+        # Строка списка по пути каждого физического файла (у набора частей - несколько путей)
+        rows_by_path = {part['path']: i for i, f in enumerate(self.backup_files) for part in backup_parts([f])}
+        removed_paths = set()
+        added = []
+        modified = dict(rechecked)
+        
+        for directory, (snapshot, subdirs) in snapshots.items():
+            # Пути в снимке построены через os.path.join(directory, name)
+            directory_key = os.path.dirname(os.path.join(directory, 'x'))
+            known = {p for p in rows_by_path if os.path.dirname(p) == directory_key}
+            removed_paths.update(known - snapshot.keys())
+            for path, (size, mtime) in snapshot.items():
+                if path not in rows_by_path:
+                    added.append(parse_backup_file(path, size, mtime))
                 else:
-                    size_str = f"{size} B"
-                
-                size_item = QTableWidgetItem(size_str)
-                size_item.setData(Qt.UserRole, size)  # Сохраняем оригинальный размер для сортировки
-                self.files_table.setItem(i, 3, size_item)
-                
-                # Дата
-                self.files_table.setItem(i, 4, QTableWidgetItem(file_info['date']))
-                
-                # Тип
-                type_item = QTableWidgetItem(file_info['type'])
-                if file_info['type'] == "Полный":
-                    type_item.setForeground(QColor('#4CAF50'))
-                elif file_info['type'] == "Диф":
-                    type_item.setForeground(QColor('#2196F3'))
-                elif file_info['type'] == "Лог":
-                    type_item.setForeground(QColor('#FF9800'))
-                self.files_table.setItem(i, 5, type_item)
-                
-                # Полный путь
-                path_item = QTableWidgetItem(file_info['path'])
-                path_item.setToolTip(file_info['path'])
-                self.files_table.setItem(i, 6, path_item)
-            
-            # Обновляем статистику
-            total_size_gb = total_size / (1024**3)
-            self.lbl_total_files.setText(f"Всего файлов: {len(files)}")
-            self.lbl_total_size.setText(f"Общий размер: {total_size_gb:.2f} GB")
-            self.update_selected_count()
+                    modified[path] = (size, mtime)
             
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить файлы:\n{str(e)}")
+            # Новые подпапки (в пределах глубины) и удаленные подпапки
+            depth = self.scanned_dirs.get(directory, 0)
+            known_subdirs = {d for d in self.scanned_dirs if os.path.dirname(d) == directory_key}
+            if depth < self.scan_max_depth:
+                for subdir in set(subdirs) - known_subdirs:
+                    self.scanned_dirs[subdir] = depth + 1
+                    self.watch_directory(subdir)
+                    self.pending_delta_dirs.add(subdir)
+            for subdir in known_subdirs - set(subdirs):
+                prefix = os.path.join(subdir, '')
+                for d in [d for d in self.scanned_dirs if d == subdir or d.startswith(prefix)]:
+                    self.unwatch_directory(d)
+                    del self.scanned_dirs[d]
+                removed_paths.update(p for p in rows_by_path if p.startswith(prefix))
+        
+        # Удаленные файлы (и пропавшие из растущих)
+        removed_paths.update(path for path, state in modified.items() if state is None and path in rows_by_path)
+        removed_rows = {rows_by_path[path] for path in removed_paths}
+        # Набор частей, из которого пропала часть или к которому добавилась часть, собирается заново
+        added_sets = {stripe_set_key(f) for f in added} - {None}
+        for row, file_info in enumerate(self.backup_files):
+            if 'parts' in file_info and (row in removed_rows
+                                         or added_sets and stripe_set_key(file_info) in added_sets):
+                removed_rows.add(row)
+                for part in file_info['parts']:
+                    if part['path'] not in removed_paths:
+                        state = modified.pop(part['path'], None)
+                        added.append(parse_backup_file(part['path'], *state) if state else part)
+        added = group_backup_stripes(added)
+        for row in sorted(removed_rows, reverse=True):
+            for part in backup_parts([self.backup_files[row]]):
+                self.growing_files.pop(part['path'], None)
+            self.files_model.remove_row(row)
+        
+        # Изменившиеся файлы (бэкап еще пишется)
+        if removed_rows:
+            rows_by_path = {part['path']: i for i, f in enumerate(self.backup_files) for part in backup_parts([f])}
+        changed = 0
+        for path, state in modified.items():
+            row = rows_by_path.get(path)
+            if state is None or row is None:
+                continue
+            size, mtime = state
+            file_info = self.backup_files[row]
+            part = next(p for p in backup_parts([file_info]) if p['path'] == path)
+            if (size, mtime) != (part['size'], part['mtime']):
+                part.update(parse_backup_file(path, size, mtime))
+                if 'parts' in file_info:
+                    self.backup_files[row] = group_backup_stripes(file_info['parts'])[0]
+                self.files_model.row_changed(row)
+                self.growing_files[path] = size
+                changed += 1
+            else:
+                self.growing_files.pop(path, None)
+        
+        # Новые файлы - в начало списка (новые сверху)
+        added.sort(key=lambda x: x['mtime'], reverse=True)
+        for part in backup_parts(added):
+            self.growing_files[part['path']] = part['size']
+        self.files_model.insert_rows(added)
+        
+        if added or removed_rows or changed:
+            self.update_files_stats()
+            self.update_selected_count()
+            self.publish_backup_files()
+            self.metrics.record(make_event(new_job_id(), 'scan_delta', started, time.perf_counter() - t0,
+                                           command=";".join(snapshots),
+                                           items=len(added) + len(removed_rows) + changed))
+        
+        # Изменения, накопленные во время чтения
+        if self.pending_delta_dirs:
+            self.delta_timer.start()
+
+    def update_files_stats(self):
+        """Обновление статистики по списку файлов"""
+        total_size_gb = sum(f['size'] for f in self.backup_files) / (1024**3)
+        if self.files_proxy.is_active():
+            self.lbl_total_files.setText(f"Отфильтровано: {self.files_proxy.rowCount()}")
+        else:
+            self.lbl_total_files.setText(f"Всего файлов: {len(self.backup_files)}")
+        self.lbl_total_size.setText(f"Общий размер: {total_size_gb:.2f} GB")
 
     def clear_filters(self):
         """Очистка всех фильтров"""
         self.filter_server.clear()
         self.filter_db.clear()
         self.filter_date.clear()
-        
-        # Показываем все строки
-        for row in range(self.files_table.rowCount()):
-            self.files_table.setRowHidden(row, False)
 
     def apply_filters(self):
-        """Применение фильтров к таблице файлов"""
-        server_filter = self.filter_server.text().lower()
-        db_filter = self.filter_db.text().lower()
-        date_filter = self.filter_date.text().lower()
-        
-        visible_count = 0
-        
-        for row in range(self.files_table.rowCount()):
-            hide = False
-            
-            server_item = self.files_table.item(row, 1)
-            db_item = self.files_table.item(row, 2)
-            date_item = self.files_table.item(row, 4)
-            
-            server = server_item.text().lower() if server_item else ""
-            db = db_item.text().lower() if db_item else ""
-            date = date_item.text().lower() if date_item else ""
-            
-            if server_filter and server_filter not in server:
-                hide = True
-            if db_filter and db_filter not in db:
-                hide = True
-            if date_filter and date_filter not in date:
-                hide = True
-                
-            self.files_table.setRowHidden(row, hide)
-            
-            if not hide:
-                visible_count += 1
-        
-        self.lbl_total_files.setText(f"Отфильтровано: {visible_count}")
+        """Применение фильтров к таблице файлов (скрытые строки исключаются прокси-моделью)"""
+        self.files_proxy.set_filters(self.filter_server.text(), self.filter_db.text(), self.filter_date.text())
+        self.update_files_stats()
+        self.update_selected_count()
+
+    def get_selected_rows(self):
+        """Номера выбранных строк списка файлов по диапазонам выделения (без обхода ячеек)"""
+        selection = self.files_proxy.mapSelectionToSource(self.files_table.selectionModel().selection())
+        rows = set()
+        for selection_range in selection:
+            rows.update(range(selection_range.top(), selection_range.bottom() + 1))
+        return sorted(rows)
 
     def update_selected_count(self):
         """Обновление счетчика выбранных файлов"""
-        selected_count = len(self.files_table.selectedItems()) // self.files_table.columnCount()
+        selected_count = len(self.get_selected_rows())
         self.lbl_selected_count.setText(f"Выбрано: {selected_count}")
 
     def show_files_context_menu(self, position):
@@ -1512,6 +6096,8 @@ class BackupApp(QMainWindow):
         delete_action = menu.addAction("Удалить файл")
         restore_action = menu.addAction("↩Использовать для восстановления")
         menu.addSeparator()
+        replicate_action = menu.addAction("Реплицировать на вторичные пути")
+        upload_action = menu.addAction("Загрузить в S3")
         copy_path_action = menu.addAction("Копировать путь")
         show_info_action = menu.addAction("ℹИнформация о файле")
         
@@ -1525,37 +6111,25 @@ class BackupApp(QMainWindow):
             self.delete_selected_files()
         elif action == restore_action:
             self.use_file_for_restore()
+        elif action == replicate_action:
+            self.replicate_selected_files()
+        elif action == upload_action:
+            self.upload_selected_files_to_s3()
         elif action == copy_path_action:
             self.copy_selected_file_path()
         elif action == show_info_action:
             self.show_file_info()
 
     def get_selected_files(self):
-        """Получение списка выбранных файлов"""
-        selected_files = []
-        selected_rows = set()
-        
-        for item in self.files_table.selectedItems():
-            row = item.row()
-            if row not in selected_rows:
-                selected_rows.add(row)
-                
-                name_item = self.files_table.item(row, 0)
-                path_item = self.files_table.item(row, 6)
-                db_item = self.files_table.item(row, 2)
-                
-                if path_item and name_item:
-                    selected_files.append({
-                        'path': path_item.text(),
-                        'name': name_item.text(),
-                        'database': db_item.text() if db_item else "Неизвестно"
-                    })
-        
-        return selected_files
+        """Получение списка выбранных файлов (записи берутся из хранилища по номеру строки)"""
+        return [self.backup_files[row] for row in self.get_selected_rows()
+                if row < len(self.backup_files)]
 
     def open_backup_folder(self):
         """Открытие папки с бэкапами в проводнике"""
-        path = self.files_path_edit.text()
+        import subprocess
+        roots = self.get_backup_roots()
+        path = roots[0] if roots else ""
         if os.path.exists(path):
             if platform.system() == "Windows":
                 os.startfile(path)
@@ -1568,6 +6142,7 @@ class BackupApp(QMainWindow):
 
     def open_selected_file_folder(self):
         """Открытие папки с выбранным файлом"""
+        import subprocess
         files = self.get_selected_files()
         if files:
             path = os.path.dirname(files[0]['path'])
@@ -1580,8 +6155,8 @@ class BackupApp(QMainWindow):
                     subprocess.Popen(["xdg-open", path])
 
     def download_selected_files(self):
-        """Скачивание выбранных файлов"""
-        files = self.get_selected_files()
+        """Скачивание выбранных файлов (у бэкапа из нескольких частей - всех частей)"""
+        files = backup_parts(self.get_selected_files())
         if not files:
             QMessageBox.warning(self, "Ошибка", "Выберите файлы для скачивания")
             return
@@ -1589,20 +6164,36 @@ class BackupApp(QMainWindow):
         dest_folder = QFileDialog.getExistingDirectory(self, "Выберите папку для сохранения")
         if not dest_folder:
             return
+        
+        # Объекты S3 скачиваются параллельными ranged GET
+        remote = [f for f in files if f.get('remote')]
+        if remote:
+            self.start_s3_download([(f['key'], os.path.join(dest_folder, f['name'])) for f in remote],
+                                   self.on_copy_finished)
+        files = [f for f in files if not f.get('remote')]
+        if not files:
+            return
             
-        try:
-            for file_info in files:
-                src = file_info['path']
-                filename = file_info['name']
-                dst = os.path.join(dest_folder, filename)
-                
-                # Копируем файл
-                shutil.copy2(src, dst)
-                
-            QMessageBox.information(self, "Успех", f"Скачано {len(files)} файлов в папку:\n{dest_folder}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при копировании файлов:\n{str(e)}")
+        # Лимиты скорости по текущему окну нагрузки
+        policy = get_throttle_policy()
+        GLOBAL_COPY_LIMITER.set_rate(policy['global_mbps'])
+        
+        worker = CopyWorker(files, dest_folder, policy['job_mbps'])
+        self.run_transfer(worker, f"Копирование ({len(files)} файлов)",
+                          [f"{f['path']} -> {dest_folder}" for f in files])
+        worker.progress.connect(self.update_status)
+        worker.event.connect(self.metrics.record)
+        worker.finished.connect(lambda success, msg: self.on_copy_finished(worker, success, msg))
+        self.copy_workers.append(worker)
+        worker.start()
+
+    def on_copy_finished(self, worker, success, msg):
+        """Завершение фонового копирования (итог показывается в списке заданий)"""
+        # Сигнал finished испускается из run(): ссылка на поток снимается только после его остановки
+        worker.wait()
+        if worker in self.copy_workers:
+            self.copy_workers.remove(worker)
+        self.status_label.setToolTip(msg)
 
     def delete_selected_files(self):
         """Удаление выбранных файлов"""
@@ -1619,8 +6210,13 @@ class BackupApp(QMainWindow):
         
         if reply == QMessageBox.Yes:
             try:
-                for file_info in files:
-                    os.remove(file_info['path'])
+                for file_info in backup_parts(files):
+                    if file_info.get('remote'):
+                        s3_retry(lambda: self.s3.delete_object(file_info['key']))
+                    else:
+                        os.remove(file_info['path'])
+                if any(f.get('remote') for f in files):
+                    self.drop_s3_listing_cache()
                     
                 QMessageBox.information(self, "Успех", f"Удалено {len(files)} файлов")
                 self.refresh_backup_files()  # Обновляем список
@@ -1640,9 +6236,11 @@ class BackupApp(QMainWindow):
             return
             
         file_info = files[0]
+        media_files = [part['path'] for part in backup_parts([file_info])]
         
-        # Устанавливаем путь к файлу во вкладке восстановления
-        self.file_path_restore.setText(file_info['path'])
+        # Устанавливаем путь к файлу во вкладке восстановления (части бэкапа - через ';')
+        self.ensure_tab_built(TAB_RESTORE)
+        self.file_path_restore.setText("; ".join(media_files))
         
         # Пытаемся определить базу данных из имени файла
         db_name = file_info['database']
@@ -1652,10 +6250,10 @@ class BackupApp(QMainWindow):
                 self.db_combo_restore.setCurrentIndex(index)
         
         # Переключаемся на вкладку восстановления
-        self.tabs.setCurrentIndex(2)
+        self.tabs.setCurrentIndex(TAB_RESTORE)
         
         QMessageBox.information(self, "Файл выбран", 
-                              f"Файл '{file_info['name']}' выбран для восстановления базы '{db_name}'.\n"
+                              f"Файл '{describe_media(media_files)}' выбран для восстановления базы '{db_name}'.\n"
                               "Проверьте настройки восстановления и нажмите кнопку 'Восстановить'.")
 
     def copy_selected_file_path(self):
@@ -1663,7 +6261,7 @@ class BackupApp(QMainWindow):
         files = self.get_selected_files()
         if files:
             clipboard = QGuiApplication.clipboard()
-            clipboard.setText(files[0]['path'])
+            clipboard.setText("; ".join(part['path'] for part in backup_parts(files[:1])))
             self.status_label.setText("Путь скопирован в буфер обмена")
             self.status_label.setStyleSheet("color: #4CAF50;")
 
@@ -1675,10 +6273,23 @@ class BackupApp(QMainWindow):
             
         file_info = files[0]
         
-        # Получаем полную информацию о файле
+        if file_info.get('remote'):
+            QMessageBox.information(self, "Информация о файле", f"""
+            <h3>Бэкап в хранилище S3</h3>
+            <table>
+            <tr><td><b>Имя файла:</b></td><td>{file_info['name']}</td></tr>
+            <tr><td><b>База данных:</b></td><td>{file_info['database']}</td></tr>
+            <tr><td><b>Адрес:</b></td><td>{file_info['path']}</td></tr>
+            <tr><td><b>Размер:</b></td><td>{format_size(file_info['size'])}</td></tr>
+            <tr><td><b>Дата изменения:</b></td><td>{datetime.fromtimestamp(file_info['mtime']).strftime("%d.%m.%Y %H:%M:%S")}</td></tr>
+            </table>
+            """)
+            return
+        
+        # Получаем полную информацию о файле (для набора частей - суммарный размер)
         try:
             stat = os.stat(file_info['path'])
-            size_mb = stat.st_size / (1024 * 1024)
+            size_mb = sum(os.stat(part['path']).st_size for part in backup_parts([file_info])) / (1024 * 1024)
             size_gb = size_mb / 1024
             created_date = datetime.fromtimestamp(stat.st_ctime).strftime("%d.%m.%Y %H:%M:%S")
             modified_date = datetime.fromtimestamp(stat.st_mtime).strftime("%d.%m.%Y %H:%M:%S")
@@ -1688,7 +6299,7 @@ class BackupApp(QMainWindow):
             <table>
             <tr><td><b>Имя файла:</b></td><td>{file_info['name']}</td></tr>
             <tr><td><b>База данных:</b></td><td>{file_info['database']}</td></tr>
-            <tr><td><b>Путь:</b></td><td>{file_info['path']}</td></tr>
+            <tr><td><b>Путь:</b></td><td>{"<br>".join(part['path'] for part in backup_parts([file_info]))}</td></tr>
             <tr><td><b>Размер:</b></td><td>{size_mb:.2f} MB ({size_gb:.2f} GB)</td></tr>
             <tr><td><b>Дата создания:</b></td><td>{created_date}</td></tr>
             <tr><td><b>Дата изменения:</b></td><td>{modified_date}</td></tr>
@@ -1699,40 +6310,754 @@ class BackupApp(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, "Ошибка", f"Не удалось получить информацию о файле:\n{str(e)}")
 
-    # Общие методы
-    def run_worker(self, cmds, name):
-        self.lock_ui(True)
-        self.worker = Worker(self.conn_str_cache, cmds, name)
-        self.worker.progress.connect(self.update_status)
-        self.worker.finished.connect(self.on_worker_finished)
-        self.worker.start()
+    # Вкладка: История бэкапов
+    def init_history_tab(self, tab):
+        from PySide6.QtCharts import QChart, QChartView
+        layout = QVBoxLayout(tab)
+        layout.setSpacing(10)
 
-    def update_status(self, msg):
-        self.status_label.setText(msg)
+        # Панель выбора
+        control_layout = QHBoxLayout()
+        self.history_db_combo = QComboBox()
+        self.history_db_combo.setMinimumWidth(200)
+        self.history_db_combo.currentIndexChanged.connect(self.update_history_view)
+        
+        self.history_type_combo = QComboBox()
+        self.history_type_combo.addItem("Полный", 'FULL')
+        self.history_type_combo.addItem("Дифференциальный", 'DIFF')
+        self.history_type_combo.addItem("Лог", 'LOG')
+        self.history_type_combo.currentIndexChanged.connect(self.update_history_view)
+        
+        btn_sync = QPushButton("🔄 Загрузить из msdb")
+        btn_sync.clicked.connect(self.sync_backup_history)
+        
+        control_layout.addWidget(QLabel("База:"))
+        control_layout.addWidget(self.history_db_combo)
+        control_layout.addWidget(QLabel("Тип:"))
+        control_layout.addWidget(self.history_type_combo)
+        control_layout.addStretch()
+        control_layout.addWidget(btn_sync)
+        layout.addLayout(control_layout)
 
-    def on_worker_finished(self, success, msg):
-        self.lock_ui(False)
-        if success:
-            QMessageBox.information(self, "✅ Успешно", msg)
-            self.status_label.setText("Операция завершена успешно")
-            self.status_label.setStyleSheet("color: #4caf50; font-weight: bold;")
-            
-            # Обновляем данные после успешной операции
-            if self.connection:
-                self.load_databases_with_sizes()
+        # График длительности и скорости
+        self.history_chart = QChart()
+        self.history_chart.setBackgroundBrush(QColor('#252525'))
+        self.history_chart.setTitleBrush(QColor('#e0e0e0'))
+        self.history_chart.legend().setLabelColor(QColor('#e0e0e0'))
+        self.history_chart_view = QChartView(self.history_chart)
+        self.history_chart_view.setRenderHint(QPainter.Antialiasing)
+        self.history_chart_view.setMinimumHeight(280)
+        layout.addWidget(self.history_chart_view, 1)
+
+        # Таблица запусков
+        self.history_table = QTableWidget()
+        self.history_table.setColumnCount(6)
+        self.history_table.setHorizontalHeaderLabels(["Начало", "Длительность", "Размер", "Сжатый", "MB/s", "Файл"])
+        self.history_table.horizontalHeader().setStretchLastSection(True)
+        self.history_table.verticalHeader().setVisible(False)
+        self.history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.history_table.setColumnWidth(0, 150)
+        layout.addWidget(self.history_table, 1)
+        
+        self.lbl_history_prediction = QLabel("Прогноз следующего запуска: -")
+        layout.addWidget(self.lbl_history_prediction)
+        
+        # Проверочные восстановления: реальное время восстановления (RTO) по базам и его тренд
+        drill_group = QGroupBox("Проверочные восстановления (RTO)")
+        drill_layout = QVBoxLayout()
+        drill_controls = QHBoxLayout()
+        self.chk_drill_checkdb = QCheckBox("DBCC CHECKDB")
+        self.chk_drill_checkdb.setChecked(DRILL_CHECKDB)
+        self.chk_drill_checkdb.setToolTip("Проверять целостность восстановленной копии перед удалением")
+        btn_drill = QPushButton("Запустить проверку")
+        btn_drill.setToolTip(f"Последний полный бэкап из каталога файлов восстанавливается как "
+                             f"{DRILL_DB_PREFIX}<база> и удаляется;\nза раз - до {DRILL_BATCH} баз, "
+                             "давно не проверявшиеся первыми")
+        btn_drill.clicked.connect(lambda: self.run_restore_drills())
+        btn_drill_report = QPushButton("Сохранить отчет")
+        btn_drill_report.clicked.connect(self.export_drill_report)
+        self.lbl_drill_status = QLabel("")
+        self.lbl_drill_status.setStyleSheet("color: #aaa;")
+        drill_controls.addWidget(self.chk_drill_checkdb)
+        drill_controls.addWidget(btn_drill)
+        drill_controls.addWidget(self.lbl_drill_status, 1)
+        drill_controls.addWidget(btn_drill_report)
+        
+        self.drill_table = QTableWidget()
+        self.drill_table.setColumnCount(8)
+        self.drill_table.setHorizontalHeaderLabels(["База", "Проверка", "Результат", "Восстановление", "MB/s",
+                                                    "CHECKDB", "Тренд RTO", "Прогноз RTO"])
+        self.drill_table.horizontalHeader().setStretchLastSection(True)
+        self.drill_table.verticalHeader().setVisible(False)
+        self.drill_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.drill_table.setColumnWidth(0, 180)
+        self.drill_table.setColumnWidth(1, 130)
+        drill_layout.addLayout(drill_controls)
+        drill_layout.addWidget(self.drill_table)
+        drill_group.setLayout(drill_layout)
+        layout.addWidget(drill_group, 1)
+        
+        self.update_history_databases()
+        self.update_drill_report()
+
+    def run_restore_drills(self, auto=False):
+        """Проверочные восстановления: последний полный бэкап баз из каталога файлов восстанавливается
+        под временным именем (WITH MOVE), при необходимости проверяется DBCC CHECKDB и удаляется.
+        За раз - до DRILL_BATCH баз, давно не проверявшиеся первыми."""
+        if not self.connection:
+            if not auto:
+                QMessageBox.warning(self, "Ошибка", "Сначала подключитесь к серверу!")
+            return
+        # Каталог файлов еще не загружен - проверка начнется после сканирования
+        if not self.is_tab_built(TAB_FILES):
+            self.drills_pending = True
+            self.ensure_tab_built(TAB_FILES)
             self.refresh_backup_files()
+            self.notify("Проверка восстановления начнется после сканирования папок бэкапов", "#2196f3")
+            return
+        self.ensure_tab_built(TAB_RESTORE)      # папки файлов данных и журнала для MOVE
+        self.ensure_tab_built(TAB_HISTORY)
+        
+        patterns = [p.strip().lower() for p in DRILL_DATABASES.split(',') if p.strip()]
+        latest = {}
+        for file_info in self.backup_files:
+            db = file_info['database']
+            # Бэкапы по расписанию (встроенный планировщик, задание Agent) - тоже полные
+            if file_info['type'] not in (BACKUP_TYPE_TITLES['FULL'], BACKUP_TYPE_TITLES['SCHEDULED']):
+                continue
+            if file_info.get('remote') or any(part['path'] in self.growing_files     # файл еще записывается
+                                              for part in backup_parts([file_info])):
+                continue
+            if patterns and not matches_any(db.lower(), patterns):
+                continue
+            current = latest.get(db.lower())
+            if current is None or file_info['mtime'] > current['mtime']:
+                latest[db.lower()] = file_info
+        
+        # Давно не проверявшиеся базы - первыми; уже идущие проверки не повторяются
+        runs = load_json_file(DRILL_HISTORY_FILE, {}).get(self.current_server, {})
+        active = {j['drill']['database'].lower() for j in self.jobs
+                  if j.get('drill') is not None and j['state'] in (JOB_QUEUED, JOB_RUNNING)}
+        candidates = sorted((f for key, f in latest.items() if key not in active),
+                            key=lambda f: (runs.get(f['database']) or [{'date': ""}])[-1]['date'])
+        
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT name FROM sys.databases")
+        existing = {row[0].lower() for row in cursor.fetchall()}
+        checkdb = self.chk_drill_checkdb.isChecked()
+        started, skipped = [], []
+        for file_info in candidates[:DRILL_BATCH]:
+            db = file_info['database']
+            scratch = f"{DRILL_DB_PREFIX}{db}"
+            if scratch.lower() in existing:
+                skipped.append(f"{db}: база {scratch} уже существует")
+                continue
+            media_files = [part['path'] for part in backup_parts([file_info])]
+            try:
+                moves, required, _ = self.get_clone_plan(media_files, scratch)
+                lines, shortage = self.check_clone_space(required)
+            except Exception as e:
+                skipped.append(f"{db}: {str(e).splitlines()[0]}")
+                continue
+            if shortage:
+                skipped.append(f"{db}: недостаточно места ({'; '.join(lines)})")
+                continue
+            
+            options = [f"MOVE N'{sql_quote(logical)}' TO N'{sql_quote(target)}'" for logical, target in moves]
+            cmds = [f"RESTORE DATABASE [{scratch}] FROM {backup_media_clause(media_files)} WITH "
+                    + ", ".join(options + ["RECOVERY"])]
+            if checkdb:
+                cmds.append(f"DBCC CHECKDB ([{scratch}]) WITH NO_INFOMSGS")
+            # Временная база удаляется и при ошибке восстановления или проверки
+            cleanup = [f"IF DB_ID(N'{sql_quote(scratch)}') IS NOT NULL DROP DATABASE [{scratch}]"]
+            job = self.run_worker(cmds, f"Проверка восстановления '{db}'", cleanup_cmds=cleanup, queue=False)
+            job['pool'] = DRILL_POOL
+            job['drill'] = {'database': db, 'file': file_info['path'], 'backup_date': file_info['date'],
+                            'size': file_info['size'], 'checkdb': checkdb}
+            started.append(db)
+        self.start_queued_jobs()
+        
+        text = f"Проверка восстановления: запущено {len(started)} баз"
+        if not latest:
+            text = "Проверка восстановления: в каталоге нет полных бэкапов"
+        if skipped:
+            text += f", пропущено {len(skipped)}"
+        self.lbl_drill_status.setText(text)
+        self.lbl_drill_status.setToolTip("\n".join(skipped))
+        self.notify(text, "#ff9800" if skipped else "#2196f3")
+
+    def record_drill(self, job, success):
+        """Запись результата проверочного восстановления в историю RTO"""
+        drill = job['drill']
+        restore_seconds = drill.get('restore_seconds')
+        result = {
+            'date': job['started'].isoformat(timespec='seconds'),
+            'file': drill['file'],
+            'backup_date': drill['backup_date'],
+            'success': success,
+            'restore_seconds': round(restore_seconds, 1) if restore_seconds is not None else None,
+            'mb_per_sec': round(drill['bytes'] / 1024**2 / restore_seconds, 1) if restore_seconds else None,
+            'checkdb_seconds': round(drill['checkdb_seconds'], 1) if 'checkdb_seconds' in drill else None,
+            'error': None if success else (job['message'] or "Ошибка").splitlines()[0][:300],
+        }
+        history = load_json_file(DRILL_HISTORY_FILE, {})
+        runs = history.setdefault(self.current_server, {}).setdefault(drill['database'], [])
+        runs.append(result)
+        del runs[:-DRILL_HISTORY_MAX]
+        try:
+            save_json_file(DRILL_HISTORY_FILE, history, indent=None)
+        except OSError as e:
+            self.notify(f"⚠️ Не удалось сохранить историю проверок: {e}", "#ff9800")
+        self.update_drill_report()
+
+    def get_drill_report(self):
+        """Отчет RTO по базам: последняя проверка, тренд и прогноз времени восстановления"""
+        report = []
+        runs_by_db = load_json_file(DRILL_HISTORY_FILE, {}).get(self.current_server, {})
+        for db, runs in sorted(runs_by_db.items(), key=lambda item: item[0].lower()):
+            last = runs[-1]
+            durations = [r['restore_seconds'] for r in runs if r['success'] and r['restore_seconds']]
+            # Тренд: последнее время против среднего по предыдущим успешным проверкам
+            trend = None
+            if len(durations) > 1:
+                previous = sum(durations[:-1]) / (len(durations) - 1)
+                trend = (durations[-1] - previous) / previous * 100 if previous else None
+            report.append({'database': db, 'last': last, 'durations': durations, 'trend': trend,
+                           'forecast': predict_next_duration(durations)})
+        return report
+
+    def update_drill_report(self):
+        if not self.is_tab_built(TAB_HISTORY):
+            return
+        report = self.get_drill_report()
+        self.drill_table.setRowCount(len(report))
+        for row, item in enumerate(report):
+            last = item['last']
+            status = QTableWidgetItem("Успешно" if last['success'] else "Ошибка")
+            status.setForeground(QColor('#4CAF50' if last['success'] else '#f44336'))
+            status.setToolTip(last['error'] or f"Бэкап от {last['backup_date']}\n{last['file']}")
+            trend = ""
+            if item['trend'] is not None:
+                trend = f"{'↑' if item['trend'] > 0 else '↓'} {item['trend']:+.0f}%"
+            trend_item = QTableWidgetItem(trend)
+            trend_item.setToolTip("Время восстановления по проверкам:\n"
+                                  + "\n".join(format_duration(d) for d in item['durations']))
+            if item['trend'] is not None and item['trend'] > 20:
+                trend_item.setForeground(QColor('#ff9800'))
+            values = [item['database'], datetime.fromisoformat(last['date']).strftime("%d.%m.%Y %H:%M"), None,
+                      format_duration(last['restore_seconds']) if last['restore_seconds'] is not None else "-",
+                      f"{last['mb_per_sec']:.1f}" if last['mb_per_sec'] else "-",
+                      format_duration(last['checkdb_seconds']) if last['checkdb_seconds'] is not None else "-",
+                      None,
+                      format_duration(item['forecast']) if item['forecast'] else "-"]
+            for col, value in enumerate(values):
+                if value is not None:
+                    self.drill_table.setItem(row, col, QTableWidgetItem(value))
+            self.drill_table.setItem(row, 2, status)
+            self.drill_table.setItem(row, 6, trend_item)
+
+    def export_drill_report(self):
+        """Отчет RTO по базам в CSV (все проверки с трендом и прогнозом)"""
+        import csv
+        report = self.get_drill_report()
+        if not report:
+            QMessageBox.information(self, "Отчет", "Проверочных восстановлений еще не было")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить отчет RTO", "rto_report.csv", "CSV (*.csv)")
+        if not path:
+            return
+        runs_by_db = load_json_file(DRILL_HISTORY_FILE, {}).get(self.current_server, {})
+        try:
+            with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(["База", "Проверка", "Успешно", "Восстановление, с", "MB/s", "CHECKDB, с",
+                                 "Тренд, %", "Прогноз RTO, с", "Бэкап", "Ошибка"])
+                for item in report:
+                    for run in runs_by_db[item['database']]:
+                        writer.writerow([item['database'], run['date'], int(run['success']), run['restore_seconds'],
+                                         run['mb_per_sec'], run['checkdb_seconds'],
+                                         f"{item['trend']:.1f}" if item['trend'] is not None else "",
+                                         f"{item['forecast']:.1f}" if item['forecast'] else "",
+                                         run['file'], run['error'] or ""])
+        except OSError as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить отчет:\n{str(e)}")
+            return
+        self.notify(f"Отчет RTO сохранен: {path}", "#4caf50")
+
+    def sync_backup_history(self, silent=False):
+        """Инкрементальная загрузка новых записей backupset из msdb в локальный кэш (в фоне)"""
+        if not self.connection:
+            return
+        if self.history_sync is not None:
+            self.history_sync_rerun = True
+            return
+        
+        server_cache = self.backup_history.setdefault(self.current_server, {'last_id': 0, 'rows': []})
+        self.history_sync = HistorySyncWorker(self.conn_str_cache, self.current_server,
+                                              server_cache['last_id'], silent)
+        self.history_sync.event.connect(self.metrics.record)
+        self.history_sync.finished.connect(self.on_history_synced)
+        self.history_sync.start()
+
+    def on_history_synced(self, rows, last_id, error):
+        """Новые записи истории в кэше сервера, для которого запускалась загрузка"""
+        worker = self.history_sync
+        worker.wait()
+        self.history_sync = None
+        if error:
+            if not worker.silent:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить историю из msdb:\n{error}")
         else:
-            QMessageBox.critical(self, "❌ Ошибка", msg)
-            self.status_label.setText("Произошла ошибка")
-            self.status_label.setStyleSheet("color: #f44336; font-weight: bold;")
+            server_cache = self.backup_history.setdefault(worker.server, {'last_id': 0, 'rows': []})
+            server_cache['last_id'] = last_id
+            # Храним только последние записи каждой базы
+            server_cache['rows'] = trim_backup_history(server_cache['rows'] + rows)
+            if rows or not worker.last_id:
+                save_json_file(BACKUP_HISTORY_FILE, self.backup_history, indent=None)
+            
+            self.update_history_databases()
+            self.update_drill_report()
+            self.update_next_backup_time()
+            if not worker.silent:
+                self.status_label.setText(f"История обновлена: новых записей {len(rows)}")
+                self.status_label.setStyleSheet("color: #4caf50; font-weight: bold;")
+        
+        if self.history_sync_rerun:
+            self.history_sync_rerun = False
+            self.sync_backup_history(silent=True)
+
+    def get_history_rows(self, db, backup_type):
+        """Записи истории для базы и типа бэкапа (в хронологическом порядке)"""
+        server_cache = self.backup_history.get(self.current_server, {})
+        type_code = BACKUP_TYPE_CODES.get(backup_type, backup_type)
+        return [r for r in server_cache.get('rows', []) if r['db'] == db and r['type'] == type_code]
+
+    def predict_backup_duration(self, db, backup_type='FULL'):
+        """Прогноз длительности бэкапа базы в секундах (None, если истории нет)"""
+        rows = self.get_history_rows(db, backup_type)
+        return predict_next_duration([r['duration'] for r in rows])
+
+    def update_history_databases(self):
+        """Обновление списка баз, по которым есть история"""
+        if not self.is_tab_built(TAB_HISTORY):
+            return
+            
+        current = self.history_db_combo.currentText()
+        rows = self.backup_history.get(self.current_server, {}).get('rows', [])
+        databases = sorted({r['db'] for r in rows})
+        
+        self.history_db_combo.blockSignals(True)
+        self.history_db_combo.clear()
+        self.history_db_combo.addItems(databases)
+        if current in databases:
+            self.history_db_combo.setCurrentText(current)
+        self.history_db_combo.blockSignals(False)
+        self.update_history_view()
+
+    def update_history_view(self):
+        """Отрисовка графика и таблицы истории для выбранной базы"""
+        from PySide6.QtCharts import QLineSeries, QDateTimeAxis, QValueAxis
+        db = self.history_db_combo.currentText()
+        backup_type = self.history_type_combo.currentData()
+        rows = self.get_history_rows(db, backup_type) if db else []
+        
+        # График
+        self.history_chart.removeAllSeries()
+        for axis in self.history_chart.axes():
+            self.history_chart.removeAxis(axis)
+        self.history_chart.setTitle(f"{db}: длительность и скорость" if db else "")
+        
+        if rows:
+            duration_series = QLineSeries()
+            duration_series.setName("Длительность, мин")
+            speed_series = QLineSeries()
+            speed_series.setName("Скорость, MB/s")
+            
+            for r in rows:
+                x = datetime.fromisoformat(r['start']).timestamp() * 1000
+                duration_series.append(x, r['duration'] / 60)
+                speed_series.append(x, r['size'] / (1024**2) / r['duration'])
+            
+            self.history_chart.addSeries(duration_series)
+            self.history_chart.addSeries(speed_series)
+            
+            axis_x = QDateTimeAxis()
+            axis_x.setFormat("dd.MM HH:mm")
+            axis_x.setLabelsColor(QColor('#b0b0b0'))
+            self.history_chart.addAxis(axis_x, Qt.AlignBottom)
+            
+            axis_duration = QValueAxis()
+            axis_duration.setTitleText("мин")
+            axis_duration.setLabelsColor(QColor('#b0b0b0'))
+            axis_duration.setTitleBrush(QColor('#b0b0b0'))
+            self.history_chart.addAxis(axis_duration, Qt.AlignLeft)
+            
+            axis_speed = QValueAxis()
+            axis_speed.setTitleText("MB/s")
+            axis_speed.setLabelsColor(QColor('#b0b0b0'))
+            axis_speed.setTitleBrush(QColor('#b0b0b0'))
+            self.history_chart.addAxis(axis_speed, Qt.AlignRight)
+            
+            for series, axis_y in ((duration_series, axis_duration), (speed_series, axis_speed)):
+                series.attachAxis(axis_x)
+                series.attachAxis(axis_y)
+            
+            axis_duration.setMin(0)
+            axis_speed.setMin(0)
+        
+        # Таблица (новые сверху)
+        self.history_table.setRowCount(len(rows))
+        for i, r in enumerate(reversed(rows)):
+            start = datetime.fromisoformat(r['start']).strftime("%d.%m.%Y %H:%M:%S")
+            speed = r['size'] / (1024**2) / r['duration']
+            self.history_table.setItem(i, 0, QTableWidgetItem(start))
+            self.history_table.setItem(i, 1, QTableWidgetItem(f"{r['duration'] / 60:.1f} мин"))
+            self.history_table.setItem(i, 2, QTableWidgetItem(f"{r['size'] / (1024**3):.2f} GB"))
+            self.history_table.setItem(i, 3, QTableWidgetItem(f"{r['compressed'] / (1024**3):.2f} GB"))
+            self.history_table.setItem(i, 4, QTableWidgetItem(f"{speed:.1f}"))
+            device_item = QTableWidgetItem(r['device'])
+            device_item.setToolTip(r['device'])
+            self.history_table.setItem(i, 5, device_item)
+        
+        # Прогноз
+        predicted = predict_next_duration([r['duration'] for r in rows])
+        if predicted is None:
+            self.lbl_history_prediction.setText("Прогноз следующего запуска: -")
+        else:
+            self.lbl_history_prediction.setText(
+                f"Прогноз следующего запуска: {predicted / 60:.1f} мин (по {min(len(rows), 10)} последним запускам)")
+
+    # Общие методы
+    # Менеджер заданий
+    def init_jobs_panel(self):
+        """Панель заданий: очередь, выполняемые и завершенные операции"""
+        group = QGroupBox("Задания")
+        layout = QVBoxLayout(group)
+        layout.setContentsMargins(5, 5, 5, 5)
+        
+        self.jobs_table = QTableWidget()
+        self.jobs_table.setColumnCount(7)
+        self.jobs_table.setHorizontalHeaderLabels(["Задание", "Состояние", "Прогресс", "Начало",
+                                                   "Длительность", "Скорость", "Сообщение"])
+        self.jobs_table.horizontalHeader().setStretchLastSection(True)
+        self.jobs_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.jobs_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.jobs_table.verticalHeader().setVisible(False)
+        self.jobs_table.setMaximumHeight(160)
+        self.jobs_table.setColumnWidth(0, 260)
+        self.jobs_table.setColumnWidth(1, 110)
+        self.jobs_table.cellDoubleClicked.connect(self.show_job_details)
+        
+        buttons = QHBoxLayout()
+        btn_cancel_job = QPushButton("Отменить выбранное")
+        btn_cancel_job.setObjectName("RedBtn")
+        btn_cancel_job.clicked.connect(self.cancel_selected_jobs)
+        btn_clear_jobs = QPushButton("Очистить завершенные")
+        btn_clear_jobs.clicked.connect(self.clear_finished_jobs)
+        buttons.addStretch()
+        buttons.addWidget(btn_cancel_job)
+        buttons.addWidget(btn_clear_jobs)
+        
+        layout.addWidget(self.jobs_table)
+        layout.addLayout(buttons)
+        
+        # Обновление длительности и процента выполнения запущенных заданий
+        self.job_timer = QTimer(self)
+        self.job_timer.setInterval(JOB_REFRESH_INTERVAL)
+        self.job_timer.timeout.connect(self.refresh_running_jobs)
+        return group
+
+    def run_worker(self, cmds, name, conn_str=None, cleanup_cmds=None, queue=True):
+        """Постановка операции в очередь заданий (queue=False - без запуска, если задание
+        еще дополняется перед стартом)"""
+        databases = {m.group(2) for m in (COMMAND_PATTERN.match(sql) for sql in cmds) if m}
+        job = {
+            'id': new_job_id(),
+            'name': name,
+            'cmds': cmds,
+            'conn_str': conn_str or self.conn_str_cache,
+            'cleanup': cleanup_cmds,
+            'databases': databases,
+            'state': JOB_QUEUED,
+            'worker': None,
+            'progress': "",
+            'percent': None,
+            'started': None,
+            'duration': 0.0,
+            'bytes': 0,
+            'message': "",
+            # Реплика AG, на которой выполняется задание (None - текущий сервер), и пояснение маршрута
+            'server': None,
+            'route': "",
+        }
+        self.jobs.append(job)
+        self.jobs_table.insertRow(len(self.jobs) - 1)
+        self.set_job_row(len(self.jobs) - 1)
+        if queue:
+            self.start_queued_jobs()
+        return job
+
+    def start_queued_jobs(self):
+        """Запуск заданий из очереди без общих баз с выполняемыми: не больше JOB_MAX_CONCURRENT,
+        а бэкапов с адаптивным параллелизмом - не больше уровня регулятора для их сервера и пути;
+        всего - не больше JOB_MAX_TOTAL"""
+        # Передачи файлов не занимают сессий на сервере и не ограничивают очередь
+        running = [j for j in self.jobs if j['state'] == JOB_RUNNING and not j.get('transfer')]
+        total = len(running)
+        busy = set().union(*(j['databases'] for j in running))
+        counts = {}
+        for job in running:
+            counts[job.get('pool')] = counts.get(job.get('pool'), 0) + 1
+        for row, job in enumerate(self.jobs):
+            if total >= JOB_MAX_TOTAL:
+                break
+            if job['state'] != JOB_QUEUED or job['databases'] & busy:
+                continue
+            pool = job.get('pool')
+            if pool == DRILL_POOL:
+                limit = DRILL_MAX_CONCURRENT
+            else:
+                limit = self.concurrency.limit(pool) if pool else JOB_MAX_CONCURRENT
+            if counts.get(pool, 0) >= limit:
+                continue
+            worker = Worker(job['conn_str'], job['cmds'], job['name'], job['id'],
+                            cleanup_commands=job['cleanup'])
+            worker.progress.connect(self.on_job_progress)
+            worker.event.connect(self.metrics.record)
+            worker.event.connect(self.on_job_event)
+            worker.finished.connect(self.on_job_finished)
+            job.update(worker=worker, state=JOB_RUNNING, started=datetime.now())
+            worker.start()
+            counts[pool] = counts.get(pool, 0) + 1
+            total += 1
+            busy |= job['databases']
+            self.set_job_row(row)
+        self.update_jobs_indicator()
+
+    def run_transfer(self, worker, name, details):
+        """Фоновая передача файлов (копирование, репликация, S3) - выполняемое задание в списке
+        (details - строки "источник -> назначение" для подробностей задания)"""
+        job = self.run_worker(details, name, queue=False)
+        job.update(id=worker.job_id, worker=worker, state=JOB_RUNNING, started=datetime.now(), transfer=True)
+        worker.progress.connect(self.on_job_progress)
+        worker.event.connect(self.on_job_event)
+        worker.finished.connect(self.on_job_finished)
+        self.set_job_row(len(self.jobs) - 1)
+        self.update_jobs_indicator()
+        return job
+
+    def find_job(self, worker):
+        for row, job in enumerate(self.jobs):
+            if job['worker'] is worker:
+                return row, job
+        return None, None
 
-    def lock_ui(self, lock):
-        self.tabs.setEnabled(not lock)
-        self.progress_bar.setVisible(lock)
-        if lock: 
-            self.progress_bar.setRange(0, 0)
-        else: 
-            self.progress_bar.setRange(0, 100)
+    def set_job_row(self, row):
+        """Отображение задания в строке таблицы"""
+        job = self.jobs[row]
+        if job['state'] == JOB_RUNNING:
+            progress = f"{job['percent']:.1f}%" if job['percent'] is not None else "..."
+        else:
+            progress = "100%" if job['state'] == JOB_DONE else ""
+        speed = ""
+        if job['bytes'] and job['duration']:
+            speed = f"{job['bytes'] / job['duration'] / 1024**2:.1f} MB/s"
+        values = [job['name'], JOB_STATE_TITLES[job['state']], progress,
+                  job['started'].strftime("%H:%M:%S") if job['started'] else "",
+                  format_duration(job['duration']) if job['started'] else "",
+                  speed, (job['message'] or job['progress']).split("\n")[0]]
+        for col, value in enumerate(values):
+            item = QTableWidgetItem(value)
+            if col == 0 and job['route']:
+                item.setToolTip(job['route'])
+            if col == 1:
+                item.setForeground(QColor(JOB_STATE_COLORS[job['state']]))
+            if col == 6:
+                item.setToolTip(job['message'] or job['progress'])
+            self.jobs_table.setItem(row, col, item)
+        self.publish_jobs()
+
+    def refresh_running_jobs(self):
+        """Длительность запущенных заданий и фоновый опрос их процента выполнения"""
+        running = [(row, job) for row, job in enumerate(self.jobs) if job['state'] == JOB_RUNNING]
+        if not running:
+            self.job_timer.stop()
+            return
+        
+        # Процент - по сессиям заданий на их серверах (включая реплики AG); медленный сервер
+        # задерживает только следующий опрос, а не окно
+        sessions = {}
+        for _, job in running:
+            if not job.get('transfer') and job['worker'].spid is not None:
+                sessions.setdefault(job['conn_str'], []).append(job['worker'].spid)
+        if sessions and self.progress_poller is None:
+            self.progress_poller = ProgressPoller(sessions)
+            self.progress_poller.finished.connect(self.on_progress_polled)
+            self.progress_poller.start()
+        
+        now = datetime.now()
+        for row, job in running:
+            job['duration'] = (now - job['started']).total_seconds()
+            self.set_job_row(row)
+
+    def on_progress_polled(self, percents):
+        self.progress_poller.wait()
+        self.progress_poller = None
+        for row, job in enumerate(self.jobs):
+            if job['state'] == JOB_RUNNING and not job.get('transfer') and job['worker'].spid is not None:
+                key = (job['conn_str'], job['worker'].spid)
+                if key in percents:
+                    job['percent'] = percents[key]
+                    self.set_job_row(row)
+
+    def on_job_progress(self, msg):
+        row, job = self.find_job(self.sender())
+        if job is not None:
+            job['progress'] = msg
+            self.set_job_row(row)
+
+    def on_job_event(self, event):
+        """Накопление объема данных задания для расчета скорости"""
+        row, job = self.find_job(self.sender())
+        if job is None:
+            return
+        if event['bytes']:
+            job['bytes'] += event['bytes']
+        # Проверочное восстановление: длительность самого RESTORE и CHECKDB отдельно
+        drill = job.get('drill')
+        if drill is not None and event['success']:
+            if event['operation'] == 'restore':
+                drill['restore_seconds'] = event['duration']
+                drill['bytes'] = event['bytes'] or drill['size']
+            elif 'CHECKDB' in event['command'].upper():
+                drill['checkdb_seconds'] = event['duration']
+
+    def on_job_finished(self, success, msg):
+        row, job = self.find_job(self.sender())
+        if job is None:
+            return
+        worker = job['worker']
+        worker.wait()        # finished испускается внутри run(): поток еще может работать
+        job['worker'] = None
+        job['duration'] = (datetime.now() - job['started']).total_seconds()
+        job['message'] = msg
+        if worker.cancelled and not success:
+            job['state'] = JOB_CANCELLED
+            self.notify(f"Задание отменено: {job['name']}", "#ff9800")
+        elif success:
+            job['state'] = JOB_DONE
+            self.notify(f"✅ {job['name']}: завершено за {format_duration(job['duration'])}", "#4caf50")
+        else:
+            job['state'] = JOB_FAILED
+            self.notify(f"❌ {job['name']}: ошибка (подробности - двойной щелчок в списке заданий)", "#f44336")
+        self.set_job_row(row)
+        if job.get('transfer'):
+            # Передача файлов не меняет базы на сервере
+            self.update_jobs_indicator()
+            return
+        
+        if success and job.get('destinations'):
+            self.handle_backup_destinations(job)
+        if success and job.get('s3_url'):
+            self.drop_s3_listing_cache()
+            self.start_s3_listing()
+        if job.get('snapshots'):
+            self.load_snapshots()
+        if success and job.get('catalog'):
+            self.update_filegroup_catalog(*job['catalog'], worker.backup_sets)
+        if success and job.get('pool') not in (None, DRILL_POOL) and job['bytes']:
+            self.record_concurrency(job)
+        if job.get('drill') is not None and job['state'] != JOB_CANCELLED:
+            self.record_drill(job, success)
+        
+        # Обновляем данные после операции
+        if success and self.connection:
+            self.load_databases_with_sizes()
+            self.sync_backup_history(silent=True)
+        if not self.is_tab_built(TAB_FILES) or not self.chk_watch_folder.isChecked():
+            self.refresh_backup_files()
+        
+        self.start_queued_jobs()
+
+    def record_concurrency(self, job):
+        """Скорость завершенного бэкапа - в регулятор параллелизма его сервера и пути"""
+        pool = job['pool']
+        pending = [j for j in self.jobs if j.get('pool') == pool and j['state'] in (JOB_QUEUED, JOB_RUNNING)]
+        # Пока очередь не опустела, одновременно выполнялось столько бэкапов, сколько позволял уровень
+        saturated = len(pending) >= self.concurrency.limit(pool)
+        change = self.concurrency.record(pool, job['started'], job['bytes'], job['duration'], saturated)
+        if change:
+            old, new, mbps = change
+            self.notify(f"Параллельных бэкапов ({pool}): {old} → {new}, {mbps:.1f} MB/s", "#2196f3")
+
+    def notify(self, text, color):
+        """Неблокирующее уведомление в строке состояния"""
+        self.status_label.setText(text)
+        self.status_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+
+    def show_startup_warnings(self):
+        """Ошибки настройки, найденные до построения окна (полный список - в подсказке)"""
+        if self.startup_warnings:
+            self.notify("⚠️ " + "; ".join(self.startup_warnings), "#ff9800")
+            self.status_label.setToolTip("\n".join(self.startup_warnings))
+
+    def update_jobs_indicator(self):
+        """Индикатор выполнения в строке состояния, пока есть активные задания"""
+        active = sum(1 for j in self.jobs if j['state'] in (JOB_QUEUED, JOB_RUNNING))
+        self.progress_bar.setVisible(bool(active))
+        self.progress_bar.setRange(0, 0 if active else 100)
+        if any(j['state'] == JOB_RUNNING for j in self.jobs) and not self.job_timer.isActive():
+            self.job_timer.start()
+
+    def selected_job_rows(self):
+        return sorted({index.row() for index in self.jobs_table.selectionModel().selectedRows()})
+
+    def cancel_selected_jobs(self):
+        """Отмена выбранных заданий: из очереди - сразу, выполняемых - через KILL на сервере,
+        передач файлов - перед очередным блоком"""
+        rows = [r for r in self.selected_job_rows() if self.jobs[r]['state'] in (JOB_QUEUED, JOB_RUNNING)]
+        if not rows:
+            return
+        names = "\n".join(self.jobs[r]['name'] for r in rows)
+        reply = QMessageBox.question(self, "Отмена заданий",
+                                     f"Отменить задания?\n{names}\n\n"
+                                     "Выполняемые сессии будут завершены на сервере (KILL), "
+                                     "передачи файлов прерваны, неполные файлы удалены.",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        for row in rows:
+            job = self.jobs[row]
+            if job['state'] == JOB_QUEUED:
+                job['state'] = JOB_CANCELLED
+                job['message'] = "Отменено до запуска"
+            elif job['worker'] is not None:
+                job['progress'] = "Отмена..."
+                job['worker'].cancel()
+            self.set_job_row(row)
+        self.update_jobs_indicator()
+
+    def clear_finished_jobs(self):
+        self.jobs = [j for j in self.jobs if j['state'] in (JOB_QUEUED, JOB_RUNNING)]
+        self.jobs_table.setRowCount(len(self.jobs))
+        for row in range(len(self.jobs)):
+            self.set_job_row(row)
+        self.publish_jobs()
+
+    def show_job_details(self, row, column):
+        """Подробности задания: команды и итоговое сообщение"""
+        job = self.jobs[row]
+        text = f"{job['name']}\nСостояние: {JOB_STATE_TITLES[job['state']]}\n\n{job['message'] or job['progress']}"
+        if job['route']:
+            text += f"\n\nМаршрут:\n{job['route']}"
+        box = QMessageBox(QMessageBox.Information, "Задание", text, QMessageBox.Ok, self)
+        box.setDetailedText("\n\n".join(job['cmds'] + (job['cleanup'] or [])))
+        box.setWindowModality(Qt.NonModal)
+        box.setAttribute(Qt.WA_DeleteOnClose)
+        box.show()
+
+    def update_status(self, msg):
+        self.status_label.setText(msg)
 
     def show_about(self):
         text = f"""
@@ -1773,7 +7098,7 @@ if __name__ == "__main__":
     font = QFont("Segoe UI", 10)
     app.setFont(font)
     
-    window = BackupApp()
+    window = BackupApp(benchmark_startup="--benchmark-startup" in sys.argv)
     window.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,100 @@
+"""HTTP API каталога: условные запросы по ETag (304 без сборки ответа) и ответ до загрузки каталога
+(запросы идут в сервер API на локальном порту)"""
+
+import http.client
+import json
+import unittest
+
+import main
+
+ROOT = "\\\\nas\\backups\\"
+
+
+def backup_file(name, mtime=1772366400):
+    return main.parse_backup_file(ROOT + name, 1024, mtime)
+
+
+def job(job_id, state):
+    return {'id': job_id, 'name': "Бэкап Sales", 'state': state, 'databases': {"Sales"}, 'server': "sql01",
+            'started': None, 'duration': 0.0, 'percent': None, 'bytes': 0, 'message': ""}
+
+
+class CatalogApiTests(unittest.TestCase):
+
+    def setUp(self):
+        self.api = main.CatalogApi()
+        self.api.start("127.0.0.1", 0)
+        self.addCleanup(self.api.server.server_close)
+        self.addCleanup(self.api.server.shutdown)
+
+    def get(self, path, etag=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.api.server.server_address[1], timeout=5)
+        try:
+            conn.request("GET", path, headers={'If-None-Match': etag} if etag else {})
+            response = conn.getresponse()
+            return response.status, response.getheader('ETag'), response.read()
+        finally:
+            conn.close()
+
+    def test_not_modified_until_catalog_changes(self):
+        self.api.publish_files([backup_file("sql01_Sales_FULL_20260301_123015.bak")])
+        status, etag, body = self.get("/api/backups")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['total'], 1)
+        self.assertTrue(etag)
+
+        status, same_etag, body = self.get("/api/backups?db=Sales", etag)
+        self.assertEqual((status, same_etag, body), (304, etag, b""))
+        self.assertEqual(self.get("/api/backups/latest", etag)[0], 304)
+
+        self.api.publish_files([backup_file("sql01_Sales_FULL_20260301_123015.bak"),
+                                backup_file("sql01_Sales_DIFF_20260302_123015.bak", 1772452800)])
+        status, new_etag, body = self.get("/api/backups", etag)
+        self.assertEqual(status, 200)
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(json.loads(body)['total'], 2)
+
+    def test_if_none_match_lists_and_wildcard(self):
+        self.api.publish_files([backup_file("sql01_Sales_FULL_20260301_123015.bak")])
+        etag = self.get("/api/backups")[1]
+        self.assertEqual(self.get("/api/backups", f'"other", {etag}')[0], 304)
+        self.assertEqual(self.get("/api/backups", "*")[0], 304)
+        self.assertEqual(self.get("/api/backups", '"other"')[0], 200)
+
+    def test_collections_have_separate_versions(self):
+        self.api.publish_files([backup_file("sql01_Sales_FULL_20260301_123015.bak")])
+        self.api.publish_jobs([job("a1", main.JOB_QUEUED)])
+        backups_etag = self.get("/api/backups")[1]
+        jobs_etag = self.get("/api/jobs")[1]
+        self.assertNotEqual(backups_etag, jobs_etag)
+
+        self.api.publish_jobs([job("a1", main.JOB_RUNNING)])
+        self.assertEqual(self.get("/api/backups", backups_etag)[0], 304)
+        self.assertEqual(self.get("/api/jobs", jobs_etag)[0], 200)
+        # Тот же снимок заданий не меняет версию
+        jobs_etag = self.get("/api/jobs")[1]
+        self.api.publish_jobs([job("a1", main.JOB_RUNNING)])
+        self.assertEqual(self.get("/api/jobs", jobs_etag)[0], 304)
+
+    def test_etag_changes_after_restart(self):
+        self.api.publish_files([])
+        etag = self.get("/api/backups")[1]
+        restarted = main.CatalogApi()
+        restarted.publish_files([])
+        self.assertNotEqual(restarted.instance, self.api.instance)
+        self.assertNotIn(restarted.instance, etag)
+
+    def test_catalog_not_loaded(self):
+        status, etag, body = self.get("/api/backups")
+        self.assertEqual(status, 503)
+        self.assertIsNone(etag)
+        self.assertIn('error', json.loads(body))
+        requested = self.api.requested
+        self.assertIsNotNone(requested)
+        # Повторный запрос в пределах CATALOG_REQUEST_RETRY не запускает сканирование снова
+        self.assertEqual(self.get("/api/backups", "*")[0], 503)
+        self.assertEqual(self.api.requested, requested)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Адаптивный параллелизм бэкапов: шаги AIMD по эпохам и правило насыщения"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import main
+
+KEY = "sql01 → \\\\nas\\backups"
+GB = 1024**3
+
+
+class ConcurrencyControllerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "concurrency.json")
+        patches = [mock.patch.object(main, 'JOB_MAX_CONCURRENT', 2),
+                   mock.patch.object(main, 'ADAPTIVE_MAX_CONCURRENT', 4),
+                   mock.patch.object(main, 'ADAPTIVE_GAIN', 0.1),
+                   mock.patch.object(main, 'ADAPTIVE_LATENCY_FACTOR', 2)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.controller = main.ConcurrencyController(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def epoch(self, mbps, job_seconds=10):
+        """Полная эпоха насыщенных бэкапов по 1 GB с общей скоростью mbps; результат record последнего"""
+        jobs = max(self.controller.limit(KEY), 2)
+        started = datetime.now() - timedelta(seconds=jobs * 1024 / mbps)
+        results = [self.controller.record(KEY, started, GB, job_seconds, True) for _ in range(jobs)]
+        self.assertTrue(all(result is None for result in results[:-1]))
+        return results[-1]
+
+    def test_first_epoch_increases_level(self):
+        self.assertEqual(self.controller.limit(KEY), 2)
+        old, new, mbps = self.epoch(200)
+        self.assertEqual((old, new), (2, 3))
+        self.assertAlmostEqual(mbps, 200, delta=5)
+        self.assertEqual(self.controller.limit(KEY), 3)
+
+    def test_throughput_gain_adds_one_up_to_maximum(self):
+        self.epoch(200)
+        self.assertEqual(self.epoch(300)[:2], (3, 4))
+        self.assertIsNone(self.epoch(400))
+        self.assertEqual(self.controller.limit(KEY), 4)
+
+    def test_plateau_keeps_level(self):
+        self.epoch(200)
+        self.assertIsNone(self.epoch(205))
+        self.assertEqual(self.controller.limit(KEY), 3)
+
+    def test_throughput_drop_halves_level(self):
+        self.epoch(200)
+        old, new, _ = self.epoch(100)
+        self.assertEqual((old, new), (3, 1))
+        self.assertEqual(self.controller.limit(KEY), 1)
+
+    def test_latency_growth_halves_level(self):
+        self.epoch(200)
+        # Та же общая скорость, но каждый бэкап выполняется втрое дольше
+        old, new, _ = self.epoch(200, job_seconds=30)
+        self.assertEqual((old, new), (3, 1))
+
+    def test_unsaturated_backup_discards_epoch(self):
+        started = datetime.now() - timedelta(seconds=10)
+        self.assertIsNone(self.controller.record(KEY, started, GB, 10, True))
+        # Хвост очереди: незавершенная эпоха отбрасывается, уровень не меняется
+        self.assertIsNone(self.controller.record(KEY, started, GB, 10, False))
+        self.assertNotIn(KEY, self.controller.epochs)
+        self.assertIsNone(self.controller.record(KEY, started, GB, 10, True))
+        self.assertEqual(self.controller.limit(KEY), 2)
+        self.assertEqual(self.controller.record(KEY, started, GB, 10, True)[:2], (2, 3))
+
+    def test_level_is_kept_for_next_run(self):
+        self.epoch(200)
+        self.assertEqual(main.ConcurrencyController(self.path).limit(KEY), 3)
+        self.assertEqual(main.ConcurrencyController(self.path).limit("sql02 → D:\\backups"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Условия выбора баз: маски имени, регулярные выражения, размер, состояние и модель восстановления"""
+
+import unittest
+
+import main
+
+
+def database(name, size_mb=1024.0, state="ONLINE", recovery="FULL"):
+    return {'name': name, 'size_mb': size_mb, 'state': state, 'recovery': recovery}
+
+
+DATABASES = [
+    database("tenant_001", 512.0),
+    database("tenant_002", 20 * 1024.0, recovery="SIMPLE"),
+    database("Tenant_Archive", 300 * 1024.0, state="OFFLINE"),
+    database("Sales", None, state="RESTORING"),
+]
+
+
+class DbPredicateTests(unittest.TestCase):
+
+    def selected(self, text):
+        predicate = main.parse_db_predicate(text)
+        return [db['name'] for db in DATABASES if predicate(db)]
+
+    def test_name_mask_ignores_case(self):
+        self.assertEqual(self.selected("tenant_*"), ["tenant_001", "tenant_002", "Tenant_Archive"])
+        self.assertEqual(self.selected("SALES"), ["Sales"])
+
+    def test_regular_expression(self):
+        self.assertEqual(self.selected(r"re:^tenant_\d+$"), ["tenant_001", "tenant_002"])
+        self.assertEqual(self.selected("re:archive"), ["Tenant_Archive"])
+
+    def test_size_with_units(self):
+        self.assertEqual(self.selected("size>10GB"), ["tenant_002", "Tenant_Archive"])
+        self.assertEqual(self.selected("size<=512MB"), ["tenant_001"])
+        self.assertEqual(self.selected("size>=0.25TB"), ["Tenant_Archive"])
+
+    def test_size_without_units_is_gigabytes(self):
+        self.assertEqual(self.selected("size<1"), ["tenant_001"])
+
+    def test_unknown_size_never_matches(self):
+        self.assertNotIn("Sales", self.selected("size>=0"))
+        self.assertNotIn("Sales", self.selected("size!=1GB"))
+
+    def test_state_and_recovery(self):
+        self.assertEqual(self.selected("state=online"), ["tenant_001", "tenant_002"])
+        self.assertEqual(self.selected("recovery!=SIMPLE"), ["tenant_001", "Tenant_Archive", "Sales"])
+
+    def test_all_conditions_must_match(self):
+        self.assertEqual(self.selected("tenant_* state=ONLINE recovery=FULL size<10GB"), ["tenant_001"])
+
+    def test_errors(self):
+        for text in ("", "   ", "re:(", "size>10XB", "size>big", "state>ONLINE", "recovery<FULL"):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                main.parse_db_predicate(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Шаблон имени файла бэкапа: формирование, разбор и объединение частей бэкапа"""
+
+import unittest
+from unittest import mock
+from datetime import datetime
+
+import main
+
+TIMESTAMP = datetime(2026, 3, 1, 12, 30, 15)
+ROOT = "\\\\nas\\backups\\"
+
+
+class NameTemplateTests(unittest.TestCase):
+
+    def test_default_template_round_trip(self):
+        template = main.stripe_template(main.BACKUP_NAME_TEMPLATE, 1)
+        name = main.format_backup_name(template, "sql01.corp.local\\PROD,1433", "My_Sales_DB", "DIFF", TIMESTAMP)
+        tokens = main.parse_backup_name(ROOT + name)
+        self.assertEqual(tokens['server'], "sql01")
+        self.assertEqual(tokens['db'], "My_Sales_DB")
+        self.assertEqual(tokens['type'], "DIFF")
+        self.assertEqual(tokens['timestamp'], "20260301_123015")
+
+    def test_template_with_folders_round_trip(self):
+        template = "{server}/{instance}/{db}/{db}_{type}_{timestamp}.bak"
+        name = main.format_backup_name(template, "sql01\\PROD", "Sales", "LOG", TIMESTAMP)
+        self.assertEqual(name, "sql01\\PROD\\Sales\\Sales_LOG_20260301_123015.bak")
+        match = main.compile_name_template(template).match(name.replace('\\', '/'))
+        self.assertEqual(match.groupdict(), {'server': "sql01", 'instance': "PROD", 'db': "Sales",
+                                             'type': "LOG", 'timestamp': "20260301_123015"})
+
+    def test_repeated_token_must_match(self):
+        regex = main.compile_name_template("{db}/{db}_{type}_{timestamp}.bak")
+        self.assertIsNone(regex.match("Sales/HR_FULL_20260301_123015.bak"))
+
+    def test_unknown_token_is_rejected(self):
+        with self.assertRaises(ValueError):
+            main.compile_name_template("{server}_{database}.bak")
+
+    def test_stripe_token_is_added_before_extension(self):
+        self.assertEqual(main.stripe_template("{db}_{timestamp}.bak", 4), "{db}_{timestamp}_{stripe}.bak")
+        self.assertEqual(main.stripe_template("{db}_{timestamp}.bak", 1), "{db}_{timestamp}.bak")
+        self.assertEqual(main.stripe_template("{db}_{stripe}_{timestamp}.bak", 4), "{db}_{stripe}_{timestamp}.bak")
+
+    def test_stripes_are_parsed_whatever_the_current_stripe_count(self):
+        template = main.stripe_template(main.BACKUP_NAME_TEMPLATE, 3)
+        for stripe in (1, 3):
+            name = main.format_backup_name(template, "sql01", "Sales", "FULL", TIMESTAMP, stripe)
+            file_info = main.parse_backup_file(ROOT + name, 100, TIMESTAMP.timestamp())
+            self.assertEqual((file_info['database'], file_info['type'], file_info['stripe']),
+                             ("Sales", "Полный", stripe))
+        name = main.format_backup_name(main.BACKUP_NAME_TEMPLATE, "sql01", "Sales", "FULL", TIMESTAMP)
+        self.assertIsNone(main.parse_backup_file(ROOT + name, 100, TIMESTAMP.timestamp())['stripe'])
+
+    def test_legacy_names_are_parsed(self):
+        scheduled = main.parse_backup_file(ROOT + "sql01_Sales_SCHEDULED_20260301_123015.bak", 100, 0)
+        self.assertEqual((scheduled['server'], scheduled['database'], scheduled['type'], scheduled['date']),
+                         ("sql01", "Sales", "План", "01.03.2026 12:30"))
+        plain = main.parse_backup_file(ROOT + "sql01_Sales_20260301_123015.bak", 100, 0)
+        self.assertEqual((plain['database'], plain['type']), ("Sales", "Полный"))
+
+    def test_backup_disk_clause_lists_every_stripe(self):
+        with mock.patch.object(main, 'BACKUP_STRIPES', 2):
+            _, clause = main.backup_disk_clause(ROOT, "sql01", "Sales", "FULL", TIMESTAMP)
+        files = main.backup_clause_files(clause)
+        self.assertEqual(len(files), 2)
+        self.assertEqual([main.parse_backup_file(f, 1, 0)['stripe'] for f in files], [1, 2])
+
+
+class StripeGroupingTests(unittest.TestCase):
+
+    def stripe_files(self, db, timestamp, stripes, size=100):
+        template = main.stripe_template(main.BACKUP_NAME_TEMPLATE, stripes)
+        return [main.parse_backup_file(ROOT + main.format_backup_name(template, "sql01", db, "FULL", timestamp,
+                                                                      stripe), size, timestamp.timestamp() + stripe)
+                for stripe in range(1, stripes + 1)]
+
+    def test_stripes_of_one_backup_form_one_record(self):
+        parts = self.stripe_files("Sales", TIMESTAMP, 3)
+        grouped = main.group_backup_stripes(list(reversed(parts)))
+        self.assertEqual(len(grouped), 1)
+        record = grouped[0]
+        self.assertEqual(record['path'], parts[0]['path'])
+        self.assertEqual(record['size'], 300)
+        self.assertEqual(record['mtime'], parts[2]['mtime'])
+        self.assertEqual([p['path'] for p in main.backup_parts(grouped)], [p['path'] for p in parts])
+
+    def test_different_backups_stay_separate(self):
+        files = (self.stripe_files("Sales", TIMESTAMP, 2) + self.stripe_files("Sales", datetime(2026, 3, 2), 2)
+                 + self.stripe_files("HR", TIMESTAMP, 2))
+        single = main.parse_backup_file(ROOT + "sql01_Sales_FULL_20260301_123015.bak", 100, 0)
+        grouped = main.group_backup_stripes(files + [single])
+        self.assertEqual(len(grouped), 4)
+        self.assertIn(single, grouped)
+        self.assertEqual(main.backup_parts([single]), [single])
+
+    def test_restore_media_clause_names_every_stripe(self):
+        record = main.group_backup_stripes(self.stripe_files("Sales", TIMESTAMP, 2))[0]
+        field = "; ".join(p['path'] for p in main.backup_parts([record]))
+        clause = main.backup_media_clause(main.restore_media_files(field))
+        self.assertEqual(clause.count("DISK = N'"), 2)
+        self.assertEqual(main.backup_media_clause(["s3://bucket/a_1.bak"]), "URL = N's3://bucket/a_1.bak'")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Выбор устаревших бэкапов для удаления без разрыва цепочек восстановления"""
+
+import unittest
+from datetime import datetime, timedelta
+
+import main
+
+NOW = datetime(2026, 3, 1, 12, 0)
+DAY = 86400
+
+
+class RetentionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.found = {}
+
+    def add(self, server, db, backup_type, days_ago):
+        """Файл бэкапа в общей папке, названный по текущему шаблону; возвращает его путь"""
+        timestamp = NOW - timedelta(days=days_ago)
+        name = main.format_backup_name(main.stripe_template(main.BACKUP_NAME_TEMPLATE), server, db,
+                                       backup_type, timestamp)
+        path = "\\\\nas\\backups\\" + name
+        self.found[path] = (1024, timestamp.timestamp())
+        return path
+
+    def candidates(self, retention_days=7):
+        return sorted(f['path'] for f in
+                      main.find_retention_candidates(self.found, retention_days, NOW.timestamp()))
+
+    def test_disabled_retention_deletes_nothing(self):
+        self.add("SRVA", "Sales", "FULL", 30)
+        self.add("SRVA", "Sales", "FULL", 1)
+        self.assertEqual(self.candidates(retention_days=0), [])
+
+    def test_superseded_chain_is_deleted(self):
+        old_full = self.add("SRVA", "Sales", "FULL", 30)
+        old_diff = self.add("SRVA", "Sales", "DIFF", 29)
+        self.add("SRVA", "Sales", "FULL", 1)
+        self.assertEqual(self.candidates(), sorted([old_full, old_diff]))
+
+    def test_latest_full_and_its_chain_are_kept_even_when_expired(self):
+        self.add("SRVA", "Sales", "FULL", 30)
+        self.add("SRVA", "Sales", "DIFF", 20)
+        self.add("SRVA", "Sales", "LOG", 19)
+        self.assertEqual(self.candidates(), [])
+
+    def test_base_of_unexpired_diff_is_kept(self):
+        self.add("SRVA", "Sales", "FULL", 30)
+        self.add("SRVA", "Sales", "FULL", 10)
+        self.add("SRVA", "Sales", "DIFF", 2)
+        newest = self.add("SRVA", "Sales", "FULL", 1)
+        self.assertNotIn(newest, self.candidates())
+        # DIFF двухдневной давности опирается на полный бэкап 10-дневной давности
+        self.assertEqual(len(self.candidates()), 1)
+
+    def test_database_without_full_backup_is_not_touched(self):
+        self.add("SRVA", "Sales", "DIFF", 30)
+        self.add("SRVA", "Sales", "LOG", 29)
+        self.assertEqual(self.candidates(), [])
+
+    def test_servers_sharing_a_folder_keep_separate_chains(self):
+        # Сервер A сделал единственный полный бэкап давно, сервер B - вчера: цепочка A не устаревает
+        self.add("SRVA", "Sales", "FULL", 30)
+        self.add("SRVA", "Sales", "DIFF", 20)
+        self.add("SRVA", "Sales", "LOG", 19)
+        self.add("SRVB", "Sales", "FULL", 1)
+        self.assertEqual(self.candidates(), [])
+
+        old_b = self.add("SRVB", "Sales", "FULL", 40)
+        self.assertEqual(self.candidates(), [old_b])
+
+    def test_files_without_database_token_are_ignored(self):
+        self.found["\\\\nas\\backups\\manual copy.bak"] = (1024, (NOW - timedelta(days=90)).timestamp())
+        self.add("SRVA", "Sales", "FULL", 1)
+        self.assertEqual(self.candidates(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()